@@ -0,0 +1,287 @@
+# analytics.py
+# Trajectory and lap analytics over metadata.csv (one row per frame, written at race end).
+# Each run is loaded into NumPy arrays and every metric is computed with array operations
+# (no per-row Python loops); many runs are processed in parallel with a process pool.
+#
+# Per run: distance, speed, yaw rate, deviation from a reference path, SOC drain per meter,
+# lap splits, time in each status and error-code counts. The summary is written to
+# analytics.json in the run folder, and one row per run to analytics_summary.csv.
+#
+# Usage:
+#   python analytics.py                                  # All training_data/run_* folders
+#   python analytics.py training_data/run_xxx training_data/run_yyy --reference training_data/run_xxx
+#   python analytics.py --catalog-mode rule_based --workers 8
+
+import os
+import csv
+import json
+import time
+import argparse
+import concurrent.futures
+
+import numpy as np
+import pandas as pd
+
+from run_catalog import TRAINING_DATA_DIR, NO_ERROR_CODES
+
+METADATA_NAME = "metadata.csv"
+SUMMARY_NAME = "analytics.json"
+BATCH_SUMMARY_NAME = "analytics_summary.csv"
+NUMERIC_COLUMNS = ["time_ms", "frame_id", "soc", "wheel_left", "wheel_right", "pos_x", "pos_y", "pos_z", "yaw"]
+TEXT_COLUMNS = ["status", "error_code"]
+_COLUMNS = set(NUMERIC_COLUMNS + TEXT_COLUMNS)
+
+# Lap detection: a lap ends when the robot comes back within LAP_RADIUS of its start position
+# after having been farther away than LAP_LEAVE_RADIUS [Unity units, m]
+LAP_RADIUS = 1.0
+LAP_LEAVE_RADIUS = 5.0
+REFERENCE_SPACING = 0.25  # Distance between kept reference path vertices [m]
+DEVIATION_CHUNK = 1024    # Frames per block in the nearest-vertex search
+
+def load_run(run_dir):
+    """Load metadata.csv as {column: NumPy array} (numeric columns float64, NaN when missing)."""
+    df = pd.read_csv(os.path.join(run_dir, METADATA_NAME), usecols=lambda c: c in _COLUMNS,
+                     dtype={c: str for c in TEXT_COLUMNS})
+    arrays = {}
+    for column in NUMERIC_COLUMNS:
+        if column in df:
+            arrays[column] = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype=np.float64)
+        else:
+            arrays[column] = np.full(len(df), np.nan)
+    for column in TEXT_COLUMNS:
+        values = df[column].fillna("") if column in df else pd.Series([""] * len(df))
+        arrays[column] = values.to_numpy(dtype=str)
+    return arrays
+
+def load_runs(run_dirs):
+    return {os.path.basename(os.path.normpath(d)): load_run(d) for d in run_dirs}
+
+# === Per-frame series ===
+def compute_series(run):
+    """Per-frame dt [s], step distance [m], speed [m/s] and yaw rate [deg/s] (first frame = 0).
+    Yaw gaps inside the run are interpolated; the yaw rate is NaN before the first / after the last known yaw."""
+    t = run["time_ms"] / 1000.0
+    x, z = run["pos_x"], run["pos_z"]
+
+    dt = np.diff(t, prepend=t[:1])
+    ds = np.hypot(np.diff(x, prepend=x[:1]), np.diff(z, prepend=z[:1]))
+    valid = dt > 0
+    speed = np.divide(ds, dt, out=np.zeros_like(ds), where=valid)
+
+    yaw = interpolate_yaw(run["yaw"])
+    dyaw = np.diff(yaw, prepend=yaw[:1])
+    yaw_rate = np.divide(dyaw, dt, out=np.where(np.isnan(dyaw), np.nan, 0.0), where=valid)
+    return {"dt": np.where(valid, dt, 0.0), "ds": np.nan_to_num(ds), "speed": speed, "yaw_rate": yaw_rate}
+
+def interpolate_yaw(yaw_deg):
+    """Unwrapped yaw [deg] with missing samples linearly interpolated between their known neighbours
+    (never filled with 0°, which would show up as a heading spike). NaN outside the known range."""
+    known = np.flatnonzero(np.isfinite(yaw_deg))
+    yaw = np.full(len(yaw_deg), np.nan)
+    if len(known) == 0:
+        return yaw
+    # Unwrap the known samples only, so 359° -> (gap) -> 1° counts as +2°
+    unwrapped = np.degrees(np.unwrap(np.radians(yaw_deg[known])))
+    inside = np.arange(known[0], known[-1] + 1)
+    yaw[inside] = np.interp(inside, known, unwrapped)
+    return yaw
+
+def _segment_distance(points, a, b):
+    """Distance from each point to the segment a-b (row-wise)."""
+    ab = b - a
+    length2 = (ab ** 2).sum(axis=1)
+    u = np.clip(np.divide(((points - a) * ab).sum(axis=1), length2, out=np.zeros_like(length2),
+                          where=length2 > 0), 0.0, 1.0)
+    return np.hypot(*(points - (a + u[:, None] * ab)).T)
+
+def path_deviation(run, reference_xz):
+    """Distance [m] from each frame position to the reference path (polyline)."""
+    points = np.column_stack([run["pos_x"], run["pos_z"]])
+    if reference_xz is None or len(reference_xz) == 0 or len(points) == 0:
+        return np.full(len(points), np.nan)
+
+    # Nearest reference vertex per frame: |a - b|^2 = |a|^2 + |b|^2 - 2 a.b as one matrix
+    # product per block (bounded memory, no 3-D difference array)
+    nearest = np.empty(len(points), dtype=np.int64)
+    ref_norm = (reference_xz ** 2).sum(axis=1)[None, :]
+    for start in range(0, len(points), DEVIATION_CHUNK):
+        block = np.nan_to_num(points[start:start + DEVIATION_CHUNK])
+        d2 = ref_norm - 2.0 * block @ reference_xz.T
+        nearest[start:start + DEVIATION_CHUNK] = d2.argmin(axis=1)
+
+    # Exact distance to the two polyline segments around that vertex
+    last = len(reference_xz) - 1
+    before = reference_xz[np.maximum(nearest - 1, 0)]
+    vertex = reference_xz[nearest]
+    after = reference_xz[np.minimum(nearest + 1, last)]
+    deviation = np.minimum(_segment_distance(points, before, vertex), _segment_distance(points, vertex, after))
+    return np.where(np.isfinite(points).all(axis=1), deviation, np.nan)
+
+def lap_end_indices(run):
+    """Frame indices where a lap is completed (back near the start after leaving it)."""
+    x, z = run["pos_x"], run["pos_z"]
+    if len(x) == 0:
+        return np.array([], dtype=np.int64)
+    dist = np.hypot(x - x[0], z - z[0])
+    events = np.where(dist > LAP_LEAVE_RADIUS, 1, np.where(dist < LAP_RADIUS, -1, 0))
+    # Forward-fill the last non-zero event: state = +1 (away) or -1 (near start)
+    last_event = np.maximum.accumulate(np.where(events != 0, np.arange(len(events)), 0))
+    state = events[last_event]
+    return np.flatnonzero((state[1:] == -1) & (state[:-1] == 1)) + 1
+
+def time_by_label(labels, dt):
+    """{label: seconds} using the interval that ends at each frame."""
+    if len(labels) == 0:
+        return {}
+    unique, inverse = np.unique(labels, return_inverse=True)
+    seconds = np.bincount(inverse, weights=dt, minlength=len(unique))
+    return {str(label): round(float(s), 3) for label, s in zip(unique, seconds)}
+
+def _stat(values, fn):
+    values = values[np.isfinite(values)]
+    return round(float(fn(values)), 4) if len(values) else None
+
+# === Per-run summary ===
+def summarize(run, reference_xz=None):
+    series = compute_series(run)
+    t = run["time_ms"] / 1000.0
+    soc = run["soc"]
+    distance = float(series["ds"].sum())
+    finite_soc = soc[np.isfinite(soc)]
+    soc_used = float(finite_soc[0] - finite_soc[-1]) if len(finite_soc) else None
+
+    deviation = path_deviation(run, reference_xz)
+    lap_ends = lap_end_indices(run)
+    lap_times = np.diff(np.concatenate([t[:1], t[lap_ends]])) if len(t) else np.array([])
+
+    codes, counts = np.unique(run["error_code"], return_counts=True)
+    return {
+        "frames": int(len(t)),
+        "duration_s": round(float(t[-1] - t[0]), 3) if len(t) else None,
+        "distance_m": round(distance, 3),
+        "speed_mean": round(distance / float(t[-1] - t[0]), 4) if len(t) > 1 and t[-1] > t[0] else None,
+        "speed_max": _stat(series["speed"], np.max),
+        "speed_p95": _stat(series["speed"], lambda v: np.percentile(v, 95)),
+        "yaw_rate_abs_mean": _stat(np.abs(series["yaw_rate"]), np.mean),
+        "yaw_rate_abs_max": _stat(np.abs(series["yaw_rate"]), np.max),
+        "deviation_mean": _stat(deviation, np.mean),
+        "deviation_max": _stat(deviation, np.max),
+        "soc_used": round(soc_used, 5) if soc_used is not None else None,
+        "soc_per_meter": round(soc_used / distance, 7) if soc_used is not None and distance > 0 else None,
+        "laps": int(len(lap_ends)),
+        "lap_times_s": [round(float(v), 3) for v in lap_times],
+        "best_lap_s": round(float(lap_times.min()), 3) if len(lap_times) else None,
+        "time_in_status_s": time_by_label(run["status"], series["dt"]),
+        "error_codes": {str(c): int(n) for c, n in zip(codes, counts) if str(c) not in NO_ERROR_CODES},
+    }
+
+def json_safe(value):
+    """Replace NaN / inf (also inside lists and dicts) with None: analytics.json must stay strict JSON."""
+    if isinstance(value, dict):
+        return {k: json_safe(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [json_safe(v) for v in value]
+    if isinstance(value, float) and not np.isfinite(value):
+        return None
+    return value
+
+def analyze_run(run_dir, reference_xz=None, write=True):
+    """Load, summarize and (optionally) save analytics.json for one run. Returns the summary."""
+    summary = {"run_name": os.path.basename(os.path.normpath(run_dir)), "run_dir": os.path.abspath(run_dir)}
+    try:
+        summary.update(json_safe(summarize(load_run(run_dir), reference_xz)))
+    except Exception as e:
+        summary["error"] = str(e)
+        return summary
+    if write:
+        with open(os.path.join(run_dir, SUMMARY_NAME), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2, allow_nan=False)
+    return summary
+
+def _analyze_task(args):
+    return analyze_run(*args)
+
+def reference_path(run_dir):
+    """Positions (x, z) of a reference run, used for the path deviation of every run."""
+    run = load_run(run_dir)
+    points = np.column_stack([run["pos_x"], run["pos_z"]])
+    points = points[np.isfinite(points).all(axis=1)]
+    if len(points) == 0:
+        return points
+    # Drop points closer than REFERENCE_SPACING along the path (standing still, slow sections)
+    travelled = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))])
+    _, keep = np.unique(np.floor(travelled / REFERENCE_SPACING), return_index=True)
+    return points[keep]
+
+def analyze_runs(run_dirs, reference_dir=None, workers=None, write=True):
+    """Analyze many runs in a process pool (workers=1: in this process). Returns the summaries."""
+    run_dirs = [d for d in run_dirs if os.path.exists(os.path.join(d, METADATA_NAME))]
+    if not run_dirs:
+        return []
+    reference_dir = reference_dir or run_dirs[0]
+    reference_xz = reference_path(reference_dir)
+    tasks = [(d, reference_xz, write) for d in run_dirs]
+
+    if workers == 1 or len(run_dirs) == 1:
+        return [_analyze_task(task) for task in tasks]
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as pool:
+        chunksize = max(1, len(tasks) // ((workers or os.cpu_count() or 1) * 4))
+        return list(pool.map(_analyze_task, tasks, chunksize=chunksize))
+
+def write_batch_summary(summaries, path):
+    fields = ["run_name", "frames", "duration_s", "distance_m", "speed_mean", "speed_max", "speed_p95",
+              "yaw_rate_abs_mean", "yaw_rate_abs_max", "deviation_mean", "deviation_max",
+              "soc_used", "soc_per_meter", "laps", "best_lap_s", "lap_times_s", "time_in_status_s",
+              "error_codes", "error"]
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for summary in summaries:
+            row = dict(summary)
+            for key in ("lap_times_s", "time_in_status_s", "error_codes"):
+                if key in row:
+                    row[key] = json.dumps(row[key])
+            writer.writerow(row)
+
+def main():
+    parser = argparse.ArgumentParser(description="Trajectory and lap analytics over metadata.csv")
+    parser.add_argument("runs", nargs="*", help="Run directories (default: all training_data/run_*)")
+    parser.add_argument("--reference", type=str, default=None, help="Run whose path is the deviation reference "
+                                                                   "(default: first run)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--catalog-mode", type=str, default=None, help="Select runs from the run catalog by mode")
+    parser.add_argument("--out", type=str, default=None, help=f"Batch summary CSV (default: {BATCH_SUMMARY_NAME} "
+                                                              "in training_data)")
+    parser.add_argument("--no-write", action="store_true", help="Do not write analytics.json into the run folders")
+    args = parser.parse_args()
+
+    run_dirs = list(args.runs)
+    if args.catalog_mode:
+        import run_catalog
+        run_dirs += [r["run_dir"] for r in run_catalog.query_runs(mode=args.catalog_mode, min_frames=1)]
+    if not run_dirs and os.path.isdir(TRAINING_DATA_DIR):
+        run_dirs = [os.path.join(TRAINING_DATA_DIR, name) for name in sorted(os.listdir(TRAINING_DATA_DIR))
+                    if name.startswith("run_")]
+
+    t_start = time.perf_counter()
+    summaries = analyze_runs(run_dirs, args.reference, args.workers, write=not args.no_write)
+    if not summaries:
+        print("[Analytics] No runs with metadata.csv found.")
+        return
+
+    out_path = args.out or os.path.join(TRAINING_DATA_DIR, BATCH_SUMMARY_NAME)
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    write_batch_summary(summaries, out_path)
+    failed = [s for s in summaries if "error" in s]
+    print(f"[Analytics] {len(summaries)} run(s) analyzed in {time.perf_counter() - t_start:.2f} s "
+          f"({len(failed)} failed) → {out_path}")
+    for summary in summaries[:20]:
+        if "error" in summary:
+            print(f"  {summary['run_name']}: error: {summary['error']}")
+        else:
+            print(f"  {summary['run_name']}: {summary['distance_m']:.1f} m in {summary['duration_s']} s, "
+                  f"{summary['laps']} lap(s), best {summary['best_lap_s']} s, "
+                  f"deviation {summary['deviation_mean']} m, SOC/m {summary['soc_per_meter']}")
+
+if __name__ == "__main__":
+    main()
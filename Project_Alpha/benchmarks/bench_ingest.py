@@ -0,0 +1,142 @@
+# bench_ingest.py
+# Per-frame cost of the websocket frame ingestion path: the previous slice + decode + json.loads
+# parsing against frame_data.parse_frame_message(), the training + A/B latest disk writes from
+# sliced copies vs from the shared memoryview, and the first decode of the received JPEG.
+# Reports time per frame, peak transient allocation per frame (tracemalloc) and the number of
+# memory blocks / bytes each frame keeps alive while it is held (e.g. as the latest frame).
+#
+# Usage:
+#   python benchmarks/bench_ingest.py
+#   python benchmarks/bench_ingest.py --frames 2000 --jpeg training_data/run_xxx/images/frame_000100.jpg
+
+import io
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import tempfile
+import tracemalloc
+
+import numpy as np
+from PIL import Image
+
+# Allow running this file directly from benchmarks/
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from frame_data import Frame, parse_frame_message
+
+def make_message(jpeg, frame_id=123, soc=0.8765):
+    header = json.dumps({"soc": soc, "filename": f"frame_{frame_id:06d}.jpg"}).encode("utf-8")
+    return struct.pack("I", len(header)) + header + jpeg
+
+def synthetic_jpeg(width, height, quality=85):
+    rng = np.random.default_rng(0)
+    # Smooth gradient + noise so the JPEG size resembles a camera frame
+    gradient = np.linspace(0, 255, width, dtype=np.float32)[None, :, None]
+    pixels = np.clip(gradient + rng.normal(0, 40, (height, width, 3)), 0, 255).astype(np.uint8)
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+# === Parse paths ===
+def parse_legacy(data):
+    """Parsing as done before parse_frame_message (header and payload sliced out as copies)."""
+    json_size = struct.unpack("I", data[:4])[0]
+    header = json.loads(data[4:4 + json_size].decode("utf-8"))
+    jpeg = data[4 + json_size:]
+    return Frame(jpeg, filename=header.get("filename"), soc=header.get("soc"), timestamp=time.monotonic())
+
+def parse_zero_copy(data):
+    return parse_frame_message(data, timestamp=time.monotonic()).frame()
+
+# === Disk sinks (training image + independent A/B latest copy) ===
+def sink_two_writes(jpeg, training_path, latest_path):
+    with open(training_path, "wb") as f:
+        f.write(jpeg)
+    with open(latest_path, "wb") as f:
+        f.write(jpeg)
+
+# === Measurements ===
+def time_per_call(fn, n):
+    t_start = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t_start) / n
+
+def peak_per_call(fn, n):
+    """Average peak of traced memory above the baseline for one call (transient copies included)."""
+    total = 0
+    for _ in range(n):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        result = fn()
+        total += tracemalloc.get_traced_memory()[1] - baseline
+        del result
+    return total / n
+
+def retained_per_call(fn, n):
+    """(blocks, bytes) kept alive per result while the results are held."""
+    before = tracemalloc.take_snapshot()
+    results = [fn() for _ in range(n)]
+    after = tracemalloc.take_snapshot()
+    stats = after.compare_to(before, "filename")
+    blocks = sum(s.count_diff for s in stats)
+    size = sum(s.size_diff for s in stats)
+    del results
+    return blocks / n, size / n
+
+def report(name, seconds, peak, retained):
+    blocks, size = retained
+    print(f"{name:<28}{seconds * 1e6:>10.1f}{peak / 1024:>12.1f}{blocks:>10.1f}{size / 1024:>12.1f}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the frame ingestion path")
+    parser.add_argument("--frames", type=int, default=1000, help="Iterations per measurement")
+    parser.add_argument("--jpeg", type=str, default=None, help="Use this JPEG instead of a synthetic frame")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    args = parser.parse_args()
+
+    if args.jpeg:
+        with open(args.jpeg, "rb") as f:
+            jpeg = f.read()
+    else:
+        jpeg = synthetic_jpeg(args.width, args.height)
+    message = make_message(jpeg)
+    n = args.frames
+    print(f"[Bench] message {len(message) / 1024:.1f} KiB, JPEG {len(jpeg) / 1024:.1f} KiB, {n} frames")
+    print(f"{'path':<28}{'us/frame':>10}{'peak KiB':>12}{'blocks':>10}{'kept KiB':>12}")
+
+    tracemalloc.start()
+    for name, fn in (("parse legacy", lambda: parse_legacy(message)),
+                     ("parse zero-copy", lambda: parse_zero_copy(message))):
+        tracemalloc.stop()
+        seconds = time_per_call(fn, n)
+        tracemalloc.start()
+        report(name, seconds, peak_per_call(fn, n), retained_per_call(fn, n))
+
+    decode_n = max(1, n // 10)
+    for name, fn in (("decode legacy", lambda: parse_legacy(message).rgb()),
+                     ("decode zero-copy", lambda: parse_zero_copy(message).rgb())):
+        tracemalloc.stop()
+        seconds = time_per_call(fn, decode_n)
+        tracemalloc.start()
+        report(name, seconds, peak_per_call(fn, decode_n), (0.0, 0.0))
+    tracemalloc.stop()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        training_path = os.path.join(tmp, "frame.jpg")
+        latest_path = os.path.join(tmp, "latest.jpg")
+        record = parse_frame_message(message)
+        for name, fn in (("sink sliced copy", lambda: sink_two_writes(message[4 + record.header_size:],
+                                                                      training_path, latest_path)),
+                         ("sink shared view", lambda: sink_two_writes(record.jpeg, training_path,
+                                                                      latest_path))):
+            try:
+                report(name, time_per_call(fn, n), 0.0, (0.0, 0.0))
+            except OSError as e:
+                print(f"{name:<28} unavailable: {e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+# change_detector.py
+# Skips controller work on frames that are (nearly) identical to the last processed one, e.g. while
+# waiting for the start signal or while the robot stands still.
+#
+# Each frame gets a tiny fingerprint per cell from Frame.reduced(), the 1/8-scale JPEG draft decode.
+# A cell is the whole frame or a band (top, bottom, left, right) given as fractions of the image size,
+# e.g. the line ROI or one start lamp. The fingerprint channel is "gray" or "red" (red excess
+# R - max(G, B), what perception_Startsignal.red_ratio keys on). The change of a cell is the mean absolute
+# pixel difference to the last *processed* frame, and the frame counts as changed if any single cell
+# changed by CHANGE_THRESHOLD levels or more (max over cells: one lamp going out is not averaged away).
+# Comparing against the last processed frame (not the previous frame) means slow drift still triggers;
+# after CHANGE_MAX_SKIP reuses in a row the frame is processed anyway. Inputs besides the image (e.g. the
+# SOC fed to the AI model) go in the key: a different key is always processed.
+# The controllers step at 20 Hz whether or not a new frame arrived; a frame already seen (same object
+# or frame_id) returns the last result without being counted, so the statistics only cover new frames.
+#
+# The skip ratio and CPU saved of every detector are printed when its controller stops and written to
+# change_detector.json in the run folder by write_report(), which also ends the run's registrations
+# (detectors in the driving/shadow threads; with CONTROLLER_EXECUTOR=process they live in the worker
+# and are only printed there).
+#
+# Usage:
+#   LAMPS = ChangeDetector("start_lamps", threshold=2.0, cells=[(0.0, 0.2, 0.35, 0.5), ...], channel="red")
+#   red_count = LAMPS.run(frame, count_red_lamps)    # count_red_lamps(frame) only when a lamp changed
+#   torque = AI.run(frame, infer, key=frame.soc)      # Also recomputed when the SOC changes
+
+import os
+import json
+import time
+
+import numpy as np
+
+import metrics
+
+FINGERPRINT_SIZE = (16, 12)  # (width, height) per cell
+FINGERPRINT_SCALE = 8        # JPEG draft scale used for the fingerprint decode
+REPORT_NAME = "change_detector.json"
+
+FRAMES_CHECKED = metrics.counter("change_detector_frames_total", "Frames checked by the change detectors")
+FRAMES_REUSED = metrics.counter("change_detector_reused_total", "Frames whose previous result was reused")
+
+def fingerprint(frame, cell=None, size=FINGERPRINT_SIZE, channel="gray"):
+    """
+    Tiny thumbnail (float32, size=(width, height)) of the frame or of cell=(top, bottom, left, right);
+    channel "gray" or "red" (red excess).
+    """
+    image = frame.reduced(FINGERPRINT_SCALE)
+    if cell is not None:
+        width, height = image.size
+        top, bottom, left, right = cell
+        image = image.crop((int(width * left), int(height * top),
+                            max(int(width * left) + 1, int(width * right)),
+                            max(int(height * top) + 1, int(height * bottom))))
+    if channel == "gray":
+        return np.asarray(image.convert("L").resize(size), dtype=np.float32)
+    rgb = np.asarray(image.resize(size), dtype=np.float32)
+    return np.maximum(rgb[..., 0] - np.maximum(rgb[..., 1], rgb[..., 2]), 0.0)
+
+class ChangeDetector:
+    """Reuses the last result of compute(frame) while none of the fingerprinted cells has changed."""
+
+    def __init__(self, name, threshold=2.0, cells=None, max_skip=20, size=FINGERPRINT_SIZE, channel="gray"):
+        self.name = name
+        self.threshold = float(threshold)
+        self.cells = list(cells) if cells else [None]
+        self.max_skip = int(max_skip)
+        self.size = size
+        self.channel = channel
+        self.checked = 0
+        self.reused = 0
+        self.work_seconds = 0.0         # CPU time of compute() on processed frames
+        self.fingerprint_seconds = 0.0  # CPU time of the fingerprints (the detector's own cost)
+        self._fingerprints = None
+        self._key = None
+        self._result = None
+        self._processed = False
+        self._seen = None     # Last frame passed to run() (processed or reused)
+        self._skipped = 0
+        _DETECTORS.append(self)
+
+    @classmethod
+    def from_config(cls, config, name, cells=None, **kwargs):
+        """ChangeDetector with CHANGE_THRESHOLD / CHANGE_MAX_SKIP, or None if CHANGE_THRESHOLD is 0."""
+        threshold = float(config.CHANGE_THRESHOLD)
+        if threshold <= 0:
+            return None
+        return cls(name, threshold, cells, config.CHANGE_MAX_SKIP, **kwargs)
+
+    def reset(self):
+        """Forget the last result (next frame is always processed)."""
+        self._fingerprints = self._key = self._result = self._seen = None
+        self._processed = False
+        self._skipped = 0
+
+    def change(self, fingerprints):
+        """Largest change of any cell against the last processed frame."""
+        return max(float(np.mean(np.abs(current - last)))
+                   for current, last in zip(fingerprints, self._fingerprints))
+
+    def is_repeat(self, frame):
+        """True if frame is the one seen last (the controller stepped again before a new frame arrived)."""
+        seen = self._seen
+        if seen is None:
+            return False
+        return frame is seen or (frame.frame_id is not None and frame.frame_id == seen.frame_id)
+
+    def run(self, frame, compute, key=None):
+        """compute(frame) if the frame or key changed since the last processed frame, else the previous result."""
+        if self._processed and key == self._key and self.is_repeat(frame):
+            return self._result  # Not a new frame: not counted
+        self._seen = frame
+        self.checked += 1
+        FRAMES_CHECKED.inc()
+        may_reuse = self._processed and key == self._key and self._skipped < self.max_skip
+
+        t_start = time.thread_time()
+        current = [fingerprint(frame, cell, self.size, self.channel) for cell in self.cells]
+        self.fingerprint_seconds += time.thread_time() - t_start
+        if may_reuse and self.change(current) < self.threshold:
+            return self._reuse()
+
+        t_start = time.thread_time()
+        result = compute(frame)
+        self.work_seconds += time.thread_time() - t_start
+        self._fingerprints, self._key, self._result = current, key, result
+        self._processed = True
+        self._skipped = 0
+        return result
+
+    def _reuse(self):
+        self.reused += 1
+        self._skipped += 1
+        FRAMES_REUSED.inc()
+        return self._result
+
+    def summary(self):
+        """Skip ratio and estimated CPU saved (average work per processed frame x reuses - fingerprint cost)."""
+        processed = self.checked - self.reused
+        average_work = self.work_seconds / processed if processed else 0.0
+        return {
+            "name": self.name,
+            "frames": self.checked,
+            "reused": self.reused,
+            "skip_ratio": round(self.reused / self.checked, 3) if self.checked else None,
+            "work_ms_per_frame": round(average_work * 1000, 3),
+            "fingerprint_ms_total": round(self.fingerprint_seconds * 1000, 1),
+            "cpu_saved_s": round(average_work * self.reused - self.fingerprint_seconds, 3),
+        }
+
+    def format_summary(self):
+        s = self.summary()
+        if not s["frames"]:
+            return f"[ChangeDetector] {s['name']}: no frames"
+        return (f"[ChangeDetector] {s['name']}: reused {s['reused']}/{s['frames']} frames "
+                f"({s['skip_ratio'] * 100:.1f}%), CPU saved {s['cpu_saved_s']:.2f} s "
+                f"(work {s['work_ms_per_frame']:.2f} ms/frame, fingerprints {s['fingerprint_ms_total']:.0f} ms)")
+
+# === Per-run report ===
+_DETECTORS = []  # Detectors created in this process since the last write_report()
+
+def write_report(run_dir):
+    """Write the summaries of this run's detectors to change_detector.json (if any ran) and forget them."""
+    summaries = [detector.summary() for detector in _DETECTORS if detector.checked]
+    _DETECTORS.clear()
+    if not summaries or not run_dir:
+        return
+    try:
+        with open(os.path.join(run_dir, REPORT_NAME), "w", encoding="utf-8") as f:
+            json.dump({"detectors": summaries,
+                       "cpu_saved_s": round(sum(s["cpu_saved_s"] for s in summaries), 3)}, f, indent=2)
+    except Exception as e:
+        print(f"[ChangeDetector] Failed to write report: {e}")
@@ -0,0 +1,136 @@
+# compare_models.py
+# Compares compact TorqueNet variants against the original model on recorded runs.
+# Reports model size, per-frame latency (preprocess + forward) and torque-prediction error
+# relative to the original 224x224 RGB model. small / conv checkpoints come from distill_model.py.
+#
+# Usage:
+#   python compare_models.py training_data/run_xxx --variants int8 small:64 conv:96:gray
+#   python compare_models.py --catalog-mode ai --limit-runs 5 --variants int8
+
+import os
+import io
+import csv
+import time
+import argparse
+
+import torch
+
+from frame_data import Frame
+from frame_container import FrameContainerReader, find_container
+from controllers import saturate
+from torque_models import SMALL_INPUT_SIZE, ModelSpec, load_model, make_input
+
+def parse_variant(text):
+    """'small:64:gray' -> ModelSpec('small', 64, grayscale=True)."""
+    parts = text.split(":")
+    variant = parts[0]
+    size = int(parts[1]) if len(parts) > 1 and parts[1] else SMALL_INPUT_SIZE
+    grayscale = len(parts) > 2 and parts[2] == "gray"
+    return ModelSpec(variant, size, grayscale)
+
+def model_size_bytes(model):
+    """Serialized state_dict size (what torch.save would write)."""
+    buffer = io.BytesIO()
+    torch.save(model.state_dict(), buffer)
+    return buffer.tell()
+
+def load_soc_by_filename(run_dir):
+    path = os.path.join(run_dir, "metadata.csv")
+    socs = {}
+    if os.path.exists(path):
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    socs[row["filename"]] = float(row["soc"])
+                except (KeyError, TypeError, ValueError):
+                    pass
+    return socs
+
+def iter_run_frames(run_dir, max_frames):
+    """Yield (jpeg_bytes, filename, soc) from a run's container or images/ folder."""
+    socs = load_soc_by_filename(run_dir)
+    container_path = find_container(run_dir)
+    if container_path:
+        with FrameContainerReader(container_path) as reader:
+            for i, entry in enumerate(reader.entries[:max_frames]):
+                soc = socs.get(entry.filename, entry.soc)
+                yield bytes(reader.read(i)), entry.filename, soc if soc is not None else 1.0
+        return
+
+    images_dir = os.path.join(run_dir, "images")
+    if not os.path.isdir(images_dir):
+        return
+    names = sorted(f for f in os.listdir(images_dir) if f.lower().endswith(".jpg"))[:max_frames]
+    for name in names:
+        with open(os.path.join(images_dir, name), "rb") as f:
+            yield f.read(), name, socs.get(name, 1.0)
+
+def predict(model, spec, jpeg, filename, soc):
+    """Run one frame through a model from raw JPEG (fresh Frame: no shared decode cache)."""
+    frame = Frame(jpeg, filename=filename, soc=soc)
+    t0 = time.perf_counter()
+    input_tensor = make_input(frame, soc, spec)
+    t1 = time.perf_counter()
+    with torch.no_grad():
+        output = model(input_tensor)
+    t2 = time.perf_counter()
+    return (saturate(output[0][0].item()), saturate(output[0][1].item())), t1 - t0, t2 - t1
+
+def compare(run_dirs, specs, max_frames=200):
+    reference_spec = ModelSpec("full")
+    models = [(reference_spec, load_model(reference_spec))]
+    for spec in specs:
+        if spec.variant != "int8" and not os.path.exists(spec.checkpoint_path):
+            print(f"[Compare] Skipping {spec}: checkpoint not found ({spec.checkpoint_path}), "
+                  f"train it with distill_model.py")
+            continue
+        models.append((spec, load_model(spec)))
+
+    results = {repr(spec): {"pre": [], "fwd": [], "err": []} for spec, _ in models}
+    frame_count = 0
+
+    for run_dir in run_dirs:
+        for jpeg, filename, soc in iter_run_frames(run_dir, max_frames):
+            reference = None
+            for spec, model in models:
+                torque, pre_s, fwd_s = predict(model, spec, jpeg, filename, soc)
+                entry = results[repr(spec)]
+                entry["pre"].append(pre_s)
+                entry["fwd"].append(fwd_s)
+                if reference is None:
+                    reference = torque
+                entry["err"].append(max(abs(torque[0] - reference[0]), abs(torque[1] - reference[1])))
+            frame_count += 1
+
+    print(f"[Compare] {frame_count} frames from {len(run_dirs)} run(s)")
+    print(f"{'variant':<32}{'size MB':>10}{'pre ms':>10}{'fwd ms':>10}{'MAE':>10}{'max err':>10}")
+    for spec, model in models:
+        entry = results[repr(spec)]
+        n = max(1, len(entry["fwd"]))
+        print(f"{repr(spec):<32}{model_size_bytes(model) / 1e6:>10.1f}"
+              f"{sum(entry['pre']) / n * 1000:>10.2f}{sum(entry['fwd']) / n * 1000:>10.2f}"
+              f"{sum(entry['err']) / n:>10.4f}{max(entry['err'], default=0.0):>10.4f}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare compact TorqueNet variants with the original")
+    parser.add_argument("runs", nargs="*", help="Run directories (training_data/run_*)")
+    parser.add_argument("--variants", nargs="+", default=["int8"],
+                        help="variant[:size[:gray]], e.g. int8 small:64 conv:96:gray")
+    parser.add_argument("--frames", type=int, default=200, help="Max frames per run")
+    parser.add_argument("--catalog-mode", type=str, default=None, help="Select runs from the run catalog by mode")
+    parser.add_argument("--limit-runs", type=int, default=None)
+    args = parser.parse_args()
+
+    run_dirs = list(args.runs)
+    if args.catalog_mode:
+        import run_catalog
+        run_dirs += [r["run_dir"] for r in run_catalog.query_runs(mode=args.catalog_mode, min_frames=1,
+                                                                  limit=args.limit_runs)]
+    if not run_dirs:
+        parser.error("no runs given")
+
+    compare(run_dirs, [parse_variant(v) for v in args.variants], args.frames)
+
+if __name__ == "__main__":
+    main()
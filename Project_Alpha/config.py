@@ -8,8 +8,37 @@ DEFAULT_CONFIG = {
     "HOST": "localhost",
     "PORT": 12346,
     "MODE_NUM": 1,         # 1: keyboard, 2: table, 3: rule_based, 4: ai
+    "MODE": "",            # Controller name (overrides MODE_NUM when set, e.g. a newly registered controller)
     "DEBUG_MODE": 0,       # 0: Launch Unity from script, 1: Manually launch Unity
-    "JPEG_SAVE": 0         # 1: Save images, 0: Do not save
+    "JPEG_SAVE": 0,        # 1: Save images, 0: Do not save
+    "JPEG_CONTAINER": 0,   # 1: Append frames to one container file per run, 0: One JPEG file per frame
+    "RECORD_SESSION": 0,   # 1: Record raw WebSocket messages to session.vrs, 0: Off
+    "CONTROLLER_EXECUTOR": "thread",  # thread: run controller in a thread, process: in a worker process
+    "SHADOW_MODES": "",        # Shadow controllers, e.g. "ai:80,rule_based" (name[:budget_ms])
+    "SHADOW_BUDGET_MS": 100,   # Default latency budget per shadow step [ms]
+    "SHADOW_EXECUTOR": "thread",  # thread or process
+    "CONTROL_DEADLINE_MS": "",    # Max command age before fallback: "200" or "rule_based:200,ai:300" (empty: defaults)
+    "CONTROL_FALLBACK": "hold",   # hold, decay or stop
+    "AI_VARIANT": "full",  # full, int8, small or conv (see torque_models.py)
+    "AI_INPUT_SIZE": 64,   # Input width/height for the small / conv variants
+    "AI_GRAYSCALE": 0,     # 1: Grayscale input for the small / conv variants
+    "METRICS_PORT": 0,         # Local Prometheus endpoint port, e.g. 9108 (0: disabled)
+    "METRICS_SNAPSHOT_S": 5,   # Seconds between metrics snapshots to the run folder (0: disabled)
+    "LOG_LEVEL": "INFO",   # Default log level (DEBUG, INFO, WARNING, ERROR)
+    "LOG_LEVELS": "",      # Per-module levels, e.g. "rule_based_algorithms:WARNING,inference_input:INFO"
+    "LOG_RATE_LIMIT": 5,   # Max INFO/DEBUG messages per second per log call site (0: unlimited)
+    "FRAME_LOG": 0,        # 1: Binary per-frame log (frame_log.vrl) in the run folder
+    "VIDEO_COMPACTION": 0,         # 1: Encode saved frames into frames.mp4 after the race (needs JPEG_SAVE=1)
+    "VIDEO_DELETE_ORIGINALS": 0,   # 1: Delete the JPEGs / container once the video is verified
+    "VIDEO_CODEC": "mp4v",         # FourCC for cv2.VideoWriter
+    "VIDEO_FPS": 20,
+    "PREDICTOR": 0,                # 1: Project the line state over the loop latency (rule_based mode)
+    "PREDICTOR_LATENCY_MS": 50,    # Latency not measured in Python (Unity capture → receive, send → wheels)
+    "PREDICTOR_GAINS": "",         # dev_per_turn,dev_per_theta,theta_per_turn,theta_per_yaw (state_predictor.py --fit)
+    "RESOURCE_SAMPLE_S": 1,        # Seconds between resource samples (CPU, RSS, threads, disk) of the run (0: disabled)
+    "CHANGE_THRESHOLD": 0,         # Reuse results on frames differing less than this many gray levels (0: disabled)
+    "CHANGE_MAX_SKIP": 20,         # Process a frame anyway after this many reuses in a row
+    "TABLE_TIMING": "row"          # Table mode: row = next CSV row every step, time = row for the elapsed time
 }
 
 CONFIG_PATH = "config.txt"
@@ -41,7 +70,13 @@ def load_config():
 
 def apply_config():
     """Apply loaded values as global variables"""
-    global HOST, PORT, MODE_NUM, MODE, DEBUG_MODE, JPEG_SAVE
+    global HOST, PORT, MODE_NUM, MODE, DEBUG_MODE, JPEG_SAVE, JPEG_CONTAINER, RECORD_SESSION, CONTROLLER_EXECUTOR
+    global SHADOW_MODES, SHADOW_BUDGET_MS, SHADOW_EXECUTOR, CONTROL_DEADLINE_MS, CONTROL_FALLBACK
+    global AI_VARIANT, AI_INPUT_SIZE, AI_GRAYSCALE, METRICS_PORT, METRICS_SNAPSHOT_S
+    global LOG_LEVEL, LOG_LEVELS, LOG_RATE_LIMIT, FRAME_LOG
+    global VIDEO_COMPACTION, VIDEO_DELETE_ORIGINALS, VIDEO_CODEC, VIDEO_FPS
+    global PREDICTOR, PREDICTOR_LATENCY_MS, PREDICTOR_GAINS, RESOURCE_SAMPLE_S, CHANGE_THRESHOLD, CHANGE_MAX_SKIP
+    global TABLE_TIMING
 
     load_config()
 
@@ -55,10 +90,38 @@ def apply_config():
         3: "rule_based",
         4: "ai"
     }
-    MODE = MODE_MAP.get(MODE_NUM, "keyboard")
+    MODE = CONFIG["MODE"] or MODE_MAP.get(MODE_NUM, "keyboard")
 
     DEBUG_MODE = CONFIG["DEBUG_MODE"]
     JPEG_SAVE = CONFIG["JPEG_SAVE"]
+    JPEG_CONTAINER = CONFIG["JPEG_CONTAINER"]
+    RECORD_SESSION = CONFIG["RECORD_SESSION"]
+    CONTROLLER_EXECUTOR = CONFIG["CONTROLLER_EXECUTOR"]
+    SHADOW_MODES = CONFIG["SHADOW_MODES"]
+    SHADOW_BUDGET_MS = CONFIG["SHADOW_BUDGET_MS"]
+    SHADOW_EXECUTOR = CONFIG["SHADOW_EXECUTOR"]
+    CONTROL_DEADLINE_MS = CONFIG["CONTROL_DEADLINE_MS"]
+    CONTROL_FALLBACK = CONFIG["CONTROL_FALLBACK"]
+    AI_VARIANT = CONFIG["AI_VARIANT"]
+    AI_INPUT_SIZE = CONFIG["AI_INPUT_SIZE"]
+    AI_GRAYSCALE = CONFIG["AI_GRAYSCALE"]
+    METRICS_PORT = CONFIG["METRICS_PORT"]
+    METRICS_SNAPSHOT_S = CONFIG["METRICS_SNAPSHOT_S"]
+    LOG_LEVEL = CONFIG["LOG_LEVEL"]
+    LOG_LEVELS = CONFIG["LOG_LEVELS"]
+    LOG_RATE_LIMIT = CONFIG["LOG_RATE_LIMIT"]
+    FRAME_LOG = CONFIG["FRAME_LOG"]
+    VIDEO_COMPACTION = CONFIG["VIDEO_COMPACTION"]
+    VIDEO_DELETE_ORIGINALS = CONFIG["VIDEO_DELETE_ORIGINALS"]
+    VIDEO_CODEC = CONFIG["VIDEO_CODEC"]
+    VIDEO_FPS = CONFIG["VIDEO_FPS"]
+    PREDICTOR = CONFIG["PREDICTOR"]
+    PREDICTOR_LATENCY_MS = CONFIG["PREDICTOR_LATENCY_MS"]
+    PREDICTOR_GAINS = CONFIG["PREDICTOR_GAINS"]
+    RESOURCE_SAMPLE_S = CONFIG["RESOURCE_SAMPLE_S"]
+    CHANGE_THRESHOLD = CONFIG["CHANGE_THRESHOLD"]
+    CHANGE_MAX_SKIP = CONFIG["CHANGE_MAX_SKIP"]
+    TABLE_TIMING = CONFIG["TABLE_TIMING"]
 
 # Initialize settings at import time
 apply_config()
@@ -0,0 +1,167 @@
+# control_watchdog.py
+# Control-deadline watchdog for the torque sender.
+# If the controller has not produced a fresh command within the deadline for the current mode,
+# a fallback policy is applied instead of repeating the last torque forever:
+#   hold  = keep sending the last command (previous behaviour, but now counted)
+#   decay = shrink the last command toward zero every send tick
+#   stop  = send zero torque
+# Freshness is the age of the frame a command was computed from (controllers keep stepping on the
+# last frame when Unity stops sending, so the step time alone would never go stale); commands
+# without a frame (keyboard, table) use the time they were computed.
+# Every missed tick is counted, miss episodes are timestamped, and the controller step
+# latency distribution is reported at race end.
+
+import os
+import csv
+import json
+import math
+import time
+from array import array
+
+# Default deadlines per mode [ms] (age of the newest command's input before the fallback kicks in)
+DEFAULT_DEADLINES_MS = {
+    "keyboard": 150,
+    "table": 150,
+    "rule_based": 200,
+    "ai": 300,
+}
+FALLBACK_POLICIES = ("hold", "decay", "stop")
+DECAY_FACTOR = 0.7   # Torque multiplier per send tick in decay mode
+LATENCY_PERCENTILES = (50, 90, 99, 99.9)
+
+def parse_deadlines(value):
+    """Parse '200' (all modes) or 'rule_based:200,ai:300' into a {mode: ms} dict over the defaults (0 = off)."""
+    deadlines = dict(DEFAULT_DEADLINES_MS)
+    value = str(value or "").strip()
+    if not value:
+        return deadlines
+    if ":" not in value:
+        deadlines = {mode: float(value) for mode in deadlines}
+        deadlines["*"] = float(value)  # Also applies to modes without a default
+        return deadlines
+    for item in value.split(","):
+        mode, _, ms = item.partition(":")
+        if ms:
+            deadlines[mode.strip()] = float(ms)
+    return deadlines
+
+def percentile(sorted_values, p):
+    """Nearest-rank percentile of an already sorted sequence."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(p / 100.0 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+def input_time(command):
+    """When the command's input was observed: its frame's receive time, else when it was computed."""
+    return command.frame_time or command.timestamp
+
+class ControlWatchdog:
+    """Checks command freshness on every send tick and collects controller step latencies."""
+
+    def __init__(self, deadline_ms, fallback="hold"):
+        if fallback not in FALLBACK_POLICIES:
+            print(f"[Watchdog] Unknown fallback '{fallback}', using 'hold'.")
+            fallback = "hold"
+        self.deadline_s = deadline_ms / 1000.0 if deadline_ms else None
+        self.fallback = fallback
+
+        self.missed_ticks = 0
+        self.episodes = []          # [wall_time_start, duration_s, missed_ticks, last_frame_id]
+        self._episode = None
+        self._last_sent = None
+        self._step_times = array("d")
+
+    @classmethod
+    def from_config(cls, config):
+        deadlines = parse_deadlines(config.CONTROL_DEADLINE_MS)
+        deadline_ms = deadlines.get(config.MODE, deadlines.get("*"))
+        return cls(deadline_ms, config.CONTROL_FALLBACK)
+
+    def check(self, command, now=None):
+        """Return the command to send this tick (the fresh command or the fallback)."""
+        # Not armed until the controller has produced its first command
+        if self.deadline_s is None or command.timestamp == 0.0:
+            self._last_sent = command
+            return command
+
+        now = time.monotonic() if now is None else now
+        age = now - input_time(command)
+        if age <= self.deadline_s:
+            if self._episode is not None:
+                self._end_episode(now)
+            self._last_sent = command
+            return command
+
+        # === Deadline missed ===
+        self.missed_ticks += 1
+        if self._episode is None:
+            self._episode = [time.time(), now, 0, command.frame_id]
+            print(f"[Watchdog] Control deadline missed (age {age * 1000:.0f} ms) "
+                  f"→ fallback '{self.fallback}'")
+        self._episode[2] += 1
+
+        last = self._last_sent or command
+        if self.fallback == "stop":
+            fallback = last._replace(left=0.0, right=0.0)
+        elif self.fallback == "decay":
+            fallback = last._replace(left=last.left * DECAY_FACTOR, right=last.right * DECAY_FACTOR)
+        else:
+            fallback = last
+        self._last_sent = fallback
+        return fallback
+
+    def _end_episode(self, now):
+        wall_start, mono_start, ticks, frame_id = self._episode
+        self.episodes.append((wall_start, now - mono_start, ticks, frame_id))
+        self._episode = None
+
+    def record_step(self, command, step_seconds):
+        """ControllerRunner command listener: collect the step latency."""
+        self._step_times.append(step_seconds)
+
+    def latency_stats(self):
+        values = sorted(self._step_times)
+        stats = {"steps": len(values)}
+        if values:
+            for p in LATENCY_PERCENTILES:
+                stats[f"p{p:g}_ms"] = percentile(values, p) * 1000
+            stats["max_ms"] = values[-1] * 1000
+            stats["mean_ms"] = sum(values) / len(values) * 1000
+        return stats
+
+    def report(self, run_dir=None):
+        """Print the race summary and save it to the run directory."""
+        if self._episode is not None:
+            self._end_episode(time.monotonic())
+
+        stats = self.latency_stats()
+        summary = {
+            "deadline_ms": self.deadline_s * 1000 if self.deadline_s else None,
+            "fallback": self.fallback,
+            "missed_ticks": self.missed_ticks,
+            "miss_episodes": len(self.episodes),
+            "step_latency": stats,
+        }
+
+        print(f"[Watchdog] Deadline misses: {len(self.episodes)} episode(s), {self.missed_ticks} tick(s)")
+        if stats["steps"]:
+            print("[Watchdog] Step latency: " + ", ".join(
+                f"p{p:g}={stats[f'p{p:g}_ms']:.1f}ms" for p in LATENCY_PERCENTILES) +
+                f", max={stats['max_ms']:.1f}ms over {stats['steps']} steps")
+
+        if run_dir:
+            try:
+                with open(os.path.join(run_dir, "control_latency.json"), "w", encoding="utf-8") as f:
+                    json.dump(summary, f, indent=2)
+                if self.episodes:
+                    with open(os.path.join(run_dir, "deadline_misses.csv"), "w", newline="", encoding="utf-8") as f:
+                        writer = csv.writer(f)
+                        writer.writerow(["start_time", "duration_ms", "missed_ticks", "last_frame_id"])
+                        for wall_start, duration, ticks, frame_id in self.episodes:
+                            writer.writerow([time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(wall_start)) +
+                                             f".{int(wall_start * 1000) % 1000:03d}",
+                                             f"{duration * 1000:.1f}", ticks, frame_id])
+            except Exception as e:
+                print(f"[Watchdog] Failed to save report: {e}")
+        return summary
@@ -0,0 +1,250 @@
+# controllers.py
+# Pluggable controller interface.
+# A controller turns the latest camera frame into one immutable Command (left/right torque,
+# frame id, timestamp). Controllers are looked up by mode name in a registry, and a
+# ControllerRunner runs one controller in a thread, a worker process or a given executor,
+# publishing each Command with a single reference swap so left/right can never tear.
+
+import time
+import importlib
+import threading
+import concurrent.futures
+from typing import NamedTuple, Optional
+
+import metrics
+import race_logging
+
+log = race_logging.get_logger(__name__)
+
+class Command(NamedTuple):
+    """Immutable torque command computed for one frame."""
+    left: float
+    right: float
+    frame_id: Optional[int] = None
+    timestamp: float = 0.0  # time.monotonic() when the command was computed
+    frame_time: float = 0.0  # time.monotonic() when its frame was received (0: not computed from a frame)
+
+ZERO_COMMAND = Command(0.0, 0.0)
+
+def saturate(value, min_val=-1.0, max_val=1.0):
+    """Clamp value between min_val and max_val."""
+    return max(min_val, min(max_val, value))
+
+def make_command(left, right, frame=None):
+    """Build a clamped Command stamped with the frame id, the current time and the frame's receive time."""
+    return Command(saturate(float(left)), saturate(float(right)),
+                   frame.frame_id if frame is not None else None, time.monotonic(),
+                   frame.timestamp or 0.0 if frame is not None else 0.0)
+
+class Controller:
+    """
+    Base class for controllers. Subclasses implement step(frame) -> Command.
+    start() is called once before the first step() (model loading, hooks), stop() after the last;
+    with executor="process" both run inside the worker process.
+    """
+    name = None
+    needs_frames = True           # False: step() is called with frame=None (keyboard, table)
+    wait_for_first_frame = True   # Start stepping only after Unity sends the first frame
+    period = 0.05                 # Seconds between steps
+
+    def start(self):
+        pass
+
+    def step(self, frame):
+        raise NotImplementedError
+
+    def stop(self):
+        pass
+
+# === Registry ===
+_REGISTRY = {}
+
+# Built-in modes and the modules that register them (imported on first lookup)
+CONTROLLER_MODULES = {
+    "keyboard": "keyboard_input",
+    "table": "table_input",
+    "rule_based": "rule_based_input",
+    "ai": "inference_input",
+}
+
+def register_controller(name):
+    """Class decorator: make a Controller subclass available under a mode name."""
+    def decorator(cls):
+        cls.name = name
+        _REGISTRY[name] = cls
+        return cls
+    return decorator
+
+def get_controller_class(name):
+    """Look up a controller class by mode name (imports its module if needed)."""
+    if name not in _REGISTRY:
+        module_name = CONTROLLER_MODULES.get(name)
+        if module_name:
+            importlib.import_module(module_name)
+    if name not in _REGISTRY:
+        raise ValueError(f"[Controller] Unknown control mode: {name}")
+    return _REGISTRY[name]
+
+def create_controller(name, **kwargs):
+    return get_controller_class(name)(**kwargs)
+
+def available_controllers():
+    return sorted(set(_REGISTRY) | set(CONTROLLER_MODULES))
+
+# === Published command (read by websocket_server.send_torque_data) ===
+_published = ZERO_COMMAND
+COMMANDS_PUBLISHED = metrics.counter("controller_commands_published_total", "Commands published by the driving controller")
+STEP_TIME = metrics.histogram("controller_step_seconds", "Step time of the driving controller")
+COMMAND_LOG = race_logging.frame_channel("command", ("left", "right", "step_ms", "frame_age_ms"))
+
+def publish(command):
+    global _published
+    _published = command
+    COMMANDS_PUBLISHED.inc()
+
+def latest_command():
+    """Latest command of the driving controller (one atomic read)."""
+    return _published
+
+# === Process execution helpers ===
+_process_controller = None
+
+def _process_init(name):
+    """Worker-process initializer: build and start the controller inside the worker."""
+    global _process_controller
+    import config
+    race_logging.setup_from_config(config)  # Console logging inside the worker (no frame log)
+    _process_controller = create_controller(name)
+    _process_controller.start()
+
+def _process_step(frame_fields):
+    from frame_data import Frame
+    frame = Frame(*frame_fields) if frame_fields is not None else None
+    return _process_controller.step(frame)
+
+def _frame_fields(frame):
+    """Picklable form of a Frame (payload copied to bytes, cached views dropped)."""
+    if frame is None:
+        return None
+    return (bytes(frame.jpeg), frame.filename, frame.soc, frame.frame_id, frame.timestamp)
+
+def make_step_function(controller, executor="thread"):
+    """
+    Prepare a controller for the given executor.
+    Returns (step, close): step(frame) -> Command runs one step and waits for its result.
+    """
+    if executor == "thread":
+        controller.start()
+        return controller.step, controller.stop
+
+    if executor == "process":
+        pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=1, initializer=_process_init, initargs=(controller.name,))
+        pool.submit(int).result()  # Spawn the worker now so controller.start() runs before the first step
+        step = lambda frame: pool.submit(_process_step, _frame_fields(frame)).result()
+        return step, lambda: pool.shutdown(cancel_futures=True)
+
+    controller.start()
+    step = lambda frame: executor.submit(controller.step, frame).result()
+    return step, controller.stop
+
+# === Scheduler ===
+class ControllerRunner:
+    """
+    Runs a controller every controller.period seconds on the latest frame.
+    executor: "thread" (step runs in the runner thread), "process" (step runs in a dedicated
+    worker process) or any concurrent.futures.Executor.
+    prepare() starts the controller (model loading, warm-up) in the background ahead of start();
+    stepping never begins before the controller is ready. If start-up failed, ready is set and
+    prepare_error holds the exception (the runner then never steps).
+    """
+
+    def __init__(self, controller, frame_source, executor="thread", publish_commands=True):
+        self.controller = controller
+        self.frame_source = frame_source
+        self.executor = executor
+        self.publish_commands = publish_commands
+        self.latest = ZERO_COMMAND
+        self.step_count = 0
+        self.frame_listeners = []    # f(frame), called before each step; must not block
+        self.command_listeners = []  # f(command, step_seconds), called after each publish
+        self.ready = threading.Event()
+        self.prepare_seconds = None
+        self.prepare_error = None    # Exception raised by controller start-up / warm-up (ready is still set)
+        self._prepare_thread = None
+        self._step = None
+        self._close = None
+        self._thread = None
+
+    def prepare(self):
+        """Start the controller in a background thread; returns the ready event."""
+        if self._prepare_thread is None:
+            self._prepare_thread = threading.Thread(target=self._prepare, name=f"prepare-{self.controller.name}",
+                                                    daemon=True)
+            self._prepare_thread.start()
+        return self.ready
+
+    def _prepare(self):
+        t_start = time.monotonic()
+        try:
+            self._step, self._close = make_step_function(self.controller, self.executor)
+        except Exception as e:
+            self.prepare_error = e
+            log.error("[Controller] %s failed to start: %r", self.controller.name, e, exc_info=True)
+        self.prepare_seconds = time.monotonic() - t_start
+        self.ready.set()
+
+    def start(self, stop_event):
+        self._thread = threading.Thread(target=self._run, args=(stop_event,),
+                                        name=f"controller-{self.controller.name}", daemon=True)
+        self._thread.start()
+        return self._thread
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self, stop_event):
+        name = self.controller.name
+        period = self.controller.period
+        if self._prepare_thread is None:
+            self._prepare()
+        while not self.ready.wait(0.1):
+            if stop_event.is_set():
+                return
+        if self._step is None:
+            return
+        step, close = self._step, self._close
+        print(f"[Controller] {name} started ({self.executor if isinstance(self.executor, str) else 'executor'}).")
+
+        while not stop_event.is_set():
+            t_start = time.monotonic()
+            frame = self.frame_source() if self.controller.needs_frames else None
+
+            if frame is not None or not self.controller.needs_frames:
+                for listener in self.frame_listeners:
+                    listener(frame)
+                try:
+                    command = step(frame)
+                except Exception as e:
+                    log.warning("[Controller] %s error: %s", name, e)
+                else:
+                    step_seconds = time.monotonic() - t_start
+                    self.latest = command
+                    self.step_count += 1
+                    if self.publish_commands:
+                        publish(command)
+                        STEP_TIME.observe(step_seconds)
+                        try:
+                            COMMAND_LOG.log(command.frame_id, command.left, command.right, step_seconds * 1000,
+                                            (t_start - frame.timestamp) * 1000 if frame is not None and frame.timestamp
+                                            else 0.0)
+                        except Exception as e:
+                            log.warning("[Controller] %s frame log error: %s", name, e)
+                    for listener in self.command_listeners:
+                        listener(command, step_seconds)
+
+            stop_event.wait(max(0.0, period - (time.monotonic() - t_start)))
+
+        close()
+        print(f"[Controller] {name} stopped.")
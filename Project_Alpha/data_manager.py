@@ -4,12 +4,18 @@
 import os
 import time
 import json
-import struct
 import csv
 import shutil
 import config
 import tempfile
 import sys
+import run_catalog
+import metrics
+import race_logging
+from frame_container import FrameContainerWriter, CONTAINER_NAME, INDEX_NAME
+from frame_data import parse_frame_message
+
+log = race_logging.get_logger(__name__)
 
 # === Base Directory Handling ===
 if getattr(sys, 'frozen', False):
@@ -19,13 +25,17 @@ else:
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
 # === Directory structure ===
-INTERACTIVE_DIR = os.path.join(BASE_DIR, "data_interactive")
-os.makedirs(INTERACTIVE_DIR, exist_ok=True)
-
-SOC_FILE = os.path.join(INTERACTIVE_DIR, "latest_SOC.txt")
-RGB_FILE_A = os.path.join(INTERACTIVE_DIR, "latest_RGB_a.jpg")
-RGB_FILE_B = os.path.join(INTERACTIVE_DIR, "latest_RGB_b.jpg")
-RGB_NOW_FILE = os.path.join(INTERACTIVE_DIR, "latest_RGB_now.txt")
+def set_interactive_dir(path):
+    """Point the latest image / SOC files at path (a replay uses its own copy inside the sandbox)."""
+    global INTERACTIVE_DIR, SOC_FILE, RGB_FILE_A, RGB_FILE_B, RGB_NOW_FILE
+    INTERACTIVE_DIR = path
+    os.makedirs(INTERACTIVE_DIR, exist_ok=True)
+    SOC_FILE = os.path.join(INTERACTIVE_DIR, "latest_SOC.txt")
+    RGB_FILE_A = os.path.join(INTERACTIVE_DIR, "latest_RGB_a.jpg")
+    RGB_FILE_B = os.path.join(INTERACTIVE_DIR, "latest_RGB_b.jpg")
+    RGB_NOW_FILE = os.path.join(INTERACTIVE_DIR, "latest_RGB_now.txt")
+
+set_interactive_dir(os.path.join(BASE_DIR, "data_interactive"))
 
 # === SOC IO ===
 def get_latest_soc():
@@ -40,7 +50,7 @@ def update_latest_soc(soc):
         with open(SOC_FILE, "w") as f:
             f.write(f"{soc:.4f}")
     except Exception as e:
-        print(f"[DataManager] Failed to write SOC: {e}")
+        log.warning("[DataManager] Failed to write SOC: %s", e)
 
 # === Create run directory for each session ===
 def create_run_directory():
@@ -54,8 +64,48 @@ def create_run_directory():
 
     return run_dir, images_dir
 
-run_dir, images_dir = create_run_directory()
+# Set by init_run(). Not created at import: spawned worker processes (CONTROLLER_EXECUTOR /
+# SHADOW_EXECUTOR=process) re-import main.py and must not create run directories of their own.
+run_dir = None
+images_dir = None
+is_replay = False  # Session replay into a sandbox folder (with its own data_interactive/): never cataloged or compacted
+
+def init_run(path=None, replay=False):
+    """Create the run directory for this session (or use path); no-op once initialized."""
+    global run_dir, images_dir, is_replay
+    if run_dir is None:
+        is_replay = replay
+        if path is None:
+            run_dir, images_dir = create_run_directory()
+        else:
+            run_dir, images_dir = path, os.path.join(path, "images")
+            os.makedirs(images_dir, exist_ok=True)
+        if replay:
+            set_interactive_dir(os.path.join(run_dir, "data_interactive"))
+    return run_dir
+
+# === Metrics ===
+SOC_GAUGE = metrics.gauge("soc", "Latest state of charge reported by Unity")
+DISK_WRITE = metrics.histogram("disk_write_seconds", "Time to write one training image (file or container)")
+LATEST_WRITE = metrics.histogram("latest_image_write_seconds", "Time to publish the A/B latest image")
+TRAINING_BYTES = metrics.counter("training_bytes_written_total", "Frame bytes written to the run folder")
 _latest_toggle = True
+_container_writer = None  # Created on first frame when JPEG_CONTAINER=1
+_latest_frame = None      # Latest received frame, shared with the controllers
+
+def get_latest_frame():
+    """Return the most recent frame_data.Frame (None before the first frame)."""
+    return _latest_frame
+
+def get_container_writer():
+    global _container_writer
+    if _container_writer is None:
+        _container_writer = FrameContainerWriter(run_dir)
+    return _container_writer
+
+def close_container_writer():
+    if _container_writer is not None:
+        _container_writer.close()
 
 # === Safe JPEG file replace ===
 def safe_replace_jpg(tmp_path, target_path):
@@ -68,71 +118,88 @@ def safe_replace_jpg(tmp_path, target_path):
         except PermissionError:
             time.sleep(0.02)
     else:
-        print(f"[DataManager] Failed to replace JPEG after retries: {target_path}")
+        log.warning("[DataManager] Failed to replace JPEG after retries: %s", target_path)
 
 # === Main data saving logic ===
-def save_image_and_soc(data):
-    global _latest_toggle
-    filename = None
-
-    # Extract header
-    json_size = struct.unpack("I", data[:4])[0]
-    json_header = data[4:4 + json_size].decode("utf-8")
+def ingest_frame(data):
+    """
+    Parse one binary websocket message and hand it to every sink: training image/container,
+    A/B latest image, latest-frame store and SOC file. All sinks share the received buffer.
+    Returns the frame_data.FrameRecord (None if the message was rejected).
+    """
+    global _latest_toggle, _latest_frame
 
     try:
-        json_obj = json.loads(json_header)
-        soc_value = json_obj.get("soc", None)
-        filename = json_obj.get("filename", None)
-    except json.JSONDecodeError:
-        print("[DataManager] Failed to decode JSON header")
+        record = parse_frame_message(data, timestamp=time.monotonic())
+    except ValueError:
+        log.warning("[DataManager] Failed to decode JSON header")
         return None
 
-    jpeg_data = data[4 + json_size:]
-    if not jpeg_data or len(jpeg_data) < 1000:
+    if record.jpeg_size < 1000:
         return None
 
-    # Save to training folder
-    if filename:
-        filename_path = os.path.join(images_dir, filename)
-    else:
-        filename_path = os.path.join(images_dir, f"frame_{int(time.time() * 1000)}.jpg")
+    init_run()
+
+    # Save to training folder (loose JPEG or run container)
+    if not record.filename:
+        record.filename = f"frame_{int(time.time() * 1000)}.jpg"
+    filename_path = os.path.join(images_dir, record.filename)
 
+    t_write = time.perf_counter()
     try:
-        with open(filename_path, "wb") as f:
-            f.write(jpeg_data)
+        if config.JPEG_CONTAINER:
+            get_container_writer().append(record.jpeg, filename=record.filename, frame_id=record.frame_id,
+                                          soc=record.soc)
+        else:
+            with open(filename_path, "wb") as f:
+                f.write(record.jpeg)
+        TRAINING_BYTES.inc(record.jpeg_size)
     except Exception as e:
-        print(f"[DataManager] Failed to write training image: {e}")
+        log.warning("[DataManager] Failed to write training image: %s", e)
+    t_latest = time.perf_counter()
+    DISK_WRITE.observe(t_latest - t_write)
 
-    # Save to intermediate folder with A/B buffering
+    # Save to intermediate folder with A/B buffering (an independent copy written from the shared
+    # buffer: never linked to the training image, which readers of the latest file could then alter or lock)
     try:
         rgb_file_target = RGB_FILE_A if _latest_toggle else RGB_FILE_B
         tmp_path = rgb_file_target + ".tmp"
 
         with open(tmp_path, "wb") as f:
-            f.write(jpeg_data)
-
+            f.write(record.jpeg)
         safe_replace_jpg(tmp_path, rgb_file_target)
 
         with open(RGB_NOW_FILE, "w") as f:
             f.write("a" if _latest_toggle else "b")
 
     except Exception as e:
-        print(f"[DataManager] Failed to update RGB image: {e}")
+        log.warning("[DataManager] Failed to update RGB image: %s", e)
+    LATEST_WRITE.observe(time.perf_counter() - t_latest)
 
     _latest_toggle = not _latest_toggle
 
+    # Publish in-memory frame for the controllers (single reference swap)
+    _latest_frame = record.frame(soc=get_latest_soc() if record.soc is None else None)
+
     # Save SOC
-    if soc_value is not None:
-        update_latest_soc(soc_value)
+    if record.soc is not None:
+        update_latest_soc(record.soc)
+        SOC_GAUGE.set(record.soc)
+
+    return record
 
-    return os.path.basename(filename_path)
+def save_image_and_soc(data):
+    """Ingest one frame message; returns the saved filename (None if rejected)."""
+    record = ingest_frame(data)
+    return record.filename if record is not None else None
 
 # === Save metadata to CSV ===
 def save_race_metadata(race_data):
+    init_run()
     metadata_csv_path = os.path.join(run_dir, "metadata.csv")
 
     if "data" not in race_data:
-        print("[DataManager] Invalid metadata: 'data' key missing")
+        log.warning("[DataManager] Invalid metadata: 'data' key missing")
         return
 
     with open(metadata_csv_path, mode="w", newline="", encoding="utf-8") as file:
@@ -160,9 +227,46 @@ def save_race_metadata(race_data):
                 entry.get("error_code")
             ])
 
-    print(f"[DataManager] Metadata saved to {metadata_csv_path}")
+    log.info("[DataManager] Metadata saved to %s", metadata_csv_path)
+    close_container_writer()
+    if is_replay:
+        log.info("[DataManager] Replayed session → not indexed in the run catalog, no video compaction")
+        return
     copy_unity_log_to_run_dir()
     delete_images_if_flagged()
+    snapshot = save_config_snapshot()
+    index_run_in_catalog(snapshot)
+    start_video_compaction()
+
+# === Save config used for this run (read by run_catalog backfill) ===
+def save_config_snapshot():
+    snapshot = dict(config.CONFIG)
+    snapshot["MODE"] = config.MODE
+    snapshot_path = os.path.join(run_dir, run_catalog.CONFIG_SNAPSHOT_NAME)
+    try:
+        with open(snapshot_path, "w", encoding="utf-8") as f:
+            json.dump(snapshot, f, indent=2, sort_keys=True)
+    except Exception as e:
+        log.warning("[DataManager] Failed to write config snapshot: %s", e)
+    return snapshot
+
+# === Register finished run in the SQLite run catalog ===
+def index_run_in_catalog(config_snapshot=None):
+    try:
+        run_catalog.index_run(run_dir, config_snapshot)
+    except Exception as e:
+        log.warning("[DataManager] Failed to index run in catalog: %s", e)
+
+# === Compact saved frames into one video (background process) ===
+def start_video_compaction():
+    if not (config.VIDEO_COMPACTION and config.JPEG_SAVE):
+        return
+    try:
+        import video_compaction
+        video_compaction.start_background_compaction(run_dir, config.VIDEO_CODEC, config.VIDEO_FPS,
+                                                     bool(config.VIDEO_DELETE_ORIGINALS))
+    except Exception as e:
+        log.warning("[DataManager] Failed to start video compaction: %s", e)
 
 # === Copy Unity log and table input CSV ===
 def copy_unity_log_to_run_dir():
@@ -171,7 +275,7 @@ def copy_unity_log_to_run_dir():
 
     if os.path.exists(log_src_path):
         shutil.copy(log_src_path, log_dest_path)
-        print(f"[DataManager] Copied Unity log to {log_dest_path}")
+        log.info("[DataManager] Copied Unity log to %s", log_dest_path)
 
     if config.MODE == "table":
         table_src_path = os.path.join(BASE_DIR, "table_input.csv")
@@ -179,16 +283,23 @@ def copy_unity_log_to_run_dir():
 
         if os.path.exists(table_src_path):
             shutil.copy(table_src_path, table_dest_path)
-            print(f"[DataManager] Copied table_input.csv to {table_dest_path}")
+            log.info("[DataManager] Copied table_input.csv to %s", table_dest_path)
 
 # === Delete images if config.JPEG_SAVE is 0 ===
 def delete_images_if_flagged():
     if config.JPEG_SAVE == 0:
-        print("[DataManager] JPEG_SAVE=0 → Deleting all saved JPEGs for lightweight mode")
+        log.info("[DataManager] JPEG_SAVE=0 → Deleting all saved JPEGs for lightweight mode")
         for filename in os.listdir(images_dir):
             if filename.endswith(".jpg"):
                 try:
                     os.remove(os.path.join(images_dir, filename))
                 except Exception as e:
-                    print(f"[DataManager] Failed to delete {filename}: {e}")
-        print("[DataManager] All JPEG images deleted")
+                    log.warning("[DataManager] Failed to delete %s: %s", filename, e)
+        for filename in (CONTAINER_NAME, INDEX_NAME):
+            path = os.path.join(run_dir, filename)
+            if os.path.exists(path):
+                try:
+                    os.remove(path)
+                except Exception as e:
+                    log.warning("[DataManager] Failed to delete %s: %s", filename, e)
+        log.info("[DataManager] All JPEG images deleted")
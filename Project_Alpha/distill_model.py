@@ -0,0 +1,123 @@
+# distill_model.py
+# Trains a small / conv TorqueNet variant on recorded runs by distillation from the original
+# model (models/model.pth): the original's torque output for each frame is the training target,
+# so any recorded run can be used, whichever controller drove it.
+# The checkpoint is saved where ModelSpec looks for it (models/model_<variant>_<size>[_gray].pth),
+# ready for AI_VARIANT and compare_models.py.
+#
+# Usage:
+#   python distill_model.py small:64 training_data/run_xxx training_data/run_yyy
+#   python distill_model.py conv:96:gray --catalog-mode ai --limit-runs 20 --epochs 30
+
+import os
+import time
+import argparse
+
+import torch
+import torch.nn as nn
+
+from frame_data import Frame
+from controllers import saturate
+from compare_models import parse_variant, iter_run_frames
+from torque_models import ModelSpec, build_model, load_model, make_input
+
+def build_dataset(run_dirs, spec, max_frames):
+    """(student inputs N x input_features, teacher outputs N x 2) for every frame of the runs."""
+    teacher_spec = ModelSpec("full")
+    teacher = load_model(teacher_spec)
+    inputs, targets = [], []
+    for run_dir in run_dirs:
+        for jpeg, filename, soc in iter_run_frames(run_dir, max_frames):
+            frame = Frame(jpeg, filename=filename, soc=soc)
+            with torch.no_grad():
+                targets.append(teacher(make_input(frame, soc, teacher_spec))[0])
+            inputs.append(make_input(frame, soc, spec)[0])
+    if not inputs:
+        return None, None
+    return torch.stack(inputs), torch.stack(targets)
+
+def saturated_error(model, inputs, targets):
+    """Mean and max of the larger wheel error after saturation (the metric of compare_models.py)."""
+    with torch.no_grad():
+        outputs = model(inputs)
+    errors = [max(abs(saturate(o[0].item()) - saturate(t[0].item())), abs(saturate(o[1].item()) - saturate(t[1].item())))
+              for o, t in zip(outputs, targets)]
+    return sum(errors) / len(errors), max(errors)
+
+def distill(run_dirs, spec, epochs=20, batch_size=64, lr=1e-3, max_frames=5000, holdout=10, out_path=None):
+    """Train the variant to match the original model; every holdout-th frame (>= 2) is kept for validation."""
+    if spec.variant in ("full", "int8"):
+        raise ValueError(f"[Distill] {spec.variant} uses models/model.pth, nothing to train")
+
+    t_start = time.perf_counter()
+    inputs, targets = build_dataset(run_dirs, spec, max_frames)
+    if inputs is None:
+        raise ValueError("[Distill] No frames found in the given runs")
+    is_val = torch.arange(len(inputs)) % max(holdout, 2) == max(holdout, 2) - 1
+    train_x, train_y = inputs[~is_val], targets[~is_val]
+    val_x, val_y = (inputs[is_val], targets[is_val]) if is_val.any() else (train_x, train_y)
+    print(f"[Distill] {len(inputs)} frames from {len(run_dirs)} run(s) "
+          f"({len(train_x)} train / {int(is_val.sum())} validation) in {time.perf_counter() - t_start:.1f} s")
+
+    torch.manual_seed(0)
+    model = build_model(spec)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    loss_fn = nn.MSELoss()
+    best_error, best_state = None, None
+
+    for epoch in range(1, epochs + 1):
+        model.train()
+        order = torch.randperm(len(train_x))
+        total_loss = 0.0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            optimizer.zero_grad()
+            loss = loss_fn(model(train_x[batch]), train_y[batch])
+            loss.backward()
+            optimizer.step()
+            total_loss += loss.item() * len(batch)
+
+        model.eval()
+        mean_error, max_error = saturated_error(model, val_x, val_y)
+        print(f"[Distill] epoch {epoch:>3}: loss {total_loss / len(train_x):.5f}, "
+              f"validation MAE {mean_error:.4f}, max err {max_error:.4f}")
+        if best_error is None or mean_error < best_error:
+            best_error = mean_error
+            best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+
+    out_path = out_path or spec.checkpoint_path
+    os.makedirs(os.path.dirname(os.path.abspath(out_path)), exist_ok=True)
+    torch.save(best_state, out_path)
+    print(f"[Distill] Saved {spec} (validation MAE {best_error:.4f}) to {out_path}")
+    return out_path
+
+def main():
+    parser = argparse.ArgumentParser(description="Train a compact TorqueNet variant from the original model")
+    parser.add_argument("variant", help="variant[:size[:gray]], e.g. small:64 or conv:96:gray")
+    parser.add_argument("runs", nargs="*", help="Run directories (training_data/run_*)")
+    parser.add_argument("--epochs", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--frames", type=int, default=5000, help="Max frames per run")
+    parser.add_argument("--holdout", type=int, default=10, help="Every n-th frame is used for validation only")
+    parser.add_argument("--out", type=str, default=None, help="Checkpoint path (default: models/model_<variant>_...)")
+    parser.add_argument("--catalog-mode", type=str, default=None, help="Select runs from the run catalog by mode")
+    parser.add_argument("--limit-runs", type=int, default=None)
+    args = parser.parse_args()
+
+    run_dirs = list(args.runs)
+    if args.catalog_mode:
+        import run_catalog
+        run_dirs += [r["run_dir"] for r in run_catalog.query_runs(mode=args.catalog_mode, min_frames=1,
+                                                                  limit=args.limit_runs)]
+    if not run_dirs:
+        parser.error("no runs given")
+
+    try:
+        distill(run_dirs, parse_variant(args.variant), args.epochs, args.batch_size, args.lr,
+                args.frames, args.holdout, args.out)
+    except ValueError as e:
+        parser.error(str(e))
+
+if __name__ == "__main__":
+    main()
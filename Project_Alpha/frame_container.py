@@ -0,0 +1,272 @@
+# frame_container.py
+# Append-only single-file frame container for a run (replaces one JPEG file per frame).
+#
+# Layout:
+#   frames.vrc : sequence of records  [header][filename][jpeg payload]
+#                header = magic "VRC2" + frame_id (uint64) + payload length (uint32)
+#                         + soc (float32) + filename length (uint16), little endian
+#                (records with magic "VRCF" from older containers carry a uint32 frame_id)
+#   frames.idx : CSV offset index  frame_id,filename,offset,length,soc  (offset = payload start)
+#
+# The index can always be rebuilt by scanning the container, so a crash only loses the last record.
+#
+# Usage:
+#   python frame_container.py info    training_data/run_xxx/frames.vrc
+#   python frame_container.py extract training_data/run_xxx/frames.vrc --out images_extracted
+
+import os
+import csv
+import mmap
+import struct
+import argparse
+
+CONTAINER_NAME = "frames.vrc"
+INDEX_NAME = "frames.idx"
+
+RECORD_MAGIC = b"VRC2"
+RECORD_HEADER = struct.Struct("<4sQIfH")  # uint64 frame_id: fallback names carry ms timestamps
+RECORD_HEADERS = {RECORD_MAGIC: RECORD_HEADER, b"VRCF": struct.Struct("<4sIIfH")}  # magic -> header
+INDEX_FIELDS = ["frame_id", "filename", "offset", "length", "soc"]
+INDEX_FLUSH_EVERY = 30  # Frames between index flushes
+
+def index_path_for(container_path):
+    """Return the index path that belongs to a container file."""
+    return os.path.join(os.path.dirname(container_path), INDEX_NAME)
+
+def find_container(path):
+    """Return the container path if 'path' is a container file or a folder holding one (else None)."""
+    if os.path.isfile(path) and path.endswith(".vrc"):
+        return path
+    candidate = os.path.join(path, CONTAINER_NAME)
+    if os.path.isfile(candidate):
+        return candidate
+    # A run's images/ folder: look one level up
+    candidate = os.path.join(os.path.dirname(os.path.abspath(path)), CONTAINER_NAME)
+    if os.path.basename(os.path.normpath(path)) == "images" and os.path.isfile(candidate):
+        return candidate
+    return None
+
+class IndexEntry:
+    """One frame in the container index."""
+    __slots__ = ("frame_id", "filename", "offset", "length", "soc")
+
+    def __init__(self, frame_id, filename, offset, length, soc):
+        self.frame_id = frame_id
+        self.filename = filename
+        self.offset = offset
+        self.length = length
+        self.soc = soc
+
+class FrameContainerWriter:
+    """Appends JPEG payloads to one container file and keeps the offset index up to date."""
+
+    def __init__(self, run_dir):
+        self.path = os.path.join(run_dir, CONTAINER_NAME)
+        self.index_path = os.path.join(run_dir, INDEX_NAME)
+        new_index = not os.path.exists(self.index_path)
+
+        self._file = open(self.path, "ab")
+        self._offset = self._file.tell()
+        self._index_file = open(self.index_path, "a", newline="", encoding="utf-8")
+        self._index_writer = csv.writer(self._index_file)
+        if new_index:
+            self._index_writer.writerow(INDEX_FIELDS)
+        self._pending = 0
+        self.frame_count = 0
+
+    def append(self, jpeg_data, filename=None, frame_id=None, soc=None):
+        """Append one JPEG payload. Returns the payload offset inside the container."""
+        name = (filename or "").encode("utf-8")
+        length = len(jpeg_data)
+        frame_id = frame_id if frame_id is not None else self.frame_count + 1
+        soc_value = float(soc) if soc is not None else float("nan")
+
+        self._file.write(RECORD_HEADER.pack(RECORD_MAGIC, frame_id, length, soc_value, len(name)))
+        self._file.write(name)
+        self._file.write(jpeg_data)
+
+        payload_offset = self._offset + RECORD_HEADER.size + len(name)
+        self._offset = payload_offset + length
+        self._index_writer.writerow([frame_id, filename or "", payload_offset, length,
+                                     "" if soc is None else f"{soc_value:.4f}"])
+
+        self.frame_count += 1
+        self._pending += 1
+        if self._pending >= INDEX_FLUSH_EVERY:
+            self.flush()
+        return payload_offset
+
+    def flush(self):
+        self._file.flush()
+        self._index_file.flush()
+        self._pending = 0
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        self._index_file.close()
+
+def scan_container(container_path):
+    """Rebuild the index by walking the record headers (used when frames.idx is missing or short)."""
+    entries = []
+    container_size = os.path.getsize(container_path)
+    with open(container_path, "rb") as f:
+        offset = 0
+        while True:
+            magic = f.read(4)
+            record_header = RECORD_HEADERS.get(magic)
+            if record_header is None:
+                if len(magic) == 4:
+                    print(f"[FrameContainer] Corrupt record at offset {offset}, stopping scan.")
+                break
+            header = magic + f.read(record_header.size - 4)
+            if len(header) < record_header.size:
+                break
+            _, frame_id, length, soc, name_len = record_header.unpack(header)
+            name = f.read(name_len).decode("utf-8", errors="replace")
+            payload_offset = offset + record_header.size + name_len
+            f.seek(length, os.SEEK_CUR)
+            if payload_offset + length > container_size:
+                break  # Truncated final record
+            entries.append(IndexEntry(frame_id, name, payload_offset, length,
+                                      None if soc != soc else soc))
+            offset = payload_offset + length
+    return entries
+
+def load_index(container_path):
+    """Load frames.idx, falling back to a container scan if it is missing or incomplete."""
+    index_path = index_path_for(container_path)
+    entries = []
+    if os.path.exists(index_path):
+        with open(index_path, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                try:
+                    entries.append(IndexEntry(int(row["frame_id"]), row["filename"], int(row["offset"]),
+                                              int(row["length"]), float(row["soc"]) if row["soc"] else None))
+                except (KeyError, ValueError):
+                    break  # Partially written last line
+
+    container_size = os.path.getsize(container_path)
+    if entries:
+        if entries[-1].offset + entries[-1].length == container_size:
+            return entries
+    elif container_size == 0:
+        return entries
+
+    return scan_container(container_path)
+
+class FrameContainerReader:
+    """Random access to a container through mmap. Payloads are returned as zero-copy memoryviews."""
+
+    def __init__(self, container_path):
+        self.path = container_path
+        self.entries = load_index(container_path)
+        self._by_frame_id = {e.frame_id: i for i, e in enumerate(self.entries)}
+        self._by_filename = {e.filename: i for i, e in enumerate(self.entries) if e.filename}
+
+        self._file = open(container_path, "rb")
+        if os.path.getsize(container_path) > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            self._view = memoryview(self._mmap)
+        else:
+            self._mmap = None
+            self._view = memoryview(b"")
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, index):
+        """JPEG payload of the index-th frame as a memoryview into the mapped file."""
+        entry = self.entries[index]
+        return self._view[entry.offset:entry.offset + entry.length]
+
+    def read_frame_id(self, frame_id):
+        return self.read(self._by_frame_id[frame_id])
+
+    def read_filename(self, filename):
+        return self.read(self._by_filename[filename])
+
+    def frame(self, index):
+        """Return the index-th entry as a frame_data.Frame."""
+        from frame_data import Frame
+        entry = self.entries[index]
+        return Frame(self.read(index), filename=entry.filename or None, soc=entry.soc, frame_id=entry.frame_id)
+
+    def __iter__(self):
+        for i in range(len(self.entries)):
+            yield self.entries[i], self.read(i)
+
+    def close(self):
+        try:
+            self._view.release()
+            if self._mmap is not None:
+                self._mmap.close()
+        except BufferError:
+            pass  # Payload views still referenced by the caller; the map is freed with them
+        self._file.close()
+
+def extract_to_jpegs(container_path, output_folder):
+    """Write every frame back out as a loose JPEG (original filenames when available)."""
+    os.makedirs(output_folder, exist_ok=True)
+    count = 0
+    with FrameContainerReader(container_path) as reader:
+        for entry, payload in reader:
+            name = entry.filename or f"frame_{entry.frame_id:06d}.jpg"
+            with open(os.path.join(output_folder, name), "wb") as f:
+                f.write(payload)
+            count += 1
+    print(f"[FrameContainer] Extracted {count} frames to {output_folder}")
+    return count
+
+def pack_folder(images_folder, run_dir=None):
+    """Pack an existing folder of loose frame_*.jpg files into a container (originals are kept)."""
+    from frame_data import parse_frame_id
+    run_dir = run_dir or os.path.dirname(os.path.abspath(images_folder))
+    names = sorted(f for f in os.listdir(images_folder) if f.lower().endswith(".jpg"))
+    writer = FrameContainerWriter(run_dir)
+    try:
+        for name in names:
+            with open(os.path.join(images_folder, name), "rb") as f:
+                writer.append(f.read(), filename=name, frame_id=parse_frame_id(name))
+    finally:
+        writer.close()
+    print(f"[FrameContainer] Packed {len(names)} frames into {writer.path}")
+    return writer.path
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect, extract or create frame containers")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_info = sub.add_parser("info", help="Print frame count and size")
+    p_info.add_argument("container", type=str)
+
+    p_extract = sub.add_parser("extract", help="Extract frames back to loose JPEGs")
+    p_extract.add_argument("container", type=str)
+    p_extract.add_argument("--out", type=str, default=None, help="Output folder (default: <run>/images)")
+
+    p_pack = sub.add_parser("pack", help="Pack a folder of loose JPEGs into a container")
+    p_pack.add_argument("images_folder", type=str)
+    args = parser.parse_args()
+
+    if args.command == "info":
+        with FrameContainerReader(args.container) as reader:
+            size_mb = os.path.getsize(args.container) / (1024 * 1024)
+            print(f"[FrameContainer] {len(reader)} frames, {size_mb:.1f} MB")
+            if len(reader):
+                print(f"[FrameContainer] frame_id {reader.entries[0].frame_id} .. {reader.entries[-1].frame_id}")
+    elif args.command == "extract":
+        out = args.out or os.path.join(os.path.dirname(os.path.abspath(args.container)), "images")
+        extract_to_jpegs(args.container, out)
+    elif args.command == "pack":
+        pack_folder(args.images_folder)
+
+if __name__ == "__main__":
+    main()
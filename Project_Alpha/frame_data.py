@@ -0,0 +1,234 @@
+# frame_data.py
+# Per-frame object that owns the raw JPEG bytes and builds decoded views on first access.
+# Each view (RGB, grayscale, ROI crops, reduced-scale decode, model tensor) is cached,
+# so a frame is decoded at most once for each resolution it is used at.
+# parse_frame_message() turns a raw websocket frame message into a FrameRecord whose header
+# and JPEG fields are memoryviews over the received buffer; the disk sinks, the latest-frame
+# store and the decoders all read that one buffer.
+
+import io
+import os
+import re
+import json
+import struct
+
+import cv2
+import numpy as np
+from PIL import Image
+
+_FRAME_ID_PATTERN = re.compile(r"(\d+)")
+_MESSAGE_PREFIX = struct.Struct("<I")  # uint32 JSON header length, then header, then JPEG
+# Fast path for the usual header ({"soc": 0.87, "filename": "frame_000123.jpg"});
+# anything else (escapes, null, missing keys) falls back to json.loads
+_HEADER_SOC = re.compile(rb'"soc"\s*:\s*(-?[0-9][0-9.eE+-]*)')
+_HEADER_FILENAME = re.compile(rb'"filename"\s*:\s*"([^"\\]*)"')
+_TENSOR_TRANSFORMS = {}  # ((width, height), grayscale) -> torchvision transform (built lazily)
+
+def parse_frame_id(filename):
+    """Extract the numeric frame id from a name like 'frame_000123.jpg' (None if absent)."""
+    if not filename:
+        return None
+    match = _FRAME_ID_PATTERN.search(os.path.basename(filename))
+    return int(match.group(1)) if match else None
+
+def parse_header(view):
+    """Return (soc, filename) from a JSON header given as a bytes-like object."""
+    soc_match = _HEADER_SOC.search(view)
+    name_match = _HEADER_FILENAME.search(view)
+    if soc_match and name_match:
+        return float(soc_match.group(1)), name_match.group(1).decode("utf-8")
+    header = json.loads(bytes(view))
+    if not isinstance(header, dict):
+        raise ValueError("Frame header is not a JSON object")
+    soc, filename = header.get("soc"), header.get("filename")
+    if not (soc is None or isinstance(soc, (int, float))) or not (filename is None or isinstance(filename, str)):
+        raise ValueError("Frame header has invalid soc / filename")
+    return soc, filename
+
+class FrameRecord:
+    """
+    One received frame message. header and jpeg are memoryviews into buffer (no payload copy);
+    soc / filename / frame_id are the decoded header fields.
+    """
+    __slots__ = ("buffer", "header", "jpeg", "header_size", "jpeg_size",
+                 "soc", "filename", "frame_id", "timestamp")
+
+    def __init__(self, buffer, header, jpeg, soc=None, filename=None, timestamp=None):
+        self.buffer = buffer
+        self.header = header
+        self.jpeg = jpeg
+        self.header_size = len(header)
+        self.jpeg_size = len(jpeg)
+        self.soc = soc
+        self.filename = filename
+        self.frame_id = parse_frame_id(filename)
+        self.timestamp = timestamp
+
+    def frame(self, soc=None):
+        """Frame sharing this record's JPEG view (soc overrides the header value if given)."""
+        return Frame(self.jpeg, filename=self.filename, soc=self.soc if soc is None else soc,
+                     frame_id=self.frame_id, timestamp=self.timestamp)
+
+def parse_frame_message(data, timestamp=None):
+    """
+    Parse a binary websocket message [uint32 header length][JSON header][JPEG] without copying
+    the payload. Raises ValueError if the message is truncated or the header is not a JSON object.
+    """
+    view = memoryview(data)
+    if len(view) < _MESSAGE_PREFIX.size:
+        raise ValueError("Frame message too short")
+    header_size = _MESSAGE_PREFIX.unpack_from(view)[0]
+    header_end = _MESSAGE_PREFIX.size + header_size
+    if header_end > len(view):
+        raise ValueError("Frame header exceeds message")
+    header = view[_MESSAGE_PREFIX.size:header_end]
+    soc, filename = parse_header(header)
+    return FrameRecord(data, header, view[header_end:], soc, filename, timestamp)
+
+class _BufferReader(io.RawIOBase):
+    """Seekable read-only file object over a memoryview (io.BytesIO would copy the buffer)."""
+
+    def __init__(self, view):
+        self._view = view
+        self._pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, b):
+        n = max(0, min(len(b), len(self._view) - self._pos))
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._pos
+        elif whence == io.SEEK_END:
+            offset += len(self._view)
+        self._pos = max(0, offset)
+        return self._pos
+
+    def tell(self):
+        return self._pos
+
+def _get_tensor_transform(size, grayscale=False):
+    """Build (once) the Resize (+ Grayscale) + ToTensor pipeline used by the AI models."""
+    key = (size, grayscale)
+    transform = _TENSOR_TRANSFORMS.get(key)
+    if transform is None:
+        from torchvision import transforms  # Lazy import (only AI mode needs torch)
+        steps = [transforms.Resize((size[1], size[0]))]
+        if grayscale:
+            steps.append(transforms.Grayscale())
+        steps.append(transforms.ToTensor())
+        transform = transforms.Compose(steps)
+        _TENSOR_TRANSFORMS[key] = transform
+    return transform
+
+class Frame:
+    """One camera frame. Holds the JPEG payload and memoizes every decoded view."""
+
+    def __init__(self, jpeg, filename=None, soc=None, frame_id=None, timestamp=None):
+        self.jpeg = jpeg
+        self.filename = filename
+        self.soc = soc
+        self.frame_id = frame_id if frame_id is not None else parse_frame_id(filename)
+        self.timestamp = timestamp
+        self._views = {}
+
+    @classmethod
+    def from_file(cls, path, soc=None, timestamp=None):
+        """Read a JPEG file from disk into a new Frame (no decoding yet)."""
+        with open(path, "rb") as f:
+            jpeg = f.read()
+        return cls(jpeg, filename=os.path.basename(path), soc=soc, timestamp=timestamp)
+
+    # === Cache helpers ===
+    def _cached(self, key, build):
+        view = self._views.get(key)
+        if view is None:
+            view = build()
+            self._views[key] = view
+        return view
+
+    def _open(self):
+        # BytesIO shares a bytes payload; memoryviews (websocket buffer, mmap) are read in place
+        if isinstance(self.jpeg, bytes):
+            return Image.open(io.BytesIO(self.jpeg))
+        return Image.open(_BufferReader(memoryview(self.jpeg).cast("B")))
+
+    # === Full-resolution views ===
+    @property
+    def size(self):
+        """(width, height) of the full-resolution image (reads only the JPEG header)."""
+        return self._cached("size", lambda: self._open().size)
+
+    def image(self):
+        """Full-resolution PIL image in RGB."""
+        return self._cached("image", lambda: self._open().convert("RGB"))
+
+    def rgb(self):
+        """Full-resolution RGB array (H x W x 3, uint8, read-only)."""
+        return self._cached("rgb", lambda: np.asarray(self.image()))
+
+    def bgr(self):
+        """Full-resolution BGR array for OpenCV drawing (copy before modifying)."""
+        return self._cached("bgr", lambda: cv2.cvtColor(self.rgb(), cv2.COLOR_RGB2BGR))
+
+    def gray(self):
+        """Full-resolution grayscale array (H x W, uint8)."""
+        return self._cached("gray", lambda: cv2.cvtColor(self.rgb(), cv2.COLOR_RGB2GRAY))
+
+    def roi(self, top, bottom, left=0.0, right=1.0, view="gray"):
+        """
+        Crop of a cached view, given as fractions of the image size.
+        Returns a NumPy view into the cached array (no pixel copy).
+        """
+        key = ("roi", view, top, bottom, left, right)
+
+        def build():
+            width, height = self.size
+            source = self.gray() if view == "gray" else self.rgb()
+            return source[int(height * top):int(height * bottom), int(width * left):int(width * right)]
+
+        return self._cached(key, build)
+
+    # === Reduced-resolution views ===
+    def reduced(self, scale):
+        """
+        PIL RGB image decoded at 1/scale resolution using JPEG draft mode.
+        The decoder skips DCT work, so this is much cheaper than a full decode + resize.
+        """
+        if scale <= 1:
+            return self.image()
+
+        def build():
+            img = self._open()
+            width, height = img.size
+            img.draft("RGB", (max(1, width // scale), max(1, height // scale)))
+            return img.convert("RGB")
+
+        return self._cached(("reduced", scale), build)
+
+    def draft_scale(self, size):
+        """Largest JPEG draft scale (1, 2, 4, 8) whose decode is still at least size=(width, height)."""
+        width, height = self.size
+        scale = 1
+        while scale < 8 and width // (scale * 2) >= size[0] and height // (scale * 2) >= size[1]:
+            scale *= 2
+        return scale
+
+    def tensor(self, size=(224, 224), grayscale=False, draft=False):
+        """
+        Model input tensor (C x H x W, float32 in [0, 1]) resized to size=(width, height).
+        draft=True resizes from the cheapest reduced-scale decode that is still large enough.
+        """
+        def build():
+            source = self.reduced(self.draft_scale(size)) if draft else self.image()
+            return _get_tensor_transform(size, grayscale)(source)
+
+        return self._cached(("tensor", size, grayscale, draft), build)
@@ -1,101 +1,63 @@
 # inference_input.py
-# Inference loop using a trained PyTorch model to predict wheel torques from RGB image + SOC
+# Inference controller using a trained PyTorch model to predict wheel torques from RGB image + SOC
 
 import time
-import os
 import torch
-import torch.nn as nn
-from torchvision import transforms
-from PIL import Image
 
-import data_manager  # For reading the latest SOC value
-
-# Global torque values to be accessed externally
-leftTorque = 0.0
-rightTorque = 0.0
-
-def saturate(value, min_val=-1.0, max_val=1.0):
-    """Clamp the input value within the specified range."""
-    return max(min_val, min(max_val, value))
-
-def get_latest_rgb_path():
-    """Determine the most recent RGB image path using the A/B flag."""
-    flag_path = os.path.join("data_interactive", "latest_RGB_now.txt")
-    try:
-        with open(flag_path, "r") as f:
-            mark = f.read().strip()
-            if mark in ("a", "b"):
-                return os.path.join("data_interactive", f"latest_RGB_{mark}.jpg")
-    except Exception:
-        pass
-    return os.path.join("data_interactive", "latest_RGB_a.jpg")  # Default fallback
-
-class TorqueNet(nn.Module):
-    """Simple MLP for torque prediction based on image + SOC."""
-    def __init__(self, input_size):
-        super().__init__()
-        self.fc = nn.Sequential(
-            nn.Linear(input_size, 512),
-            nn.ReLU(),
-            nn.Linear(512, 128),
-            nn.ReLU(),
-            nn.Linear(128, 2)
-        )
-
-    def forward(self, x):
-        return self.fc(x)
-
-def run_ai_loop(stop_event):
-    """Main loop: loads latest image and SOC, runs inference, outputs torques."""
-    global leftTorque, rightTorque
-
-    print("[Inference] AI loop started.")
-
-    # Load trained model
-    model_path = os.path.join(os.path.dirname(__file__), "models", "model.pth")
-    input_size = 224 * 224 * 3 + 1  # Image (flattened) + 1 SOC
-    model = TorqueNet(input_size)
-    model.load_state_dict(torch.load(model_path, map_location="cpu"))
-    model.eval()
-
-    # Image preprocessing
-    transform = transforms.Compose([
-        transforms.Resize((224, 224)),
-        transforms.ToTensor(),
-    ])
-
-    while not stop_event.is_set():
-        try:
-            image_path = get_latest_rgb_path()
-            if not os.path.exists(image_path):
-                time.sleep(0.05)
-                continue
-
-            try:
-                image = Image.open(image_path).convert("RGB")
-            except Exception:
-                time.sleep(0.05)
-                continue
-
-            image_tensor = transform(image).view(-1)
-            soc = data_manager.get_latest_soc()
-            soc_tensor = torch.tensor([soc], dtype=torch.float32)
-
-            input_tensor = torch.cat([image_tensor, soc_tensor]).unsqueeze(0)
-
-            with torch.no_grad():
-                output = model(input_tensor)
-                raw_left = output[0][0].item()
-                raw_right = output[0][1].item()
-
-                leftTorque = saturate(raw_left)
-                rightTorque = saturate(raw_right)
-
-            print(f"[Inference] Torque: L={leftTorque:.3f}, R={rightTorque:.3f}, SOC={soc:.2f}")
-
-        except Exception as e:
-            print(f"[Inference] Error: {e}")
-
-        time.sleep(0.05)
-
-    print("[Inference] AI loop stopped.")
+import config
+import race_logging
+from change_detector import ChangeDetector
+from controllers import Controller, register_controller, make_command
+from torque_models import TorqueNet, ModelSpec, load_model, warm_up, make_input  # TorqueNet re-exported for old scripts
+
+log = race_logging.get_logger(__name__)
+AI_LOG = race_logging.frame_channel("ai", ("raw_left", "raw_right", "soc"))
+
+@register_controller("ai")
+class AIController(Controller):
+    """Runs the TorqueNet variant selected by AI_VARIANT on the latest frame and SOC."""
+
+    def __init__(self, spec=None):
+        self.spec = spec
+        self.model = None
+        self.load_seconds = None
+        self.warmup_seconds = None
+        self.change_detector = None
+
+    def start(self):
+        # Load trained model (memory-mapped) and run a warm-up pass before the first real frame
+        if self.spec is None:
+            self.spec = ModelSpec.from_config(config)
+        t_start = time.perf_counter()
+        self.model = load_model(self.spec)
+        self.load_seconds = time.perf_counter() - t_start
+        self.warmup_seconds = warm_up(self.model, self.spec)
+        print(f"[Inference] Model loaded: {self.spec} "
+              f"(load {self.load_seconds * 1000:.0f} ms, warm-up {self.warmup_seconds * 1000:.0f} ms)")
+        # Optional reuse of the model output on unchanged frames (CHANGE_THRESHOLD > 0)
+        self.change_detector = ChangeDetector.from_config(config, "ai")
+
+    def infer(self, frame):
+        """Raw (left, right) model output for a frame."""
+        soc = frame.soc if frame.soc is not None else 0.0
+        input_tensor = make_input(frame, soc, self.spec)
+
+        with torch.no_grad():
+            output = self.model(input_tensor)
+            return output[0][0].item(), output[0][1].item()
+
+    def step(self, frame):
+        soc = frame.soc if frame.soc is not None else 0.0
+        if self.change_detector is not None:
+            raw_left, raw_right = self.change_detector.run(frame, self.infer, key=soc)  # SOC is a model input
+        else:
+            raw_left, raw_right = self.infer(frame)
+
+        command = make_command(raw_left, raw_right, frame)
+        AI_LOG.log(frame.frame_id, raw_left, raw_right, soc)
+        log.info("[Inference] Torque: L=%.3f, R=%.3f, SOC=%.2f", command.left, command.right, soc)
+        return command
+
+    def stop(self):
+        if self.change_detector is not None:
+            print(self.change_detector.format_summary())
@@ -1,11 +1,11 @@
 # keyboard_input.py
 # Allows manual control of left and right wheel torque using keyboard keys
 
-import threading
 import keyboard
-import time
 import sys
 
+from controllers import Controller, register_controller, make_command
+
 # Windows only: clear keyboard input buffer to avoid stuck input
 def clear_input_buffer():
     if sys.platform == "win32":
@@ -26,10 +26,6 @@ TORQUE_VALUES = {
     "m": (0, -1)     # Right wheel backward
 }
 
-# Current torque values
-leftTorque = 0.0
-rightTorque = 0.0
-
 # Track key states (pressed/released)
 key_states = {key: False for key in TORQUE_VALUES}
 key_states["space"] = False  # Reserved for future use (e.g., brake)
@@ -39,13 +35,20 @@ def update_key_state(event):
     if event.name in key_states:
         key_states[event.name] = event.event_type == "down"
 
-# Main input listener loop
-def listen_for_input(stop_event):
-    global leftTorque, rightTorque
+@register_controller("keyboard")
+class KeyboardController(Controller):
+    """Manual driving: held keys ramp torque up, released keys drop it to zero."""
+    needs_frames = False
+    wait_for_first_frame = False
+
+    def __init__(self):
+        self.left = 0.0
+        self.right = 0.0
 
-    keyboard.hook(update_key_state)
+    def start(self):
+        keyboard.hook(update_key_state)
 
-    while not stop_event.is_set():
+    def step(self, frame):
         delta_l, delta_r = 0.0, 0.0
 
         for key, (lt, rt) in TORQUE_VALUES.items():
@@ -54,20 +57,22 @@ def listen_for_input(stop_event):
                 delta_r += TORQUE_STEP * rt
 
         # Apply torque changes
-        leftTorque += delta_l
-        rightTorque += delta_r
+        self.left += delta_l
+        self.right += delta_r
 
         # Instant decay when key is released
         if delta_l == 0:
-            leftTorque = 0.0
+            self.left = 0.0
         if delta_r == 0:
-            rightTorque = 0.0
+            self.right = 0.0
 
         # Clamp torque to maximum allowed range
-        leftTorque = max(-MAX_TORQUE, min(MAX_TORQUE, leftTorque))
-        rightTorque = max(-MAX_TORQUE, min(MAX_TORQUE, rightTorque))
+        self.left = max(-MAX_TORQUE, min(MAX_TORQUE, self.left))
+        self.right = max(-MAX_TORQUE, min(MAX_TORQUE, self.right))
 
-        time.sleep(0.05)
+        return make_command(self.left, self.right)
 
-    clear_input_buffer()
-    print("[Keyboard] Listener stopped.")
+    def stop(self):
+        keyboard.unhook(update_key_state)
+        clear_input_buffer()
+        print("[Keyboard] Listener stopped.")
@@ -8,10 +8,14 @@ import os
 import keyboard
 
 import config
+import controllers
+import data_manager
 import websocket_server
-import keyboard_input
-import inference_input
-import table_input  # Required for table mode
+import shadow_mode
+import metrics
+import race_logging
+import resource_monitor
+import change_detector
 
 stop_event = threading.Event()  # Global event to signal thread stop
 
@@ -30,36 +34,55 @@ async def main():
     print("[Main] Starting system...")
     race_end_sent = False
 
+    # Create this session's run folder (only here: worker processes re-import this module)
+    data_manager.init_run()
+
+    # Queue-backed console logging for the per-frame paths (+ optional binary frame log)
+    race_logging.setup_from_config(config, data_manager.run_dir)
+
+    # Live telemetry (local Prometheus endpoint + periodic snapshots to the run folder)
+    metrics.start(data_manager.run_dir, config.METRICS_PORT, config.METRICS_SNAPSHOT_S)
+
+    # Background sampling of CPU, memory, thread CPU time and disk writes (summary at shutdown)
+    resource_monitor.start(data_manager.run_dir, config.RESOURCE_SAMPLE_S)
+
     # Start WebSocket server
     server_task = asyncio.create_task(websocket_server.start_server(stop_event))
 
+    # Look up the controller for the selected mode and start preparing it (model loading,
+    # warm-up) in the background so it overlaps with Unity startup
+    controller = controllers.create_controller(config.MODE)
+    runner = controllers.ControllerRunner(controller, data_manager.get_latest_frame,
+                                          executor=config.CONTROLLER_EXECUTOR)
+    runner.prepare()
+
     # Launch Unity only if not in DEBUG mode
     if config.DEBUG_MODE == 0:
         launch_unity_exe()
     else:
         print("[Main] DEBUG_MODE = 1 → Please launch Unity manually.")
 
-    input_thread = None
-
-    if config.MODE == "keyboard":
-        input_thread = threading.Thread(target=keyboard_input.listen_for_input, args=(stop_event,), daemon=True)
-        input_thread.start()
+    # Optional shadow controllers evaluated on the same frames (never drive the robot)
+    shadows = shadow_mode.ShadowManager(
+        shadow_mode.parse_shadow_modes(config.SHADOW_MODES, config.SHADOW_BUDGET_MS),
+        data_manager.run_dir, driver_mode=config.MODE, executor=config.SHADOW_EXECUTOR)
 
-    elif config.MODE == "ai":
+    if controller.wait_for_first_frame:
         await asyncio.to_thread(websocket_server.frame_received_event.wait)
-        input_thread = threading.Thread(target=inference_input.run_ai_loop, args=(stop_event,), daemon=True)
-        input_thread.start()
-
-    elif config.MODE == "rule_based":
-        await asyncio.to_thread(websocket_server.frame_received_event.wait)
-        import rule_based_input  # Lazy import
-        input_thread = threading.Thread(target=rule_based_input.run_rule_based_loop, args=(stop_event,), daemon=True)
-        input_thread.start()
-
-    elif config.MODE == "table":
-        await asyncio.to_thread(websocket_server.frame_received_event.wait)
-        table_input.start_csv_replay()
-        input_task = asyncio.create_task(table_input.run_table_input_loop(stop_event))
+    if not runner.ready.is_set():
+        print("[Main] Waiting for controller to be ready...")
+        await asyncio.to_thread(runner.ready.wait)
+    if runner.prepare_error is not None:
+        # Never race at zero torque with a dead controller: end the race and shut down
+        print(f"[Main] ERROR: controller '{controller.name}' failed to start: {runner.prepare_error!r}")
+        print("[Main] Aborting race.")
+        await websocket_server.send_race_end_signal()
+        stop_event.set()
+    else:
+        print(f"[Main] Controller '{controller.name}' ready after {runner.prepare_seconds:.2f} s.")
+        shadows.attach(runner, stop_event)
+        runner.command_listeners.append(websocket_server.watchdog.record_step)
+        runner.start(stop_event)
 
     try:
         while not stop_event.is_set():
@@ -82,8 +105,13 @@ async def main():
         print("[Main] Server task cancelled.")
 
     stop_event.set()
-    if input_thread:
-        input_thread.join()
+    runner.join()
+    shadows.close()
+    websocket_server.watchdog.report(data_manager.run_dir)
+    change_detector.write_report(data_manager.run_dir)
+    resource_monitor.stop()
+    metrics.stop(data_manager.run_dir)
+    race_logging.shutdown()
 
     print("[Main] System fully stopped.")
 
@@ -0,0 +1,208 @@
+# metrics.py
+# Live race telemetry: counters, gauges and histograms kept in memory, exposed on a local HTTP
+# endpoint in Prometheus text format (http://127.0.0.1:<METRICS_PORT>/metrics) and appended to
+# metrics.jsonl in the run directory every METRICS_SNAPSHOT_S seconds.
+#
+# Updating a metric does no I/O, so it can sit in the receive loop and the controller loops.
+# Counters take a per-counter lock (they are shared by the driving and shadow threads); gauges and
+# histograms are plain attribute updates meant for one writer thread. Readers (HTTP endpoint,
+# snapshots) only take unsynchronized copies.
+# The HTTP endpoint is off unless METRICS_PORT is set.
+#
+# Usage:
+#   FRAMES = metrics.counter("frames_received_total", "Frames received from Unity")
+#   FRAMES.inc()
+
+import os
+import json
+import time
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "vrr_"
+SNAPSHOT_NAME = "metrics.jsonl"
+# Default histogram buckets [s]: 0.5 ms .. 1 s
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+class Counter:
+    """Monotonically increasing value (safe to increment from several threads)."""
+    __slots__ = ("name", "help", "value", "_lock")
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def snapshot(self):
+        return self.value
+
+class Gauge:
+    """Value that can go up and down; fn (optional) is evaluated when the gauge is read."""
+    __slots__ = ("name", "help", "value", "fn")
+    kind = "gauge"
+
+    def __init__(self, name, help_text, fn=None):
+        self.name = name
+        self.help = help_text
+        self.value = 0.0
+        self.fn = fn
+
+    def set(self, value):
+        self.value = value
+
+    def snapshot(self):
+        if self.fn is not None:
+            try:
+                return self.fn()
+            except Exception:
+                return None
+        return self.value
+
+class Histogram:
+    """Fixed-bucket histogram (bucket counts are per bucket, cumulated only when rendered)."""
+    __slots__ = ("name", "help", "bounds", "counts", "sum", "count")
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.bounds = tuple(buckets)
+        self.counts = [0] * (len(self.bounds) + 1)  # Last slot = +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        return {"buckets": dict(zip([*map(str, self.bounds), "+Inf"], self.counts)),
+                "sum": self.sum, "count": self.count}
+
+# === Registry ===
+_METRICS = {}
+_lock = threading.Lock()  # Only guards registration
+
+def _register(cls, name, *args, **kwargs):
+    with _lock:
+        metric = _METRICS.get(name)
+        if metric is None:
+            metric = cls(name, *args, **kwargs)
+            _METRICS[name] = metric
+        elif not isinstance(metric, cls):
+            raise ValueError(f"[Metrics] {name} already registered as a {metric.kind}")
+        return metric
+
+def counter(name, help_text=""):
+    return _register(Counter, name, help_text)
+
+def gauge(name, help_text="", fn=None):
+    return _register(Gauge, name, help_text, fn=fn)
+
+def histogram(name, help_text="", buckets=DEFAULT_BUCKETS):
+    return _register(Histogram, name, help_text, buckets=buckets)
+
+def snapshot():
+    """{name: value} for every metric (histograms as {buckets, sum, count})."""
+    return {name: metric.snapshot() for name, metric in list(_METRICS.items())}
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format."""
+    lines = []
+    for name, metric in sorted(_METRICS.items()):
+        full_name = PREFIX + name
+        if metric.help:
+            lines.append(f"# HELP {full_name} {metric.help}")
+        lines.append(f"# TYPE {full_name} {metric.kind}")
+        if metric.kind == "histogram":
+            counts, total, count = list(metric.counts), metric.sum, metric.count
+            cumulative = 0
+            for bound, bucket_count in zip([*map(repr, metric.bounds), "+Inf"], counts):
+                cumulative += bucket_count
+                lines.append(f'{full_name}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{full_name}_sum {total}")
+            lines.append(f"{full_name}_count {count}")
+        else:
+            value = metric.snapshot()
+            lines.append(f"{full_name} {'NaN' if value is None else value}")
+    return "\n".join(lines) + "\n"
+
+# === HTTP endpoint ===
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # No console line per scrape
+
+_server = None
+_snapshot_thread = None
+_snapshot_stop = threading.Event()
+
+def start_http_server(port, host="127.0.0.1"):
+    """Serve /metrics on localhost in a daemon thread (port 0 = disabled)."""
+    global _server
+    if not port or _server is not None:
+        return _server
+    try:
+        _server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+    except OSError as e:
+        print(f"[Metrics] Could not start endpoint on {host}:{port}: {e}")
+        return None
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[Metrics] Endpoint running at http://{host}:{port}/metrics")
+    return _server
+
+# === Run directory snapshots ===
+def write_snapshot(run_dir):
+    """Append one timestamped snapshot line to metrics.jsonl in the run directory."""
+    try:
+        with open(os.path.join(run_dir, SNAPSHOT_NAME), "a", encoding="utf-8") as f:
+            f.write(json.dumps({"time": round(time.time(), 3), "metrics": snapshot()}) + "\n")
+    except Exception as e:
+        print(f"[Metrics] Failed to write snapshot: {e}")
+
+def _snapshot_loop(run_dir, interval):
+    while not _snapshot_stop.wait(interval):
+        write_snapshot(run_dir)
+
+def start(run_dir, port=0, snapshot_interval=0):
+    """Start the HTTP endpoint and the periodic snapshot writer (either may be disabled with 0)."""
+    global _snapshot_thread
+    start_http_server(port)
+    if snapshot_interval and run_dir and _snapshot_thread is None:
+        _snapshot_stop.clear()
+        _snapshot_thread = threading.Thread(target=_snapshot_loop, args=(run_dir, float(snapshot_interval)),
+                                            name="metrics-snapshot", daemon=True)
+        _snapshot_thread.start()
+
+def stop(run_dir=None):
+    """Stop the endpoint and snapshot writer; writes a final snapshot if run_dir is given."""
+    global _server, _snapshot_thread
+    if _snapshot_thread is not None:
+        _snapshot_stop.set()
+        _snapshot_thread.join()
+        _snapshot_thread = None
+    if run_dir:
+        write_snapshot(run_dir)
+    if _server is not None:
+        _server.shutdown()
+        _server.server_close()
+        _server = None
@@ -0,0 +1,246 @@
+# race_logging.py
+# Non-blocking logging for the per-frame hot paths (controllers, line tracing, torque sender).
+#
+# - Loggers put records on a queue; one background thread formats them and writes to the console,
+#   so a slow (Windows) console never stalls a controller step.
+# - Every INFO/DEBUG call site is rate limited (LOG_RATE_LIMIT messages/s); suppressed messages are counted
+#   and reported with the next message from that site. extra={"sample": N} logs only every Nth call.
+#   WARNING and above are never limited or sampled.
+# - Levels per module: LOG_LEVEL (default) and LOG_LEVELS, e.g. "rule_based_algorithms:WARNING,inference_input:INFO".
+# - Optional binary per-frame log (FRAME_LOG=1): numeric values per frame appended to frame_log.vrl in the
+#   run directory; convert with  python race_logging.py training_data/run_xxx/frame_log.vrl --csv out/
+#
+# Usage:
+#   log = race_logging.get_logger(__name__)
+#   log.info("[LineTrace] deviation=%.3f", deviation)        # Formatted in the logging thread
+#   LINE_LOG = race_logging.frame_channel("linetrace", ("deviation", "angle_deg"))
+#   LINE_LOG.log(frame.frame_id, deviation, angle)
+
+import os
+import sys
+import csv
+import json
+import time
+import queue
+import struct
+import logging
+import argparse
+import threading
+import logging.handlers
+
+FRAME_LOG_NAME = "frame_log.vrl"
+FRAME_LOG_MAGIC = b"VRF2"
+RECORD_HEADER = struct.Struct("<BHH")       # record type, channel id, payload length
+DATA_PREFIX = "<dQ"                         # time.monotonic(), frame id (uint64: ids can be ms timestamps)
+DATA_PREFIXES = {FRAME_LOG_MAGIC: DATA_PREFIX, b"VRFL": "<dI"}  # Older logs: uint32 frame id
+RECORD_DEFINITION = 0
+RECORD_DATA = 1
+NO_FRAME_ID = 0xFFFFFFFFFFFFFFFF
+
+def get_logger(name):
+    return logging.getLogger(name)
+
+def parse_levels(value):
+    """Parse 'rule_based_algorithms:WARNING,inference_input:INFO' into {logger name: level}."""
+    levels = {}
+    for item in str(value or "").split(","):
+        name, _, level = item.strip().partition(":")
+        if name and level:
+            levels[name.strip()] = level.strip().upper()
+    return levels
+
+# === Console logging ===
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves formatting (the expensive part) to the listener thread."""
+
+    def prepare(self, record):
+        return record
+
+class RateLimitFilter(logging.Filter):
+    """Per INFO/DEBUG call site: at most rate_limit records per second, and every Nth if extra={"sample": N}.
+    WARNING and above always pass."""
+
+    def __init__(self, rate_limit):
+        super().__init__()
+        self.interval = 1.0 / rate_limit if rate_limit else 0.0
+        self._sites = {}  # (pathname, lineno) -> [next allowed time, suppressed count, call count]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        site = self._sites.get((record.pathname, record.lineno))
+        if site is None:
+            site = self._sites[(record.pathname, record.lineno)] = [0.0, 0, 0]
+        site[2] += 1
+        sample = getattr(record, "sample", 1)
+        if sample > 1 and (site[2] - 1) % sample:
+            return False
+        now = record.created
+        if now < site[0]:
+            site[1] += 1
+            return False
+        site[0] = now + self.interval
+        if site[1]:
+            record.suppressed = site[1]
+            site[1] = 0
+        return True
+
+class _ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} (+{suppressed} suppressed)" if suppressed else text
+
+_listener = None
+_queue_handler = None
+_frame_log = None
+
+def setup(run_dir=None, level="INFO", levels="", rate_limit=5, frame_log=False):
+    """Route all logging through the background queue; optionally open the binary frame log."""
+    global _listener, _queue_handler, _frame_log
+    if _listener is not None:
+        return
+
+    console = logging.StreamHandler(sys.stdout)
+    console.setFormatter(_ConsoleFormatter("%(message)s"))
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, console)
+    _listener.start()
+
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    _queue_handler.addFilter(RateLimitFilter(float(rate_limit or 0)))
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(str(level or "INFO").upper())
+    for name, module_level in parse_levels(levels).items():
+        logging.getLogger(name).setLevel(module_level)
+
+    if frame_log and run_dir:
+        _frame_log = FrameLogWriter(os.path.join(run_dir, FRAME_LOG_NAME))
+        for channel in _CHANNELS.values():
+            _frame_log.define(channel)
+
+def setup_from_config(config, run_dir=None):
+    setup(run_dir, config.LOG_LEVEL, config.LOG_LEVELS, config.LOG_RATE_LIMIT, config.FRAME_LOG)
+
+def shutdown():
+    """Flush queued log records and close the frame log."""
+    global _listener, _queue_handler, _frame_log
+    if _frame_log is not None:
+        _frame_log.close()
+        _frame_log = None
+    if _listener is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _listener.stop()
+        _listener = None
+        _queue_handler = None
+
+# === Binary per-frame log ===
+class FrameChannel:
+    """Named group of numeric per-frame values (one record per log() call)."""
+    __slots__ = ("channel_id", "name", "fields", "_struct")
+
+    def __init__(self, channel_id, name, fields):
+        self.channel_id = channel_id
+        self.name = name
+        self.fields = tuple(fields)
+        self._struct = struct.Struct(DATA_PREFIX + "f" * len(self.fields))
+
+    def log(self, frame_id, *values):
+        """Queue one record (no-op unless FRAME_LOG=1)."""
+        writer = _frame_log
+        if writer is None:
+            return
+        payload = self._struct.pack(time.monotonic(), NO_FRAME_ID if frame_id is None else frame_id, *values)
+        writer.put(RECORD_HEADER.pack(RECORD_DATA, self.channel_id, len(payload)) + payload)
+
+_CHANNELS = {}
+
+def frame_channel(name, fields):
+    """Get or register the channel with this name (fields fixed at first registration)."""
+    channel = _CHANNELS.get(name)
+    if channel is None:
+        channel = _CHANNELS[name] = FrameChannel(len(_CHANNELS), name, fields)
+        if _frame_log is not None:
+            _frame_log.define(channel)
+    return channel
+
+class FrameLogWriter:
+    """Appends queued binary records to the frame log file from a background thread."""
+
+    def __init__(self, path):
+        self.path = path
+        self._queue = queue.SimpleQueue()
+        self._file = open(path, "wb")
+        self._file.write(FRAME_LOG_MAGIC)
+        self._thread = threading.Thread(target=self._run, name="frame-log", daemon=True)
+        self._thread.start()
+
+    def put(self, record):
+        self._queue.put(record)
+
+    def define(self, channel):
+        payload = json.dumps({"name": channel.name, "fields": channel.fields}).encode("utf-8")
+        self.put(RECORD_HEADER.pack(RECORD_DEFINITION, channel.channel_id, len(payload)) + payload)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            if record is None:
+                break
+            self._file.write(record)
+        self._file.close()
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+def read_frame_log(path):
+    """Return {channel name: {"fields": [...], "rows": [(time, frame_id, *values), ...]}}."""
+    with open(path, "rb") as f:
+        data = f.read()
+    prefix = DATA_PREFIXES.get(data[:len(FRAME_LOG_MAGIC)])
+    if prefix is None:
+        raise ValueError(f"[FrameLog] Not a frame log: {path}")
+    no_frame_id = (1 << (8 * struct.calcsize(prefix[-1]))) - 1
+
+    channels = {}   # channel id -> (name, struct)
+    result = {}
+    offset = len(FRAME_LOG_MAGIC)
+    while offset + RECORD_HEADER.size <= len(data):
+        record_type, channel_id, length = RECORD_HEADER.unpack_from(data, offset)
+        offset += RECORD_HEADER.size
+        payload = data[offset:offset + length]
+        offset += length
+        if len(payload) < length:
+            break  # Truncated last record
+        if record_type == RECORD_DEFINITION:
+            definition = json.loads(payload)
+            channels[channel_id] = (definition["name"], struct.Struct(prefix + "f" * len(definition["fields"])))
+            result.setdefault(definition["name"], {"fields": definition["fields"], "rows": []})
+        elif channel_id in channels:
+            name, record_struct = channels[channel_id]
+            row = record_struct.unpack(payload)
+            result[name]["rows"].append((row[0], None if row[1] == no_frame_id else row[1], *row[2:]))
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a binary frame log (frame_log.vrl)")
+    parser.add_argument("path", help="frame_log.vrl")
+    parser.add_argument("--csv", type=str, default=None, help="Write one CSV per channel into this folder")
+    args = parser.parse_args()
+
+    log = read_frame_log(args.path)
+    for name, channel in log.items():
+        print(f"[FrameLog] {name}: {len(channel['rows'])} records ({', '.join(channel['fields'])})")
+        if args.csv:
+            os.makedirs(args.csv, exist_ok=True)
+            out_path = os.path.join(args.csv, f"{name}.csv")
+            with open(out_path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["time", "frame_id", *channel["fields"]])
+                writer.writerows(channel["rows"])
+            print(f"[FrameLog] → {out_path}")
+
+if __name__ == "__main__":
+    main()
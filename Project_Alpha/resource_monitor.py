@@ -0,0 +1,289 @@
+# resource_monitor.py
+# Per-run resource accounting of the Python control process: a background thread samples
+# every RESOURCE_SAMPLE_S seconds and appends to the run directory:
+#   resources.csv       time_s, cpu_percent, rss_mb, training_bytes, io_write_bytes, open_files, threads
+#   resource_threads.csv time_s, thread, cpu_s   (cumulative CPU time per named thread)
+# and prints / saves (resources.json) a summary at shutdown: mean/peak CPU and RSS, CPU share per
+# thread (MainThread, controller-*, shadow-*, frame-log, ...), bytes written.
+# A failing sample is logged and counted (sample_errors in the summary); sampling continues.
+# There is no separate writer thread: frames are parsed and written to disk by ingest_frame() on the
+# asyncio event loop (MainThread), so MainThread's CPU covers receiving *and* saving the frames.
+#
+# psutil is optional. Without it, CPU comes from time.process_time() and RSS, open files and
+# per-thread CPU from /proc (Linux only; reported empty elsewhere).
+# With CONTROLLER_EXECUTOR=process the worker is a child process: its CPU is included only with psutil.
+#
+# Usage:
+#   resource_monitor.start(run_dir, interval=1.0)
+#   ...
+#   resource_monitor.stop()   # Prints and writes the summary
+
+import os
+import csv
+import json
+import time
+import threading
+
+import metrics
+import race_logging
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+SAMPLES_NAME = "resources.csv"
+THREADS_NAME = "resource_threads.csv"
+SUMMARY_NAME = "resources.json"
+SAMPLE_FIELDS = ["time_s", "cpu_percent", "rss_mb", "training_bytes", "io_write_bytes", "open_files", "threads"]
+
+CPU_GAUGE = metrics.gauge("process_cpu_percent", "CPU use of the control process (100 = one core)")
+RSS_GAUGE = metrics.gauge("process_rss_bytes", "Resident memory of the control process")
+TRAINING_BYTES = metrics.counter("training_bytes_written_total", "Frame bytes written to the run folder")
+
+log = race_logging.get_logger(__name__)
+
+_PROC_TASKS = "/proc/self/task"
+_CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, "sysconf") else 100
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+# === Probes (psutil first, /proc fallback, None if unavailable) ===
+def _process_cpu_seconds(process):
+    if process is None:
+        return time.process_time()
+    total = sum(process.cpu_times()[:2])
+    try:
+        for child in process.children(recursive=True):
+            total += sum(child.cpu_times()[:2])
+    except psutil.Error:
+        pass
+    return total
+
+def _rss_bytes(process):
+    if process is not None:
+        return process.memory_info().rss
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        return None
+
+def _open_files(process):
+    if process is not None:
+        return process.num_handles() if os.name == "nt" else process.num_fds()
+    try:
+        return len(os.listdir("/proc/self/fd"))
+    except OSError:
+        return None
+
+def _io_write_bytes(process):
+    if process is None or not hasattr(process, "io_counters"):
+        return None
+    try:
+        return process.io_counters().write_bytes
+    except psutil.Error:
+        return None
+
+def _thread_cpu_seconds(process):
+    """{native thread id: user + system CPU seconds}."""
+    if process is not None:
+        return {t.id: t.user_time + t.system_time for t in process.threads()}
+    threads = {}
+    try:
+        task_ids = os.listdir(_PROC_TASKS)
+    except OSError:
+        return threads
+    for task_id in task_ids:
+        try:
+            with open(os.path.join(_PROC_TASKS, task_id, "stat"), "r") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            threads[int(task_id)] = (int(fields[11]) + int(fields[12])) / _CLOCK_TICKS  # utime, stime
+        except (OSError, IndexError, ValueError):
+            pass
+    return threads
+
+def _thread_names():
+    return {t.native_id: t.name for t in threading.enumerate() if t.native_id is not None}
+
+def directory_bytes(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+# === Sampler ===
+class ResourceSampler:
+    """Samples the current process from a daemon thread; summary() aggregates over the run."""
+
+    def __init__(self, run_dir, interval=1.0):
+        self.run_dir = run_dir
+        self.interval = float(interval)
+        self.process = psutil.Process() if psutil is not None else None
+        self.samples = []          # (time_s, cpu_percent, rss_bytes)
+        self.sample_seconds = 0.0  # CPU time spent sampling (sampler overhead)
+        self.sample_errors = 0     # Samples that raised (logged and skipped)
+        self.last_sample_error = None
+        self._thread_cpu = {}      # thread name -> cumulative CPU seconds at the last sample
+        self._thread_start = {}    # thread name -> CPU seconds when sampling started
+        self._stop = threading.Event()
+        self._thread = None
+        self._samples_file = None
+        self._threads_file = None
+
+    def start(self):
+        self._samples_file = open(os.path.join(self.run_dir, SAMPLES_NAME), "w", newline="", encoding="utf-8")
+        self._threads_file = open(os.path.join(self.run_dir, THREADS_NAME), "w", newline="", encoding="utf-8")
+        self._samples_csv = csv.writer(self._samples_file)
+        self._threads_csv = csv.writer(self._threads_file)
+        self._samples_csv.writerow(SAMPLE_FIELDS)
+        self._threads_csv.writerow(["time_s", "thread", "cpu_s"])
+
+        self.t_start = time.monotonic()
+        self.training_bytes_start = TRAINING_BYTES.value
+        self.io_write_start = _io_write_bytes(self.process)
+        self._last_wall, self._last_cpu = self.t_start, _process_cpu_seconds(self.process)
+        self._thread_start = self._named_thread_cpu()
+        self._thread = threading.Thread(target=self._run, name="resource-sampler", daemon=True)
+        self._thread.start()
+
+    def _named_thread_cpu(self):
+        """{thread name: CPU seconds}; threads not started from Python (torch, OpenCV, ...) add up as 'native'."""
+        names = _thread_names()
+        thread_cpu = {}
+        for thread_id, seconds in _thread_cpu_seconds(self.process).items():
+            name = names.get(thread_id, "native")
+            thread_cpu[name] = thread_cpu.get(name, 0.0) + seconds
+        return thread_cpu
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample_logged()
+        self._sample_logged()
+
+    def _sample_logged(self):
+        """sample() for the sampler thread: an error skips this sample instead of ending the thread."""
+        try:
+            self.sample()
+        except Exception as e:
+            self.sample_errors += 1
+            self.last_sample_error = f"{type(e).__name__}: {e}"
+            log.warning("[Resources] Sample failed (%d so far): %s", self.sample_errors, self.last_sample_error,
+                        exc_info=self.sample_errors == 1)
+
+    def sample(self):
+        t_sample = time.thread_time()
+        now = time.monotonic()
+        cpu = _process_cpu_seconds(self.process)
+        cpu_percent = 100.0 * (cpu - self._last_cpu) / (now - self._last_wall) if now > self._last_wall else 0.0
+        self._last_wall, self._last_cpu = now, cpu
+        rss = _rss_bytes(self.process)
+        io_write = _io_write_bytes(self.process)
+        open_files = _open_files(self.process)
+
+        thread_cpu = self._named_thread_cpu()
+        for name, seconds in thread_cpu.items():
+            self._thread_start.setdefault(name, 0.0)  # Started after the sampler: all of its CPU time counts
+            self._thread_cpu[name] = seconds
+
+        elapsed = now - self.t_start
+        training_bytes = TRAINING_BYTES.value - self.training_bytes_start
+        io_bytes = io_write - self.io_write_start if io_write is not None and self.io_write_start is not None else None
+        self._samples_csv.writerow([f"{elapsed:.2f}", f"{cpu_percent:.1f}",
+                                    "" if rss is None else f"{rss / 2**20:.1f}", training_bytes,
+                                    "" if io_bytes is None else io_bytes,
+                                    "" if open_files is None else open_files, len(thread_cpu)])
+        self._threads_csv.writerows([f"{elapsed:.2f}", name, f"{seconds:.3f}"]
+                                    for name, seconds in sorted(thread_cpu.items()))
+        self._samples_file.flush()
+        self._threads_file.flush()
+
+        self.samples.append((elapsed, cpu_percent, rss))
+        self.last_io_bytes, self.last_open_files = io_bytes, open_files
+        CPU_GAUGE.set(cpu_percent)
+        if rss is not None:
+            RSS_GAUGE.set(rss)
+        self.sample_seconds += time.thread_time() - t_sample
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._thread = None
+        self._samples_file.close()
+        self._threads_file.close()
+
+    def summary(self):
+        duration = time.monotonic() - self.t_start
+        cpu = [s[1] for s in self.samples]
+        rss = [s[2] for s in self.samples if s[2] is not None]
+        thread_seconds = {name: max(0.0, self._thread_cpu[name] - self._thread_start[name]) for name in self._thread_cpu}
+        thread_total = sum(thread_seconds.values())
+        return {
+            "duration_s": round(duration, 2),
+            "samples": len(self.samples),
+            "sample_errors": self.sample_errors,
+            "last_sample_error": self.last_sample_error,
+            "psutil": self.process is not None,
+            "cpu_percent_mean": round(sum(cpu) / len(cpu), 1) if cpu else None,
+            "cpu_percent_peak": round(max(cpu), 1) if cpu else None,
+            "rss_mb_mean": round(sum(rss) / len(rss) / 2**20, 1) if rss else None,
+            "rss_mb_peak": round(max(rss) / 2**20, 1) if rss else None,
+            "thread_cpu_s": {name: round(seconds, 3) for name, seconds in
+                             sorted(thread_seconds.items(), key=lambda item: -item[1])},
+            "thread_cpu_share_pct": {name: round(100.0 * seconds / thread_total, 1) if thread_total else None
+                                     for name, seconds in thread_seconds.items()},
+            "training_bytes_written": TRAINING_BYTES.value - self.training_bytes_start,
+            "io_write_bytes": getattr(self, "last_io_bytes", None),
+            "run_dir_bytes": directory_bytes(self.run_dir),
+            "open_files_last": getattr(self, "last_open_files", None),
+            "sampler_overhead_pct": round(100.0 * self.sample_seconds / duration, 3) if duration else None,
+        }
+
+def format_summary(summary):
+    lines = [f"[Resources] {summary['duration_s']:.0f} s, {summary['samples']} samples"
+             f"{'' if summary['psutil'] else ' (psutil not installed: /proc fallback)'}",
+             f"[Resources] CPU mean {summary['cpu_percent_mean']}% / peak {summary['cpu_percent_peak']}%, "
+             f"RSS mean {summary['rss_mb_mean']} MB / peak {summary['rss_mb_peak']} MB, "
+             f"open files {summary['open_files_last']}",
+             f"[Resources] Written: frames {summary['training_bytes_written'] / 2**20:.1f} MB, "
+             f"run folder {summary['run_dir_bytes'] / 2**20:.1f} MB"
+             + ("" if summary["io_write_bytes"] is None else f", process total {summary['io_write_bytes'] / 2**20:.1f} MB")]
+    for name, seconds in summary["thread_cpu_s"].items():
+        share = summary["thread_cpu_share_pct"][name]
+        lines.append(f"[Resources]   {name:<28}{seconds:>9.2f} s CPU  {'-' if share is None else share:>5}%")
+    lines.append(f"[Resources] Sampler CPU {summary['sampler_overhead_pct']}% of wall time")
+    if summary["sample_errors"]:
+        lines.append(f"[Resources] {summary['sample_errors']} sample(s) failed, last: {summary['last_sample_error']}")
+    return "\n".join(lines)
+
+_sampler = None
+
+def start(run_dir, interval=1.0):
+    """Start sampling into run_dir (interval 0 = disabled)."""
+    global _sampler
+    if not interval or not run_dir or _sampler is not None:
+        return None
+    _sampler = ResourceSampler(run_dir, interval)
+    _sampler.start()
+    return _sampler
+
+def stop():
+    """Stop sampling, print the summary and write resources.json. Returns the summary (None if not running)."""
+    global _sampler
+    if _sampler is None:
+        return None
+    sampler, _sampler = _sampler, None
+    sampler.stop()
+    summary = sampler.summary()
+    print(format_summary(summary))
+    try:
+        with open(os.path.join(sampler.run_dir, SUMMARY_NAME), "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+    except Exception as e:
+        print(f"[Resources] Failed to write summary: {e}")
+    return summary
@@ -1,11 +1,21 @@
 # Linetrace_white.py
 # Rule-based PID control for white line following based on camera image and SOC value.
+# Test / batch mode: run from Project_Alpha as a module, e.g. python -m rule_based_algorithms.Linetrace_white --batch
 
-from PIL import Image
 import cv2
 import numpy as np
 import os
-import time
+
+from frame_data import Frame
+from frame_container import FrameContainerReader, find_container
+import race_logging
+
+log = race_logging.get_logger(__name__)
+LINE_LOG = race_logging.frame_channel("linetrace", ("deviation", "angle_deg", "correction", "left", "right"))
+
+# Line search band (fractions of image height)
+ROI_TOP = 0.4
+ROI_BOTTOM = 0.9
 
 # PID control parameters
 Kp = 0.005
@@ -47,104 +57,161 @@ def detect_gravity_and_angle(binary, roi_top):
 
     return (x_c, y_c), theta_rad, poly
 
-def run(soc, pil_img):
-    global prev_error, integral
+class LineObservation:
+    """White line seen in one frame: deviation and heading normalized to roughly -1..1."""
+    __slots__ = ("deviation", "theta_norm", "angle_rad", "gravity_point", "poly")
 
-    if soc < 0.2:
-        return 0.0, 0.0
+    def __init__(self, deviation, theta_norm, angle_rad, gravity_point, poly):
+        self.deviation = deviation
+        self.theta_norm = theta_norm
+        self.angle_rad = angle_rad
+        self.gravity_point = gravity_point
+        self.poly = poly
 
-    img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-    height, width = gray.shape
-    roi_top = int(height * 0.4)
-    roi_bottom = int(height * 0.9)
-    roi = gray[roi_top:roi_bottom, :]
+def perceive(frame):
+    """Find the white line in the ROI band of a frame. Returns a LineObservation or None."""
+    width, height = frame.size
+    roi_top = int(height * ROI_TOP)
+    roi = frame.roi(ROI_TOP, ROI_BOTTOM)
 
     _, binary = cv2.threshold(roi, 200, 255, cv2.THRESH_BINARY)
 
     center = width // 2
     gravity_point, target_angle, poly = detect_gravity_and_angle(binary, roi_top)
-
     if gravity_point is None or target_angle is None:
-        print("[LineTrace] No valid line detected for gravity + angle tracking.")
-        return 0.5, 0.5
+        return None
 
     deviation = (gravity_point[0] - center) / center
     theta_norm = target_angle / np.radians(45.0)
+    return LineObservation(deviation, theta_norm, target_angle, gravity_point, poly)
+
+def command(deviation, theta_norm):
+    """Torques for a (possibly predicted) line deviation and heading. Returns (left, right, correction)."""
     correction = A_WEIGHT * deviation + B_WEIGHT * theta_norm
     turn = TURN_GAIN * correction
 
     left = np.clip(FORWARD - turn, -1.0, 1.0)
     right = np.clip(FORWARD + turn, -1.0, 1.0)
+    return left, right, correction
+
+# Optional state_predictor.StatePredictor: projects the observation forward by the pipeline
+# latency before the command is computed (set by RuleBasedController when PREDICTOR=1)
+predictor = None
+# Optional change_detector.ChangeDetector over the ROI band: reuses the last observation while
+# the band is unchanged (set by RuleBasedController when CHANGE_THRESHOLD > 0)
+change_detector = None
 
-    print(f"[LineTrace] deviation={deviation:.3f}, angle={np.degrees(target_angle):.1f}°, correction={correction:.3f}, L={left:.2f}, R={right:.2f}")
+def run(soc, frame):
+    if soc < 0.2:
+        return 0.0, 0.0
+
+    if change_detector is not None:
+        observation = change_detector.run(frame, perceive)
+    else:
+        observation = perceive(frame)
+    if observation is None:
+        log.info("[LineTrace] No valid line detected for gravity + angle tracking.")
+        return 0.5, 0.5
+
+    deviation, theta_norm = observation.deviation, observation.theta_norm
+    if predictor is not None:
+        deviation, theta_norm = predictor.predict_for_frame(deviation, theta_norm, frame)
+    left, right, correction = command(deviation, theta_norm)
+    if predictor is not None:
+        predictor.record_command(left, right)
+
+    angle_deg = np.degrees(observation.angle_rad)
+    log.info("[LineTrace] deviation=%.3f, angle=%.1f°, correction=%.3f, L=%.2f, R=%.2f",
+             observation.deviation, angle_deg, correction, left, right)
+    LINE_LOG.log(frame.frame_id, observation.deviation, angle_deg, correction, left, right)
 
     if DEBUG:
-        debug_full = img.copy()
-        cv2.rectangle(debug_full, (0, roi_top), (width, roi_bottom), (0, 0, 255), 2)
-        cv2.line(debug_full, (center, roi_top), (center, roi_bottom), (0, 255, 0), 2)
-        cv2.drawMarker(debug_full, (int(gravity_point[0]), int(gravity_point[1])), (0, 0, 255),
-                       markerType=cv2.MARKER_TILTED_CROSS, markerSize=20, thickness=2)
-
-        x1 = 0
-        y1 = int(poly[0] * x1 + poly[1])
-        x2 = width
-        y2 = int(poly[0] * x2 + poly[1])
-        cv2.line(debug_full, (x1, y1), (x2, y2), (255, 0, 0), 2)
-
-        vec_origin = (width // 2, height - 50)
-        vec_scale = 40
-        end_point = (int(vec_origin[0] + left * vec_scale), int(vec_origin[1] - right * vec_scale))
-
-        cv2.rectangle(debug_full, (vec_origin[0] - vec_scale, vec_origin[1] - vec_scale),
-                                (vec_origin[0] + vec_scale, vec_origin[1] + vec_scale), (200, 200, 200), 1)
-        cv2.arrowedLine(debug_full, vec_origin, end_point, (0, 0, 255), 2, tipLength=0.2)
-
-        (text_width, text_height), baseline = cv2.getTextSize("Torque Vector", cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
-        cv2.putText(debug_full, "Torque Vector", (width // 2 - text_width // 2, height - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
-
-        counter_path = os.path.join(debug_folder, "counter.txt")
-        counter = 0
-        if os.path.exists(counter_path):
-            try:
-                with open(counter_path, "r") as f:
-                    counter = int(f.read().strip())
-            except:
-                pass
-        counter += 1
-        with open(counter_path, "w") as f:
-            f.write(str(counter))
-
-        debug_filename = f"debug_latest_RGB_{counter:06d}.jpg"
-        debug_path = os.path.join(debug_folder, debug_filename)
-        try:
-            cv2.imwrite(debug_path, debug_full)
-            print(f"[LineTrace] Saved debug image to {debug_path}")
-        except Exception as e:
-            print(f"[LineTrace] Failed to save debug image: {e}")
+        save_debug_image(frame, observation, left, right)
 
     return left, right
 
+def save_debug_image(frame, observation, left, right):
+    width, height = frame.size
+    roi_top = int(height * ROI_TOP)
+    roi_bottom = int(height * ROI_BOTTOM)
+    center = width // 2
+    gravity_point, poly = observation.gravity_point, observation.poly
+
+    debug_full = frame.bgr().copy()
+    cv2.rectangle(debug_full, (0, roi_top), (width, roi_bottom), (0, 0, 255), 2)
+    cv2.line(debug_full, (center, roi_top), (center, roi_bottom), (0, 255, 0), 2)
+    cv2.drawMarker(debug_full, (int(gravity_point[0]), int(gravity_point[1])), (0, 0, 255),
+                   markerType=cv2.MARKER_TILTED_CROSS, markerSize=20, thickness=2)
+
+    x1 = 0
+    y1 = int(poly[0] * x1 + poly[1])
+    x2 = width
+    y2 = int(poly[0] * x2 + poly[1])
+    cv2.line(debug_full, (x1, y1), (x2, y2), (255, 0, 0), 2)
+
+    vec_origin = (width // 2, height - 50)
+    vec_scale = 40
+    end_point = (int(vec_origin[0] + left * vec_scale), int(vec_origin[1] - right * vec_scale))
+
+    cv2.rectangle(debug_full, (vec_origin[0] - vec_scale, vec_origin[1] - vec_scale),
+                            (vec_origin[0] + vec_scale, vec_origin[1] + vec_scale), (200, 200, 200), 1)
+    cv2.arrowedLine(debug_full, vec_origin, end_point, (0, 0, 255), 2, tipLength=0.2)
+
+    (text_width, text_height), baseline = cv2.getTextSize("Torque Vector", cv2.FONT_HERSHEY_SIMPLEX, 0.7, 2)
+    cv2.putText(debug_full, "Torque Vector", (width // 2 - text_width // 2, height - 10),
+                cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 0, 0), 2)
+
+    counter_path = os.path.join(debug_folder, "counter.txt")
+    counter = 0
+    if os.path.exists(counter_path):
+        try:
+            with open(counter_path, "r") as f:
+                counter = int(f.read().strip())
+        except:
+            pass
+    counter += 1
+    with open(counter_path, "w") as f:
+        f.write(str(counter))
+
+    debug_filename = f"debug_latest_RGB_{counter:06d}.jpg"
+    debug_path = os.path.join(debug_folder, debug_filename)
+    try:
+        cv2.imwrite(debug_path, debug_full)
+        log.debug("[LineTrace] Saved debug image to %s", debug_path)
+    except Exception as e:
+        log.warning("[LineTrace] Failed to save debug image: %s", e)
+
 def main_batch(input_folder="rulebasesample", output_folder="debug", soc=1.0):
     os.makedirs(output_folder, exist_ok=True)
+
+    # Run container (frames.vrc, or a run folder holding one): read frames directly
+    container_path = find_container(input_folder)
+    if container_path:
+        with FrameContainerReader(container_path) as reader:
+            print(f"[Batch] Found {len(reader)} frames in {container_path}")
+            for i in range(len(reader)):
+                frame = reader.frame(i)
+                run(soc, frame)
+                del frame  # Release the mapped payload before the reader closes
+        return
+
     jpg_files = [f for f in os.listdir(input_folder) if f.lower().endswith(".jpg")]
     print(f"[Batch] Found {len(jpg_files)} jpg files in {input_folder}")
 
     for fname in jpg_files:
         input_path = os.path.join(input_folder, fname)
         try:
-            pil_img = Image.open(input_path).convert("RGB")
+            frame = Frame.from_file(input_path, soc=soc)
         except Exception as e:
             print(f"[Batch] Skipping {fname} due to load error: {e}")
             continue
 
-        run(soc, pil_img)
+        run(soc, frame)
 
 def test_mode(image_path, soc):
     try:
-        pil_img = Image.open(image_path).convert("RGB")
-        run(soc, pil_img)
+        frame = Frame.from_file(image_path, soc=soc)
+        run(soc, frame)
     except Exception as e:
         print(f"[Test] Failed to load test image: {e}")
 
@@ -155,9 +222,10 @@ if __name__ == "__main__":
     parser.add_argument("--image", type=str, default="data_interative/latest_RGB.jpg", help="Path to input image")
     parser.add_argument("--soc", type=float, default=1.0, help="Simulated SOC value")
     parser.add_argument("--batch", action="store_true", help="Run in batch mode")
-    parser.add_argument("--input_folder", type=str, default="rulebasesample")
+    parser.add_argument("--input_folder", type=str, default="rulebasesample", help="JPEG folder, run folder or frames.vrc")
     parser.add_argument("--output_folder", type=str, default="debug")
     args = parser.parse_args()
+    race_logging.setup(rate_limit=0)  # Show every line in batch / test mode
 
     if args.batch:
         print("[Batch] Linetrace_white.py batch mode")
@@ -167,3 +235,4 @@ if __name__ == "__main__":
         print(f"[Test] Using image: {args.image}")
         print(f"[Test] Simulated SOC: {args.soc}")
         test_mode(args.image, args.soc)
+    race_logging.shutdown()
@@ -1,52 +1,67 @@
 # perception_startsignal.py
-# Detects red lamp pattern from a given RGB image (PIL) to determine race start.
+# Detects red lamp pattern from a given camera frame (frame_data.Frame) to determine race start.
 
-from PIL import Image
+import race_logging
+
+log = race_logging.get_logger(__name__)
+
+# Lamp band (fractions of image size): top 20% of the frame, three lamp columns
+LAMP_TOP = 0.0
+LAMP_BOTTOM = 0.2
+LAMP_COLUMNS = [(0.35, 0.5), (0.55, 0.7), (0.75, 0.9)]
+LAMP_CELLS = [(LAMP_TOP, LAMP_BOTTOM, left, right) for left, right in LAMP_COLUMNS]
+
+# Optional change_detector.ChangeDetector over LAMP_CELLS (red channel, per lamp): reuses the lamp
+# count while no lamp changed (set by RuleBasedController when CHANGE_THRESHOLD > 0)
+change_detector = None
 
 def is_red(pixel, red_thresh=140, green_thresh=130, blue_thresh=130):
     """Returns True if the given pixel is considered 'red' based on RGB thresholds."""
     r, g, b = pixel
     return r > red_thresh and g < green_thresh and b < blue_thresh
 
-def detect_start_signal(img):
+def red_ratio(region, red_thresh=140, green_thresh=130, blue_thresh=130):
+    """Vectorized is_red(): fraction of 'red' pixels in an H x W x 3 RGB array."""
+    if region.size == 0:
+        return 0.0
+    mask = (region[..., 0] > red_thresh) & (region[..., 1] < green_thresh) & (region[..., 2] < blue_thresh)
+    return float(mask.mean())
+
+def count_red_lamps(frame):
+    """Number of lit (red) lamps in the lamp band."""
+    red_count = 0
+    for left, right in LAMP_COLUMNS:
+        region = frame.roi(LAMP_TOP, LAMP_BOTTOM, left, right, view="rgb")
+        if red_ratio(region) > 0.03:
+            red_count += 1
+    return red_count
+
+def detect_start_signal(frame):
     """
-    Analyze a given PIL image to detect red start lamps.
+    Analyze a given frame (frame_data.Frame) to detect red start lamps.
     Returns True only once right after all lamps turn off (after being lit).
     """
     if not hasattr(detect_start_signal, 'ready_to_go'):
         detect_start_signal.ready_to_go = False
 
     try:
-        width, height = img.size
-        top = 0
-        bottom = int(height * 0.2)
+        width, height = frame.size
+        top = int(height * LAMP_TOP)
+        bottom = int(height * LAMP_BOTTOM)
 
         # Define 3 rectangular regions (start lamps) on the top part of the image
-        lamp_positions = [
-            (int(width * 0.35), int(width * 0.5)),
-            (int(width * 0.55), int(width * 0.7)),
-            (int(width * 0.75), int(width * 0.9))
-        ]
-
-        red_count = 0
-        for left, right in lamp_positions:
-            red_pixels = 0
-            total_pixels = 0
-            for y in range(top, bottom):
-                for x in range(left, right):
-                    pixel = img.getpixel((x, y))
-                    if is_red(pixel):
-                        red_pixels += 1
-                    total_pixels += 1
-            ratio = red_pixels / total_pixels
-            if ratio > 0.03:
-                red_count += 1
+        lamp_positions = [(int(width * left), int(width * right)) for left, right in LAMP_COLUMNS]
+
+        if change_detector is not None:
+            red_count = change_detector.run(frame, count_red_lamps)
+        else:
+            red_count = count_red_lamps(frame)
 
         # Debug visualization (optional)
         DEBUG_MODE = False
         if DEBUG_MODE:
             from PIL import ImageDraw
-            debug_img = img.copy()
+            debug_img = frame.image().copy()
             draw = ImageDraw.Draw(debug_img)
             for left, right in lamp_positions:
                 draw.rectangle([left, top, right, bottom], outline="red", width=2)
@@ -67,5 +82,5 @@ def detect_start_signal(img):
         return False
 
     except Exception as e:
-        print(f"[StartSignal] Error: {e}")
+        log.warning("[StartSignal] Error: %s", e)
         return False
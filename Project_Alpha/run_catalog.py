@@ -0,0 +1,332 @@
+# run_catalog.py
+# Local SQLite catalog of recorded runs (training_data/run_*) for fast querying across sessions.
+# Each run is indexed when it finishes; existing run folders can be backfilled.
+#
+# Usage:
+#   python run_catalog.py backfill
+#   python run_catalog.py index training_data/run_20250101_120000
+#   python run_catalog.py query --mode rule_based --min-duration 30000 --error-code 2
+
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import argparse
+from collections import Counter
+
+from frame_container import CONTAINER_NAME, load_index
+
+# === Base Directory Handling (same layout as data_manager) ===
+if getattr(sys, 'frozen', False):
+    BASE_DIR = os.path.dirname(sys.executable)
+else:
+    BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+TRAINING_DATA_DIR = os.path.join(BASE_DIR, "training_data")
+CATALOG_PATH = os.path.join(TRAINING_DATA_DIR, "run_catalog.db")
+CONFIG_SNAPSHOT_NAME = "config.json"
+
+# error_code values that mean "no error"
+NO_ERROR_CODES = ("", "0", "None")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_name       TEXT PRIMARY KEY,
+    run_dir        TEXT NOT NULL,
+    mode           TEXT,
+    config_json    TEXT,
+    started_at     TEXT,
+    frame_count    INTEGER,
+    image_count    INTEGER,
+    time_start_ms  REAL,
+    time_end_ms    REAL,
+    duration_ms    REAL,
+    soc_start      REAL,
+    soc_end        REAL,
+    soc_min        REAL,
+    soc_mean       REAL,
+    error_frames   INTEGER,
+    metadata_path  TEXT,
+    images_dir     TEXT,
+    container_path TEXT,
+    unity_log_path TEXT,
+    indexed_at     REAL
+);
+CREATE TABLE IF NOT EXISTS run_errors (
+    run_name   TEXT NOT NULL,
+    error_code TEXT NOT NULL,
+    count      INTEGER NOT NULL,
+    PRIMARY KEY (run_name, error_code)
+);
+CREATE INDEX IF NOT EXISTS idx_runs_mode ON runs(mode);
+CREATE INDEX IF NOT EXISTS idx_runs_duration ON runs(duration_ms);
+CREATE INDEX IF NOT EXISTS idx_runs_soc_end ON runs(soc_end);
+CREATE INDEX IF NOT EXISTS idx_run_errors_code ON run_errors(error_code);
+"""
+
+# Catalog schema version (PRAGMA user_version) and the columns added to runs since version 0
+SCHEMA_VERSION = 1
+ADDED_COLUMNS = [("container_path", "TEXT")]  # Version 1: run frame container (frame_container.py)
+
+def connect(catalog_path=CATALOG_PATH):
+    """Open (and create if needed) the catalog database."""
+    os.makedirs(os.path.dirname(catalog_path), exist_ok=True)
+    conn = sqlite3.connect(catalog_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    return conn
+
+def _migrate(conn):
+    """Add the columns a catalog created by an older version is missing (CREATE TABLE IF NOT EXISTS won't)."""
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    existing = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+    for column, column_type in ADDED_COLUMNS:
+        if column not in existing:
+            conn.execute(f"ALTER TABLE runs ADD COLUMN {column} {column_type}")
+    conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    conn.commit()
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _started_at(run_name):
+    """Convert 'run_YYYYMMDD_HHMMSS' into 'YYYY-MM-DD HH:MM:SS' (None if not parseable)."""
+    try:
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.strptime(run_name, "run_%Y%m%d_%H%M%S"))
+    except ValueError:
+        return None
+
+def _count_images(images_dir, container_path):
+    count = 0
+    if os.path.isdir(images_dir):
+        with os.scandir(images_dir) as entries:
+            count += sum(1 for entry in entries if entry.name.endswith(".jpg"))
+    if os.path.exists(container_path):
+        count += len(load_index(container_path))
+    video_index_path = os.path.join(os.path.dirname(images_dir), "frames_video.csv")
+    if count == 0 and os.path.exists(video_index_path):
+        # Originals replaced by the compacted video (video_compaction.py)
+        with open(video_index_path, "r", encoding="utf-8") as f:
+            count = max(0, sum(1 for _ in f) - 1)
+    return count
+
+def _load_config_snapshot(run_dir):
+    path = os.path.join(run_dir, CONFIG_SNAPSHOT_NAME)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def summarize_run(run_dir, config_snapshot=None):
+    """Collect catalog fields for one run directory (reads metadata.csv once)."""
+    run_dir = os.path.abspath(run_dir)
+    run_name = os.path.basename(run_dir)
+    metadata_path = os.path.join(run_dir, "metadata.csv")
+    images_dir = os.path.join(run_dir, "images")
+    container_path = os.path.join(run_dir, CONTAINER_NAME)
+    unity_log_path = os.path.join(run_dir, "UnityLog.txt")
+
+    if config_snapshot is None:
+        config_snapshot = _load_config_snapshot(run_dir)
+
+    mode = None
+    if config_snapshot:
+        mode = config_snapshot.get("MODE")
+    elif os.path.exists(os.path.join(run_dir, "table_input.csv")):
+        mode = "table"  # Only table mode copies its CSV into the run folder
+
+    times, socs = [], []
+    errors = Counter()
+    frame_count = 0
+    if os.path.exists(metadata_path):
+        with open(metadata_path, "r", newline="", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                frame_count += 1
+                t = _to_float(row.get("time_ms"))
+                if t is not None:
+                    times.append(t)
+                soc = _to_float(row.get("soc"))
+                if soc is not None:
+                    socs.append(soc)
+                errors[(row.get("error_code") or "").strip()] += 1
+
+    summary = {
+        "run_name": run_name,
+        "run_dir": run_dir,
+        "mode": mode,
+        "config_json": json.dumps(config_snapshot, sort_keys=True) if config_snapshot else None,
+        "started_at": _started_at(run_name),
+        "frame_count": frame_count,
+        "image_count": _count_images(images_dir, container_path),
+        "time_start_ms": times[0] if times else None,
+        "time_end_ms": times[-1] if times else None,
+        "duration_ms": (times[-1] - times[0]) if times else None,
+        "soc_start": socs[0] if socs else None,
+        "soc_end": socs[-1] if socs else None,
+        "soc_min": min(socs) if socs else None,
+        "soc_mean": sum(socs) / len(socs) if socs else None,
+        "error_frames": sum(n for code, n in errors.items() if code not in NO_ERROR_CODES),
+        "metadata_path": metadata_path if os.path.exists(metadata_path) else None,
+        "images_dir": images_dir if os.path.isdir(images_dir) else None,
+        "container_path": container_path if os.path.exists(container_path) else None,
+        "unity_log_path": unity_log_path if os.path.exists(unity_log_path) else None,
+        "indexed_at": time.time(),
+    }
+    return summary, errors
+
+def index_run(run_dir, config_snapshot=None, catalog_path=CATALOG_PATH):
+    """Insert or refresh one run in the catalog. Returns the stored summary."""
+    summary, errors = summarize_run(run_dir, config_snapshot)
+    columns = list(summary.keys())
+
+    conn = connect(catalog_path)
+    try:
+        with conn:
+            conn.execute(
+                f"INSERT OR REPLACE INTO runs ({', '.join(columns)}) "
+                f"VALUES ({', '.join('?' for _ in columns)})",
+                [summary[c] for c in columns]
+            )
+            conn.execute("DELETE FROM run_errors WHERE run_name = ?", (summary["run_name"],))
+            conn.executemany(
+                "INSERT INTO run_errors (run_name, error_code, count) VALUES (?, ?, ?)",
+                [(summary["run_name"], code, n) for code, n in errors.items()]
+            )
+    finally:
+        conn.close()
+
+    print(f"[RunCatalog] Indexed {summary['run_name']} ({summary['frame_count']} frames)")
+    return summary
+
+def backfill(training_data_dir=TRAINING_DATA_DIR, catalog_path=CATALOG_PATH, force=False):
+    """Index every run_* folder that is not in the catalog yet (or all of them with force=True)."""
+    if not os.path.isdir(training_data_dir):
+        print(f"[RunCatalog] No training data folder: {training_data_dir}")
+        return 0
+
+    conn = connect(catalog_path)
+    try:
+        known = {row["run_name"] for row in conn.execute("SELECT run_name FROM runs")}
+    finally:
+        conn.close()
+
+    indexed = 0
+    for name in sorted(os.listdir(training_data_dir)):
+        run_dir = os.path.join(training_data_dir, name)
+        if not name.startswith("run_") or not os.path.isdir(run_dir):
+            continue
+        if name in known and not force:
+            continue
+        try:
+            index_run(run_dir, catalog_path=catalog_path)
+            indexed += 1
+        except Exception as e:
+            print(f"[RunCatalog] Failed to index {name}: {e}")
+
+    print(f"[RunCatalog] Backfill done: {indexed} run(s) indexed.")
+    return indexed
+
+def query_runs(mode=None, min_duration_ms=None, max_duration_ms=None,
+               min_final_soc=None, max_final_soc=None, error_code=None,
+               min_frames=None, limit=None, catalog_path=CATALOG_PATH):
+    """Select runs by mode, duration, final SOC, frame count and/or presence of an error_code."""
+    clauses, params = [], []
+    if mode is not None:
+        clauses.append("r.mode = ?")
+        params.append(mode)
+    if min_duration_ms is not None:
+        clauses.append("r.duration_ms >= ?")
+        params.append(min_duration_ms)
+    if max_duration_ms is not None:
+        clauses.append("r.duration_ms <= ?")
+        params.append(max_duration_ms)
+    if min_final_soc is not None:
+        clauses.append("r.soc_end >= ?")
+        params.append(min_final_soc)
+    if max_final_soc is not None:
+        clauses.append("r.soc_end <= ?")
+        params.append(max_final_soc)
+    if min_frames is not None:
+        clauses.append("r.frame_count >= ?")
+        params.append(min_frames)
+    if error_code is not None:
+        clauses.append("EXISTS (SELECT 1 FROM run_errors e "
+                       "WHERE e.run_name = r.run_name AND e.error_code = ? AND e.count > 0)")
+        params.append(str(error_code))
+
+    sql = "SELECT r.* FROM runs r"
+    if clauses:
+        sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY r.run_name"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+
+    conn = connect(catalog_path)
+    try:
+        return [dict(row) for row in conn.execute(sql, params)]
+    finally:
+        conn.close()
+
+def get_error_counts(run_name, catalog_path=CATALOG_PATH):
+    """Return {error_code: count} for one run."""
+    conn = connect(catalog_path)
+    try:
+        rows = conn.execute("SELECT error_code, count FROM run_errors WHERE run_name = ?", (run_name,))
+        return {row["error_code"]: row["count"] for row in rows}
+    finally:
+        conn.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Index and query recorded runs")
+    parser.add_argument("--catalog", type=str, default=CATALOG_PATH, help="Path to the SQLite catalog")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p_backfill = sub.add_parser("backfill", help="Index existing run folders")
+    p_backfill.add_argument("--training_data", type=str, default=TRAINING_DATA_DIR)
+    p_backfill.add_argument("--force", action="store_true", help="Re-index runs already in the catalog")
+
+    p_index = sub.add_parser("index", help="Index one run folder")
+    p_index.add_argument("run_dir", type=str)
+
+    p_query = sub.add_parser("query", help="Select runs")
+    p_query.add_argument("--mode", type=str)
+    p_query.add_argument("--min-duration", type=float, help="Minimum duration [ms]")
+    p_query.add_argument("--max-duration", type=float, help="Maximum duration [ms]")
+    p_query.add_argument("--min-soc", type=float, help="Minimum final SOC")
+    p_query.add_argument("--max-soc", type=float, help="Maximum final SOC")
+    p_query.add_argument("--error-code", type=str, help="Only runs that contain this error_code")
+    p_query.add_argument("--min-frames", type=int)
+    p_query.add_argument("--limit", type=int)
+    p_query.add_argument("--paths", action="store_true", help="Print run directories only")
+    args = parser.parse_args()
+
+    if args.command == "backfill":
+        backfill(args.training_data, args.catalog, args.force)
+    elif args.command == "index":
+        index_run(args.run_dir, catalog_path=args.catalog)
+    elif args.command == "query":
+        start = time.perf_counter()
+        runs = query_runs(args.mode, args.min_duration, args.max_duration, args.min_soc, args.max_soc,
+                          args.error_code, args.min_frames, args.limit, args.catalog)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        for run in runs:
+            if args.paths:
+                print(run["run_dir"])
+            else:
+                print(f"{run['run_name']}  mode={run['mode']}  frames={run['frame_count']}  "
+                      f"duration_ms={run['duration_ms']}  soc_end={run['soc_end']}  "
+                      f"error_frames={run['error_frames']}")
+        print(f"[RunCatalog] {len(runs)} run(s) matched in {elapsed_ms:.1f} ms", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
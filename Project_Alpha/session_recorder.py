@@ -0,0 +1,198 @@
+# session_recorder.py
+# Records every raw WebSocket message (frames, metadata, control, RaceEnd) with monotonic
+# timestamps into a compact session log, and replays a log through the server's receive path.
+#
+# Log layout (session.vrs):
+#   file header = magic "VRSS" + version (uint16)
+#   record      = t (float64, seconds since recording start) + direction (uint8: 0 in, 1 out)
+#                 + kind (uint8: 0 text, 1 binary) + length (uint32) + payload, little endian
+#
+# Usage:
+#   python session_recorder.py training_data/run_xxx/session.vrs            (original pace)
+#   python session_recorder.py training_data/run_xxx/session.vrs --fast     (as fast as possible)
+
+import json
+import time
+import struct
+import argparse
+import tempfile
+import threading
+
+SESSION_NAME = "session.vrs"
+
+FILE_MAGIC = b"VRSS"
+FILE_VERSION = 1
+FILE_HEADER = struct.Struct("<4sH")
+RECORD_HEADER = struct.Struct("<dBBI")
+
+INBOUND = 0
+OUTBOUND = 1
+KIND_TEXT = 0
+KIND_BINARY = 1
+
+class SessionRecorder:
+    """Appends raw messages to a session log. Safe to call from several threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "wb")
+        self._file.write(FILE_HEADER.pack(FILE_MAGIC, FILE_VERSION))
+        self._lock = threading.Lock()
+        self._t0 = time.monotonic()
+        self.message_count = 0
+
+    def record(self, direction, message):
+        if isinstance(message, str):
+            kind, payload = KIND_TEXT, message.encode("utf-8")
+        else:
+            kind, payload = KIND_BINARY, message
+        t = time.monotonic() - self._t0
+
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.write(RECORD_HEADER.pack(t, direction, kind, len(payload)))
+            self._file.write(payload)
+            self.message_count += 1
+
+    def record_inbound(self, message):
+        self.record(INBOUND, message)
+
+    def record_outbound(self, message):
+        self.record(OUTBOUND, message)
+
+    def close(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.close()
+                print(f"[Recorder] Session log closed: {self.message_count} messages → {self.path}")
+
+def read_session(path):
+    """Yield (t, direction, message) for every record. Text messages are returned as str."""
+    with open(path, "rb") as f:
+        magic, version = FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+        if magic != FILE_MAGIC:
+            raise ValueError(f"Not a session log: {path}")
+        if version != FILE_VERSION:
+            raise ValueError(f"Unsupported session log version {version}: {path}")
+
+        while True:
+            header = f.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            t, direction, kind, length = RECORD_HEADER.unpack(header)
+            payload = f.read(length)
+            if len(payload) < length:
+                return  # Truncated final record (recording interrupted)
+            yield t, direction, payload.decode("utf-8") if kind == KIND_TEXT else payload
+
+def _parse_control(message):
+    """Return (left, right) if the outbound message is a torque command, else None."""
+    if not isinstance(message, str):
+        return None
+    try:
+        data = json.loads(message)
+    except json.JSONDecodeError:
+        return None
+    if data.get("type") != "control":
+        return None
+    return float(data.get("leftTorque", 0.0)), float(data.get("rightTorque", 0.0))
+
+def summarize_divergence(pairs):
+    """pairs: list of ((rec_left, rec_right), (new_left, new_right)). Returns divergence stats."""
+    if not pairs:
+        return {"count": 0}
+    diffs_l = [abs(new[0] - rec[0]) for rec, new in pairs]
+    diffs_r = [abs(new[1] - rec[1]) for rec, new in pairs]
+    n = len(pairs)
+    return {
+        "count": n,
+        "mean_abs_left": sum(diffs_l) / n,
+        "mean_abs_right": sum(diffs_r) / n,
+        "rms_left": (sum(d * d for d in diffs_l) / n) ** 0.5,
+        "rms_right": (sum(d * d for d in diffs_r) / n) ** 0.5,
+        "max_abs": max(max(diffs_l), max(diffs_r)),
+    }
+
+def replay_session(path, controller=None, fast=False, speed=1.0, run_dir=None):
+    """
+    Feed every inbound message of a session log into websocket_server.handle_incoming_message().
+    Frames and metadata go to a sandbox run folder (run_dir, default a new temporary folder) that is
+    marked as a replay, so it is never indexed in the run catalog or video-compacted. The latest
+    image / SOC files go to its data_interactive/ subfolder, not to the ones a live race reads.
+    fast=False keeps the recorded pacing (divided by speed); fast=True sends as fast as possible.
+    If a controller is given, it is stepped synchronously on every replayed frame, so the result
+    is deterministic at any pace, and its latest command is compared with each recorded torque
+    command to report the divergence.
+    """
+    import websocket_server  # Lazy import: replay goes through the server's receive path
+    import data_manager
+    from controllers import ZERO_COMMAND
+
+    if data_manager.run_dir is None:
+        data_manager.init_run(run_dir or tempfile.mkdtemp(prefix="replay_"), replay=True)
+    elif not data_manager.is_replay:
+        raise RuntimeError("[Replay] data_manager already writes to a live run folder")
+    print(f"[Replay] Writing replayed frames to {data_manager.run_dir}")
+
+    pairs = []
+    inbound_count = 0
+    command = ZERO_COMMAND
+    start = time.monotonic()
+
+    for t, direction, message in read_session(path):
+        if not fast:
+            delay = t / speed - (time.monotonic() - start)
+            if delay > 0:
+                time.sleep(delay)
+
+        if direction == INBOUND:
+            websocket_server.handle_incoming_message(message)
+            inbound_count += 1
+            if controller is not None and controller.needs_frames and not isinstance(message, str):
+                frame = data_manager.get_latest_frame()
+                if frame is not None:
+                    command = controller.step(frame)
+        elif controller is not None:
+            recorded = _parse_control(message)
+            if recorded is not None:
+                if not controller.needs_frames:
+                    command = controller.step(None)
+                pairs.append((recorded, (command.left, command.right)))
+
+    elapsed = time.monotonic() - start
+    stats = summarize_divergence(pairs)
+    stats["inbound_messages"] = inbound_count
+    stats["elapsed_s"] = elapsed
+    return stats
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a recorded WebSocket session")
+    parser.add_argument("session", type=str, help="Path to session.vrs")
+    parser.add_argument("--fast", action="store_true", help="Replay as fast as possible")
+    parser.add_argument("--speed", type=float, default=1.0, help="Pace multiplier when not --fast")
+    parser.add_argument("--mode", type=str, default=None, help="Controller to evaluate (default: config MODE)")
+    parser.add_argument("--out", type=str, default=None, help="Sandbox run folder (default: new temporary folder)")
+    args = parser.parse_args()
+
+    import config
+    import controllers
+    import race_logging
+    race_logging.setup_from_config(config)
+    controller = controllers.create_controller(args.mode or config.MODE)
+    controller.start()
+    try:
+        stats = replay_session(args.session, controller, fast=args.fast, speed=args.speed, run_dir=args.out)
+    finally:
+        controller.stop()
+
+    print(f"[Replay] {stats['inbound_messages']} inbound messages in {stats['elapsed_s']:.2f}s")
+    if stats["count"]:
+        print(f"[Replay] Torque divergence over {stats['count']} commands: "
+              f"mean|dL|={stats['mean_abs_left']:.4f}, mean|dR|={stats['mean_abs_right']:.4f}, "
+              f"rmsL={stats['rms_left']:.4f}, rmsR={stats['rms_right']:.4f}, max={stats['max_abs']:.4f}")
+    else:
+        print("[Replay] No recorded torque commands to compare.")
+
+if __name__ == "__main__":
+    main()
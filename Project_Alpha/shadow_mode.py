@@ -0,0 +1,176 @@
+# shadow_mode.py
+# Shadow-mode controllers: one controller drives, any number of others run on the same frames
+# in their own worker threads (or processes) and only log what they would have commanded.
+# The driving runner hands each frame over through a one-slot mailbox, so a slow shadow
+# controller drops frames instead of ever delaying the driving controller's publish.
+# The driver steps at 20 Hz on the latest frame; a frame already submitted is not offered again.
+#
+# Logs (per run directory):
+#   shadow_driver.csv      frame_id, torque and step time of the driving controller
+#   shadow_<name>.csv      frame_id, torque, step time, frame age and budget flag per shadow
+
+import os
+import csv
+import time
+import threading
+
+import controllers
+import race_logging
+
+log = race_logging.get_logger(__name__)
+
+DRIVER_LOG_NAME = "shadow_driver.csv"
+SHADOW_LOG_FIELDS = ["frame_id", "frame_age_ms", "step_ms", "left", "right", "over_budget", "dropped"]
+
+def parse_shadow_modes(value, default_budget_ms):
+    """Parse 'ai:80,rule_based' into [("ai", 80.0), ("rule_based", default_budget_ms)]."""
+    shadows = []
+    for item in str(value or "").split(","):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, budget = item.partition(":")
+        shadows.append((name.strip(), float(budget) if budget else float(default_budget_ms)))
+    return shadows
+
+class ShadowWorker:
+    """Runs one shadow controller on the newest submitted frame and logs its commands."""
+
+    def __init__(self, controller, budget_ms, log_path, executor="thread"):
+        self.controller = controller
+        self.budget_s = budget_ms / 1000.0
+        self.log_path = log_path
+        self.executor = executor
+
+        self._slot = None                 # Newest frame not yet processed
+        self._last_submitted = None       # Frame id (or frame, without an id) of the last submission
+        self._slot_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+        self.step_count = 0
+        self.dropped = 0                  # Frames replaced in the slot before being processed
+        self.stale = 0                    # Frames older than the budget when picked up
+        self.over_budget = 0              # Steps that took longer than the budget
+
+    def submit(self, frame):
+        """Offer a frame (called from the driving thread: O(1), never blocks); repeats are ignored."""
+        if frame is None:
+            return
+        key = frame.frame_id if frame.frame_id is not None else frame
+        if key == self._last_submitted:
+            return
+        self._last_submitted = key
+        with self._slot_lock:
+            if self._slot is not None:
+                self.dropped += 1
+            self._slot = frame
+        self._wakeup.set()
+
+    def start(self, stop_event):
+        self._thread = threading.Thread(target=self._run, args=(stop_event,),
+                                        name=f"shadow-{self.controller.name}", daemon=True)
+        self._thread.start()
+
+    def join(self, timeout=None):
+        if self._thread:
+            self._wakeup.set()
+            self._thread.join(timeout)
+
+    def _run(self, stop_event):
+        name = self.controller.name
+        try:
+            step, close = controllers.make_step_function(self.controller, self.executor)
+        except Exception as e:
+            print(f"[Shadow] {name} failed to start: {e}")
+            return
+
+        with open(self.log_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(SHADOW_LOG_FIELDS)
+            last_dropped = 0
+
+            while not stop_event.is_set():
+                self._wakeup.wait(0.1)
+                self._wakeup.clear()
+                with self._slot_lock:
+                    frame, self._slot = self._slot, None
+                if frame is None:
+                    continue
+
+                t_start = time.monotonic()
+                age = t_start - frame.timestamp if frame.timestamp is not None else 0.0
+                if age > self.budget_s:
+                    self.stale += 1
+                    continue  # Result would already be too late to matter
+
+                try:
+                    command = step(frame)
+                except Exception as e:
+                    log.warning("[Shadow] %s error: %s", name, e)
+                    continue
+
+                step_s = time.monotonic() - t_start
+                late = age + step_s > self.budget_s
+                self.step_count += 1
+                self.over_budget += late
+                writer.writerow([frame.frame_id, f"{age * 1000:.2f}", f"{step_s * 1000:.2f}",
+                                 f"{command.left:.4f}", f"{command.right:.4f}", int(late),
+                                 self.dropped - last_dropped])
+                last_dropped = self.dropped
+
+        close()
+        print(f"[Shadow] {name}: {self.step_count} steps, {self.over_budget} over budget, "
+              f"{self.dropped} dropped, {self.stale} stale → {self.log_path}")
+
+class ShadowManager:
+    """Attaches shadow workers to the driving ControllerRunner and logs the driver for comparison."""
+
+    def __init__(self, shadows, run_dir, driver_mode=None, executor="thread"):
+        self.run_dir = run_dir
+        self.workers = []
+        self._driver_rows = []
+
+        for name, budget_ms in shadows:
+            if name == driver_mode and executor == "thread":
+                # Built-in controllers keep module-level state; a second copy in the same
+                # process would interfere with the driver.
+                print(f"[Shadow] Skipping '{name}': same as driving mode (use SHADOW_EXECUTOR=process).")
+                continue
+            try:
+                controller = controllers.create_controller(name)
+            except ValueError as e:
+                print(e)
+                continue
+            log_path = os.path.join(run_dir, f"shadow_{name}.csv")
+            self.workers.append(ShadowWorker(controller, budget_ms, log_path, executor))
+
+    def attach(self, runner, stop_event):
+        """Hook into the driving runner and start the shadow workers."""
+        if not self.workers:
+            return
+        for worker in self.workers:
+            runner.frame_listeners.append(worker.submit)
+            worker.start(stop_event)
+        runner.command_listeners.append(self.record_driver)
+        print(f"[Shadow] Running {len(self.workers)} shadow controller(s): "
+              f"{', '.join(w.controller.name for w in self.workers)}")
+
+    def record_driver(self, command, step_seconds):
+        # Kept in memory during the race; written once at the end (no file I/O on the driving thread)
+        self._driver_rows.append((command.frame_id, step_seconds, command.left, command.right))
+
+    def close(self):
+        for worker in self.workers:
+            worker.join()
+        if not self.workers:
+            return
+        path = os.path.join(self.run_dir, DRIVER_LOG_NAME)
+        try:
+            with open(path, "w", newline="", encoding="utf-8") as f:
+                writer = csv.writer(f)
+                writer.writerow(["frame_id", "step_ms", "left", "right"])
+                for frame_id, step_s, left, right in self._driver_rows:
+                    writer.writerow([frame_id, f"{step_s * 1000:.2f}", f"{left:.4f}", f"{right:.4f}"])
+        except Exception as e:
+            print(f"[Shadow] Failed to write driver log: {e}")
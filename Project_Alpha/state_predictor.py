@@ -0,0 +1,296 @@
+# state_predictor.py
+# Latency compensation for the line tracer: projects the observed line deviation and heading
+# forward to the moment the next command takes effect, using the commands already sent.
+#
+# Model (normalized units of Linetrace_white: deviation and heading roughly -1..1):
+#   turn  = (right - left) / 2        speed = (left + right) / 2
+#   d(deviation)/dt = dev_per_turn * turn + dev_per_theta * speed * theta
+#   d(theta)/dt     = theta_per_turn * turn            (or theta_per_yaw * yaw rate [deg/s] when telemetry is available)
+# Commands and yaw rates are piecewise constant, so the projection is integrated exactly per segment.
+#
+# The gains have no defaults: fit them on recorded runs (--fit) and set PREDICTOR_GAINS; PREDICTOR=1
+# without gains leaves the predictor off.
+#
+# Live (PREDICTOR=1, rule_based mode): horizon = measured frame age (receive → now) + PREDICTOR_LATENCY_MS,
+# the part of the loop that cannot be measured here (Unity capture → receive, send → wheels), split evenly
+# before and after. Yaw telemetry only arrives with the race metadata, so live prediction uses commands only.
+#
+# Offline: replay recorded runs, delay the observations by artificial latencies and compare how far the
+# delayed and the predicted observations are from the true current one:
+#   python state_predictor.py training_data/run_xxx training_data/run_yyy --latencies 0 50 100 150 200
+#   python state_predictor.py training_data/run_* --fit        # Fit gains, print PREDICTOR_GAINS
+#   python state_predictor.py training_data/run_xxx --no-yaw   # Commands only (as live)
+
+import os
+import json
+import time
+import bisect
+import argparse
+import collections
+from typing import NamedTuple
+
+import numpy as np
+
+import metrics
+import race_logging
+
+log = race_logging.get_logger(__name__)
+HORIZON = metrics.histogram("predictor_horizon_seconds", "Latency the line state was projected over")
+
+DEFAULT_LATENCIES_MS = (0, 50, 100, 150, 200)
+HISTORY = 32  # Commands kept for live prediction (1.6 s at 20 Hz)
+
+class PredictorGains(NamedTuple):
+    """Model gains. There are no built-in values: they depend on the robot and the camera setup and are
+    fitted on recorded runs (fit_gains / --fit). All zero = no projection."""
+    dev_per_turn: float = 0.0
+    dev_per_theta: float = 0.0
+    theta_per_turn: float = 0.0
+    theta_per_yaw: float = 0.0
+
+    @classmethod
+    def parse(cls, value):
+        """'a,b,c,d' (config PREDICTOR_GAINS) → PredictorGains; empty → all zero."""
+        values = [float(v) for v in str(value or "").replace(";", ",").split(",") if v.strip()]
+        if values and len(values) != len(cls._fields):
+            raise ValueError(f"[Predictor] PREDICTOR_GAINS needs {len(cls._fields)} values, got {len(values)}")
+        return cls(*values)
+
+    def format(self):
+        return ",".join(f"{g:.4g}" for g in self)
+
+def _value_at(times, values, t, default):
+    """Value of a piecewise constant series at time t (last sample at or before t)."""
+    index = bisect.bisect_right(times, t) - 1
+    return values[index] if index >= 0 else default
+
+def project(deviation, theta, t_start, t_end, gains, command_times, commands, yaw_times=(), yaw_rates=()):
+    """
+    Integrate the line state from t_start to t_end.
+    commands: [(turn, speed), ...] taking effect at command_times (sorted);
+    yaw_rates: optional [deg/s, ...] at yaw_times (sorted), used for the heading when given.
+    """
+    if t_end <= t_start:
+        return deviation, theta
+    points = [t_start]
+    for times in (command_times, yaw_times):
+        lo, hi = bisect.bisect_right(times, t_start), bisect.bisect_left(times, t_end)
+        points.extend(times[lo:hi])
+    points = sorted(set(points))
+    points.append(t_end)
+
+    for t0, t1 in zip(points, points[1:]):
+        tau = t1 - t0
+        turn, speed = _value_at(command_times, commands, t0, (0.0, 0.0))
+        yaw_rate = _value_at(yaw_times, yaw_rates, t0, None) if yaw_times else None
+        theta_rate = gains.theta_per_turn * turn if yaw_rate is None else gains.theta_per_yaw * yaw_rate
+        deviation += (gains.dev_per_turn * turn * tau
+                      + gains.dev_per_theta * speed * (theta * tau + 0.5 * theta_rate * tau * tau))
+        theta += theta_rate * tau
+    return deviation, theta
+
+def turn_and_speed(left, right):
+    return (right - left) / 2.0, (left + right) / 2.0
+
+# === Live predictor ===
+class StatePredictor:
+    """Projects each observation over the frame's measured age plus the fixed loop latency."""
+
+    def __init__(self, gains, latency_ms=50.0):
+        self.gains = gains
+        self.latency = latency_ms / 1000.0
+        self._command_times = collections.deque(maxlen=HISTORY)
+        self._commands = collections.deque(maxlen=HISTORY)
+
+    @classmethod
+    def from_config(cls, config):
+        """StatePredictor for the config, or None if PREDICTOR is off or no fitted gains are configured."""
+        if not int(config.PREDICTOR):
+            return None
+        if not str(config.PREDICTOR_GAINS or "").strip():
+            log.warning("[Predictor] PREDICTOR=1 needs PREDICTOR_GAINS (python state_predictor.py "
+                        "training_data/run_* --fit --no-yaw) → predictor off")
+            return None
+        predictor = cls(PredictorGains.parse(config.PREDICTOR_GAINS), float(config.PREDICTOR_LATENCY_MS))
+        log.info("[Predictor] On: latency %.0f ms + frame age, gains %s", predictor.latency * 1000,
+                 predictor.gains.format())
+        return predictor
+
+    def record_command(self, left, right, timestamp=None):
+        """Remember a sent command; it reaches the wheels half the fixed latency later."""
+        t = time.monotonic() if timestamp is None else timestamp
+        self._command_times.append(t + self.latency / 2)
+        self._commands.append(turn_and_speed(left, right))
+
+    def predict_for_frame(self, deviation, theta, frame, now=None):
+        """Line state when a command computed now takes effect (observed state is frame.timestamp old)."""
+        now = time.monotonic() if now is None else now
+        captured = (frame.timestamp if frame.timestamp is not None else now) - self.latency / 2
+        applied = now + self.latency / 2
+        HORIZON.observe(applied - captured)
+        return project(deviation, theta, captured, applied, self.gains,
+                       list(self._command_times), list(self._commands))
+
+# === Offline replay ===
+def load_replay(run_dir):
+    """Perceive every saved frame of a run and align it with metadata.csv (time, wheels, yaw rate)."""
+    import analytics
+    from video_compaction import iter_source_frames, load_metadata_rows
+    from frame_data import Frame
+    from rule_based_algorithms import Linetrace_white
+
+    run = analytics.load_run(run_dir)
+    yaw_rate = analytics.compute_series(run)["yaw_rate"]
+    by_name, by_id = load_metadata_rows(run_dir)
+
+    rows, deviation, theta = [], [], []
+    for frame_id, filename, jpeg in iter_source_frames(run_dir):
+        row = by_name.get(filename, by_id.get(frame_id))
+        if row is None or row >= len(run["time_ms"]) or np.isnan(run["time_ms"][row]):
+            continue
+        observation = Linetrace_white.perceive(Frame(jpeg, filename=filename))
+        if observation is None:
+            continue
+        rows.append(row)
+        deviation.append(observation.deviation)
+        theta.append(observation.theta_norm)
+
+    rows = np.asarray(rows, dtype=int)
+    order = np.argsort(run["time_ms"][rows], kind="stable")
+    rows = rows[order]
+    time_s = run["time_ms"] / 1000.0
+    left, right = np.nan_to_num(run["wheel_left"]), np.nan_to_num(run["wheel_right"])
+    valid = ~np.isnan(time_s)
+    return {
+        "time": time_s[rows],
+        "deviation": np.asarray(deviation)[order],
+        "theta": np.asarray(theta)[order],
+        # Telemetry for every metadata row (not only frames with a detected line)
+        "row_time": time_s[valid].tolist(),
+        "commands": list(zip(*turn_and_speed(left[valid], right[valid]))),
+        "yaw_rate": np.nan_to_num(yaw_rate[valid]).tolist(),
+    }
+
+def fit_gains(replays, use_yaw=True):
+    """Least-squares gains from the observed change between consecutive perceived frames."""
+    dev_a, dev_b, theta_a, theta_b = [], [], [], []
+    for replay in replays:
+        t, dev, theta = replay["time"], replay["deviation"], replay["theta"]
+        times, commands, yaw = replay["row_time"], replay["commands"], replay["yaw_rate"]
+        for k in range(len(t) - 1):
+            dt = t[k + 1] - t[k]
+            if not 0 < dt <= 0.2:
+                continue
+            turn, speed = _value_at(times, commands, t[k], (0.0, 0.0))
+            dev_a.append((turn * dt, speed * theta[k] * dt))
+            dev_b.append(dev[k + 1] - dev[k])
+            rate = _value_at(times, yaw, t[k], 0.0)
+            theta_a.append((turn * dt, rate * dt))
+            theta_b.append(theta[k + 1] - theta[k])
+    if len(dev_b) < 4:
+        raise ValueError("[Predictor] Not enough consecutive frames with a detected line to fit gains")
+    dev_per_turn, dev_per_theta = np.linalg.lstsq(np.asarray(dev_a), np.asarray(dev_b), rcond=None)[0]
+    theta_per_turn = np.linalg.lstsq(np.asarray(theta_a)[:, :1], np.asarray(theta_b), rcond=None)[0][0]
+    theta_per_yaw = (np.linalg.lstsq(np.asarray(theta_a)[:, 1:], np.asarray(theta_b), rcond=None)[0][0]
+                     if use_yaw else 0.0)
+    return PredictorGains(float(dev_per_turn), float(dev_per_theta), float(theta_per_turn), float(theta_per_yaw))
+
+def _rms(values):
+    return float(np.sqrt(np.mean(np.square(values)))) if len(values) else None
+
+def _improvement(delayed, predicted):
+    return round(100.0 * (1.0 - predicted / delayed), 1) if delayed else None
+
+def evaluate(replays, gains, latencies_ms=DEFAULT_LATENCIES_MS, use_yaw=True):
+    """
+    Per latency: RMS error of the delayed and of the predicted observation against the true current one
+    (deviation, heading and the resulting Linetrace_white command), and the improvement in percent.
+    """
+    from rule_based_algorithms import Linetrace_white
+
+    results = []
+    for latency_ms in latencies_ms:
+        latency = latency_ms / 1000.0
+        errors = {key: [] for key in ("dev_delayed", "dev_predicted", "theta_delayed", "theta_predicted",
+                                      "cmd_delayed", "cmd_predicted")}
+        for replay in replays:
+            t, dev, theta = replay["time"], replay["deviation"], replay["theta"]
+            yaw_times = replay["row_time"] if use_yaw else ()
+            yaw_rates = replay["yaw_rate"] if use_yaw else ()
+            # Latest frame the controller would have seen at t[k] with this latency
+            seen = np.searchsorted(t, t - latency, side="right") - 1
+            for k, j in enumerate(seen):
+                if j < 0:
+                    continue
+                pred_dev, pred_theta = project(dev[j], theta[j], t[j], t[k], gains, replay["row_time"],
+                                               replay["commands"], yaw_times, yaw_rates)
+                true_left = Linetrace_white.command(dev[k], theta[k])[0]
+                errors["dev_delayed"].append(dev[j] - dev[k])
+                errors["dev_predicted"].append(pred_dev - dev[k])
+                errors["theta_delayed"].append(theta[j] - theta[k])
+                errors["theta_predicted"].append(pred_theta - theta[k])
+                errors["cmd_delayed"].append(Linetrace_white.command(dev[j], theta[j])[0] - true_left)
+                errors["cmd_predicted"].append(Linetrace_white.command(pred_dev, pred_theta)[0] - true_left)
+
+        result = {"latency_ms": latency_ms, "frames": len(errors["dev_delayed"])}
+        for key, values in errors.items():
+            result[f"rms_{key}"] = _rms(values)
+        for name in ("dev", "theta", "cmd"):
+            result[f"{name}_improvement_pct"] = _improvement(result[f"rms_{name}_delayed"],
+                                                             result[f"rms_{name}_predicted"])
+        results.append(result)
+    return results
+
+def _format(value, digits=4):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded runs to measure latency compensation")
+    parser.add_argument("runs", nargs="+", help="Run folders (training_data/run_xxx)")
+    parser.add_argument("--latencies", type=float, nargs="+", default=list(DEFAULT_LATENCIES_MS),
+                        help="Artificial latencies [ms]")
+    parser.add_argument("--gains", type=str, default="", help="dev_per_turn,dev_per_theta,theta_per_turn,theta_per_yaw")
+    parser.add_argument("--fit", action="store_true", help="Fit the gains on the given runs first")
+    parser.add_argument("--no-yaw", action="store_true", help="Ignore yaw telemetry (commands only, as live)")
+    parser.add_argument("--out", type=str, default=None, help="Write the results as JSON")
+    args = parser.parse_args()
+    if not args.fit and not args.gains:
+        parser.error("give --gains or --fit (there are no default gains)")
+
+    race_logging.setup(rate_limit=0)
+    try:
+        replays = []
+        for run_dir in args.runs:
+            replay = load_replay(run_dir)
+            print(f"[Predictor] {os.path.basename(os.path.normpath(run_dir))}: "
+                  f"{len(replay['time'])} frames with a detected line")
+            if len(replay["time"]):
+                replays.append(replay)
+        if not replays:
+            print("[Predictor] No usable frames.")
+            return
+
+        use_yaw = not args.no_yaw
+        gains = fit_gains(replays, use_yaw) if args.fit else PredictorGains.parse(args.gains)
+        print(f"[Predictor] Gains ({'fitted' if args.fit else 'given'}): PREDICTOR_GAINS={gains.format()}")
+
+        results = evaluate(replays, gains, args.latencies, use_yaw)
+        print(f"{'latency':>8}{'frames':>8}{'dev delayed':>13}{'predicted':>11}{'gain %':>8}"
+              f"{'theta delayed':>15}{'predicted':>11}{'gain %':>8}{'cmd gain %':>12}")
+        for r in results:
+            print(f"{r['latency_ms']:>6.0f}ms{r['frames']:>8}"
+                  f"{_format(r['rms_dev_delayed']):>13}{_format(r['rms_dev_predicted']):>11}"
+                  f"{_format(r['dev_improvement_pct'], 1):>8}"
+                  f"{_format(r['rms_theta_delayed']):>15}{_format(r['rms_theta_predicted']):>11}"
+                  f"{_format(r['theta_improvement_pct'], 1):>8}{_format(r['cmd_improvement_pct'], 1):>12}")
+
+        if args.out:
+            with open(args.out, "w", encoding="utf-8") as f:
+                json.dump({"gains": gains._asdict(), "use_yaw": use_yaw, "runs": args.runs, "results": results},
+                          f, indent=2)
+            print(f"[Predictor] → {args.out}")
+    finally:
+        race_logging.shutdown()
+
+if __name__ == "__main__":
+    main()
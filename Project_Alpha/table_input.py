@@ -1,50 +1,51 @@
 # table_input.py
-# Sends torque values read from a CSV file to Unity via WebSocket
+# Replays torque values read from a CSV file (one row per 50 ms)
+# TABLE_TIMING=row advances one row per controller step (the original table playback: a late
+# step delays every following row); TABLE_TIMING=time picks the row for the time elapsed since
+# the first step, so the playback keeps wall-clock pace and skips rows when steps are late.
 
 import pandas as pd
-import asyncio
-import websocket_server
+import time
 import os
-from threading import Event
 
-start_event = Event()  # Trigger event to begin sending
+import config
+from controllers import Controller, register_controller, make_command
 
 # CSV file path
 INPUT_CSV_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "table_input.csv")
-
-csv_loaded = False
-df = None  # DataFrame to hold CSV content
-
-def start_csv_replay():
-    """Called once to trigger CSV replay"""
-    print("[TableInput] Start signal received.")
-    start_event.set()
-
-async def run_table_input_loop(stop_event):
-    """Main loop to read and send torque values from CSV"""
-    global df
-    global csv_loaded
-
-    if not os.path.exists(INPUT_CSV_FILE):
-        print(f"[TableInput] CSV file not found: {INPUT_CSV_FILE}")
-        return
-
-    if not csv_loaded:
-        df = pd.read_csv(INPUT_CSV_FILE)
-        print(f"[TableInput] Loaded {len(df)} torque rows from CSV.")
-        csv_loaded = True
-
-    print("[TableInput] Waiting for start event...")
-    await asyncio.to_thread(start_event.wait)  # Wait non-blocking
-
-    print("[TableInput] Start event detected. Begin sending torque values.")
-
-    for _, row in df.iterrows():
-        if stop_event.is_set():
-            break
-
-        left = float(row["Left_Torque"])
-        right = float(row["Right_Torque"])
-
-        await websocket_server.send_control_command_async(left, right)
-        await asyncio.sleep(0.05)  # Send at 20 FPS (50 ms interval)
+ROW_INTERVAL = 0.05  # Send at 20 FPS (50 ms interval)
+
+@register_controller("table")
+class TableController(Controller):
+    """Outputs the next CSV row (or the row for the elapsed time); holds the last row at the end."""
+    needs_frames = False
+
+    def __init__(self, csv_path=INPUT_CSV_FILE, timing=None):
+        self.csv_path = csv_path
+        self.timing = timing or config.TABLE_TIMING
+        self.rows = []
+        self.t0 = None
+        self.next_row = 0
+
+    def start(self):
+        if not os.path.exists(self.csv_path):
+            print(f"[TableInput] CSV file not found: {self.csv_path}")
+            return
+        df = pd.read_csv(self.csv_path)
+        self.rows = list(zip(df["Left_Torque"].astype(float), df["Right_Torque"].astype(float)))
+        print(f"[TableInput] Loaded {len(self.rows)} torque rows from CSV ({self.timing} timing).")
+
+    def step(self, frame):
+        if not self.rows:
+            return make_command(0.0, 0.0)
+        if self.t0 is None:
+            self.t0 = time.monotonic()
+            print("[TableInput] Begin sending torque values.")
+
+        if self.timing == "time":
+            index = int((time.monotonic() - self.t0) / ROW_INTERVAL)
+        else:
+            index = self.next_row
+            self.next_row += 1
+        left, right = self.rows[min(index, len(self.rows) - 1)]
+        return make_command(left, right)
@@ -0,0 +1,31 @@
+# Analytics over metadata.csv: missing yaw must not create heading spikes, and
+# analytics.json must stay strict JSON when aggregates are undefined.
+
+import json
+import math
+
+import numpy as np
+
+import analytics
+
+def test_yaw_gap_is_interpolated_not_zeroed():
+    yaw = np.array([np.nan, 358.0, 359.0, np.nan, np.nan, 2.0, 3.0, np.nan])
+    run = {"time_ms": np.arange(8) * 100.0, "pos_x": np.zeros(8), "pos_z": np.zeros(8), "yaw": yaw}
+    yaw_rate = analytics.compute_series(run)["yaw_rate"]
+    assert np.allclose(yaw_rate[2:7], 10.0)            # 1° per 100 ms across the gap and the wrap
+    assert math.isnan(yaw_rate[1]) and math.isnan(yaw_rate[7])
+
+def test_summary_json_has_no_nan(tmp_path):
+    rows = ["id,time_ms,frame_id,filename,soc,wheel_left,wheel_right,status,pos_x,pos_y,pos_z,yaw,error_code"]
+    for i in range(5):
+        rows.append(f"{i},{i * 100},{i},frame_{i}.jpg,,0.5,0.5,run,{i * 0.1},0,0,,")
+    (tmp_path / analytics.METADATA_NAME).write_text("\n".join(rows) + "\n", encoding="utf-8")
+
+    summary = analytics.analyze_run(str(tmp_path))
+    assert "error" not in summary
+    assert summary["yaw_rate_abs_mean"] is None and summary["soc_used"] is None
+
+    def reject(constant):
+        raise AssertionError(f"non-standard JSON constant {constant}")
+    with open(tmp_path / analytics.SUMMARY_NAME, encoding="utf-8") as f:
+        json.load(f, parse_constant=reject)
@@ -0,0 +1,66 @@
+# ChangeDetector: repeats of the same frame are not counted, unchanged new frames are reused,
+# a different key (e.g. SOC) is always recomputed, and write_report() ends the run's registrations.
+
+import io
+import json
+
+import numpy as np
+from PIL import Image
+
+import change_detector
+from change_detector import ChangeDetector
+from frame_data import Frame
+
+def jpeg(value):
+    buffer = io.BytesIO()
+    Image.fromarray(np.full((96, 128, 3), value, dtype=np.uint8)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+def counting(results):
+    def compute(frame):
+        results.append(frame.frame_id)
+        return frame.frame_id
+    return compute
+
+def test_repeated_frame_is_not_counted():
+    detector = ChangeDetector("test", threshold=2.0)
+    calls = []
+    frame = Frame(jpeg(100), frame_id=1)
+    for _ in range(5):
+        assert detector.run(frame, counting(calls)) == 1
+    assert detector.run(Frame(jpeg(100), frame_id=1), counting(calls)) == 1  # Same frame_id, new object
+    assert calls == [1]
+    assert (detector.checked, detector.reused) == (1, 0)
+
+def test_unchanged_new_frame_is_reused_changed_frame_is_not():
+    detector = ChangeDetector("test", threshold=2.0)
+    calls = []
+    detector.run(Frame(jpeg(100), frame_id=1), counting(calls))
+    assert detector.run(Frame(jpeg(100), frame_id=2), counting(calls)) == 1
+    assert detector.run(Frame(jpeg(200), frame_id=3), counting(calls)) == 3
+    assert calls == [1, 3]
+    assert (detector.checked, detector.reused) == (3, 1)
+
+def test_key_change_forces_recompute():
+    detector = ChangeDetector("test", threshold=2.0)
+    calls = []
+    detector.run(Frame(jpeg(100), frame_id=1), counting(calls), key=0.90)
+    detector.run(Frame(jpeg(100), frame_id=2), counting(calls), key=0.90)
+    detector.run(Frame(jpeg(100), frame_id=3), counting(calls), key=0.89)
+    assert calls == [1, 3]
+
+def test_max_skip_processes_anyway():
+    detector = ChangeDetector("test", threshold=2.0, max_skip=2)
+    calls = []
+    for frame_id in range(1, 6):
+        detector.run(Frame(jpeg(100), frame_id=frame_id), counting(calls))
+    assert calls == [1, 4]
+
+def test_write_report_clears_registrations(tmp_path):
+    change_detector.write_report(None)
+    detector = ChangeDetector("test", threshold=2.0)
+    detector.run(Frame(jpeg(100), frame_id=1), counting([]))
+    change_detector.write_report(str(tmp_path))
+    with open(tmp_path / change_detector.REPORT_NAME, encoding="utf-8") as f:
+        assert [d["name"] for d in json.load(f)["detectors"]] == ["test"]
+    assert change_detector._DETECTORS == []
@@ -0,0 +1,70 @@
+# Control-deadline watchdog: the fallback must engage when frames stop arriving,
+# even though the controller keeps stepping on the last frame.
+
+import time
+import threading
+
+from frame_data import Frame
+from controllers import Controller, ControllerRunner, make_command
+from control_watchdog import ControlWatchdog
+
+class ConstantController(Controller):
+    name = "constant"
+    period = 0.01
+
+    def step(self, frame):
+        return make_command(0.5, 0.4, frame)
+
+def run_on_frames(frame_source, seconds=0.1):
+    """Step a ConstantController on frame_source for a while; return the runner's latest command."""
+    runner = ControllerRunner(ConstantController(), frame_source, publish_commands=False)
+    stop_event = threading.Event()
+    runner.start(stop_event)
+    time.sleep(seconds)
+    stop_event.set()
+    runner.join()
+    assert runner.step_count > 1
+    return runner.latest
+
+def test_fresh_frames_pass():
+    watchdog = ControlWatchdog(200, "stop")
+    command = run_on_frames(lambda: Frame(b"", frame_id=1, timestamp=time.monotonic()))
+    assert watchdog.check(command) == command
+    assert watchdog.missed_ticks == 0
+
+def test_stalled_frame_source_triggers_fallback():
+    stalled = Frame(b"", frame_id=7, timestamp=time.monotonic())  # Last frame before Unity stopped
+    watchdog = ControlWatchdog(200, "stop")
+    assert watchdog.check(run_on_frames(lambda: stalled)).left == 0.5
+
+    time.sleep(0.25)
+    command = run_on_frames(lambda: stalled)  # Controller still stepping: the command itself is new
+    assert time.monotonic() - command.timestamp < 0.2
+
+    sent = watchdog.check(command)
+    assert (sent.left, sent.right) == (0.0, 0.0)
+    assert watchdog.missed_ticks == 1 and watchdog._episode[3] == 7
+
+def test_decay_and_hold_fallbacks():
+    now = time.monotonic()
+    fresh = make_command(1.0, -1.0, Frame(b"", frame_id=1, timestamp=now))
+    for fallback, expected in (("decay", (0.7, -0.7)), ("hold", (1.0, -1.0))):
+        watchdog = ControlWatchdog(200, fallback)
+        watchdog.check(fresh, now=now)
+        sent = watchdog.check(fresh, now=now + 0.5)
+        assert (round(sent.left, 6), round(sent.right, 6)) == expected
+
+def test_recovers_when_frames_resume():
+    now = time.monotonic()
+    watchdog = ControlWatchdog(200, "stop")
+    watchdog.check(make_command(0.5, 0.5, Frame(b"", frame_id=1, timestamp=now)), now=now)
+    watchdog.check(make_command(0.5, 0.5, Frame(b"", frame_id=1, timestamp=now)), now=now + 0.5)
+    resumed = make_command(0.3, 0.3, Frame(b"", frame_id=2, timestamp=now + 0.55))
+    assert watchdog.check(resumed, now=now + 0.6) == resumed
+    assert len(watchdog.episodes) == 1
+
+def test_commands_without_frames_use_step_time():
+    watchdog = ControlWatchdog(150, "stop")
+    command = make_command(0.2, 0.2)  # keyboard / table
+    assert watchdog.check(command, now=command.timestamp + 0.1) == command
+    assert watchdog.check(command, now=command.timestamp + 0.2).left == 0.0
@@ -0,0 +1,86 @@
+# Frame container: write/read round trip, index rebuild by scanning (current VRC2 and legacy
+# VRCF records) and recovery from a truncated final record.
+
+import os
+import struct
+
+import pytest
+
+from frame_container import (CONTAINER_NAME, INDEX_NAME, RECORD_HEADER, FrameContainerReader,
+                             FrameContainerWriter, load_index, scan_container)
+
+LEGACY_HEADER = struct.Struct("<4sIIfH")
+
+def payload(i):
+    return b"\xff\xd8" + bytes([i % 256]) * (50 + i) + b"\xff\xd9"
+
+def write_container(run_dir, count, **kwargs):
+    writer = FrameContainerWriter(str(run_dir))
+    for i in range(1, count + 1):
+        writer.append(payload(i), filename=f"frame_{i:06d}.jpg", frame_id=i, soc=0.5 + i / 100, **kwargs)
+    writer.close()
+    return os.path.join(str(run_dir), CONTAINER_NAME)
+
+def test_round_trip(tmp_path):
+    path = write_container(tmp_path, 5)
+    with FrameContainerReader(path) as reader:
+        assert len(reader) == 5
+        assert bytes(reader.read(2)) == payload(3)
+        assert bytes(reader.read_frame_id(5)) == payload(5)
+        assert bytes(reader.read_filename("frame_000001.jpg")) == payload(1)
+        entry = reader.entries[3]
+        assert (entry.frame_id, entry.filename) == (4, "frame_000004.jpg")
+        assert entry.soc == pytest.approx(0.54, abs=1e-4)
+
+def test_large_frame_id_and_missing_soc(tmp_path):
+    writer = FrameContainerWriter(str(tmp_path))
+    big = 1_700_000_000_123  # Fallback filenames carry millisecond timestamps
+    writer.append(payload(1), filename=f"frame_{big}.jpg", frame_id=big)
+    writer.close()
+    os.remove(os.path.join(str(tmp_path), INDEX_NAME))
+    [entry] = scan_container(os.path.join(str(tmp_path), CONTAINER_NAME))
+    assert entry.frame_id == big and entry.soc is None
+
+def test_scan_matches_index(tmp_path):
+    path = write_container(tmp_path, 10)
+    indexed = [(e.frame_id, e.filename, e.offset, e.length) for e in load_index(path)]
+    scanned = [(e.frame_id, e.filename, e.offset, e.length) for e in scan_container(path)]
+    assert scanned == indexed
+
+def test_missing_index_is_rebuilt(tmp_path):
+    path = write_container(tmp_path, 4)
+    os.remove(os.path.join(str(tmp_path), INDEX_NAME))
+    with FrameContainerReader(path) as reader:
+        assert [bytes(p) for _, p in reader] == [payload(i) for i in range(1, 5)]
+
+def test_truncated_tail_is_dropped(tmp_path):
+    path = write_container(tmp_path, 6)
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        f.truncate(size - 10)  # Crash in the middle of the last payload
+    entries = load_index(path)  # Index no longer matches the file size → scan
+    assert [e.frame_id for e in entries] == [1, 2, 3, 4, 5]
+    with FrameContainerReader(path) as reader:
+        assert bytes(reader.read(4)) == payload(5)
+
+def test_truncated_header_is_dropped(tmp_path):
+    path = write_container(tmp_path, 3)
+    with open(path, "ab") as f:
+        f.write(RECORD_HEADER.pack(b"VRC2", 4, 100, 0.5, 0)[:7])
+    assert [e.frame_id for e in scan_container(path)] == [1, 2, 3]
+
+def test_legacy_records_are_read(tmp_path):
+    path = os.path.join(str(tmp_path), CONTAINER_NAME)
+    with open(path, "wb") as f:
+        for i in (1, 2):
+            name = f"frame_{i:06d}.jpg".encode()
+            f.write(LEGACY_HEADER.pack(b"VRCF", i, len(payload(i)), 0.9, len(name)) + name + payload(i))
+    writer = FrameContainerWriter(str(tmp_path))
+    writer.append(payload(3), filename="frame_000003.jpg", frame_id=3)
+    writer.close()
+    os.remove(os.path.join(str(tmp_path), INDEX_NAME))
+
+    with FrameContainerReader(path) as reader:
+        assert [e.frame_id for e in reader.entries] == [1, 2, 3]
+        assert [bytes(p) for _, p in reader] == [payload(i) for i in (1, 2, 3)]
+        assert reader.entries[0].soc == pytest.approx(0.9)
@@ -0,0 +1,45 @@
+# parse_frame_message: zero-copy parsing of [uint32 header length][JSON header][JPEG] messages
+# and rejection (ValueError) of malformed ones.
+
+import json
+import struct
+
+import pytest
+
+from frame_data import parse_frame_id, parse_frame_message
+
+JPEG = b"\xff\xd8" + bytes(2000) + b"\xff\xd9"
+
+def message(header, jpeg=JPEG):
+    raw = header if isinstance(header, bytes) else json.dumps(header).encode("utf-8")
+    return struct.pack("<I", len(raw)) + raw + jpeg
+
+def test_parses_header_and_payload_view():
+    data = message({"soc": 0.8765, "filename": "frame_000123.jpg"})
+    record = parse_frame_message(data, timestamp=1.5)
+    assert (record.soc, record.filename, record.frame_id, record.timestamp) == (0.8765, "frame_000123.jpg", 123, 1.5)
+    assert isinstance(record.jpeg, memoryview) and bytes(record.jpeg) == JPEG
+    assert record.jpeg.obj is data  # No copy of the payload
+
+def test_slow_path_header():
+    record = parse_frame_message(message({"filename": "frame_000007.jpg", "extra": [1, 2]}))
+    assert (record.soc, record.frame_id) == (None, 7)
+
+@pytest.mark.parametrize("data", [
+    b"\x01\x00",                                   # Shorter than the length prefix
+    struct.pack("<I", 100) + b"{}",                # Header length beyond the message
+    message(b"{not json"),
+    message(b"[1,2]"),                             # Valid JSON, not an object
+    message(b"null"),
+    message({"soc": "high", "filename": "frame_000001.jpg"}),
+    message({"soc": 0.5, "filename": 12}),
+])
+def test_malformed_messages_raise_value_error(data):
+    with pytest.raises(ValueError):
+        parse_frame_message(data)
+
+def test_parse_frame_id():
+    assert parse_frame_id("frame_000042.jpg") == 42
+    assert parse_frame_id("images/frame_1700000000123.jpg") == 1700000000123
+    assert parse_frame_id("latest.jpg") is None
+    assert parse_frame_id(None) is None
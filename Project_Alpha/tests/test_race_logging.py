@@ -0,0 +1,31 @@
+# Rate limiting of the console log: only INFO/DEBUG call sites are limited or sampled.
+
+import logging
+
+from race_logging import RateLimitFilter
+
+def make_record(level, created, sample=None):
+    record = logging.LogRecord("test", level, "site.py", 10, "message", None, None)
+    record.created = created
+    if sample is not None:
+        record.sample = sample
+    return record
+
+def test_info_is_rate_limited_and_counts_suppressed():
+    rate_filter = RateLimitFilter(1)
+    assert rate_filter.filter(make_record(logging.INFO, 0.0))
+    assert not rate_filter.filter(make_record(logging.INFO, 0.1))
+    assert not rate_filter.filter(make_record(logging.INFO, 0.2))
+    record = make_record(logging.INFO, 1.5)
+    assert rate_filter.filter(record)
+    assert record.suppressed == 2
+
+def test_warnings_and_errors_always_pass():
+    rate_filter = RateLimitFilter(1)
+    for i, level in enumerate([logging.WARNING, logging.ERROR] * 5):
+        assert rate_filter.filter(make_record(level, i * 0.01, sample=10))
+
+def test_sampling_applies_to_debug():
+    rate_filter = RateLimitFilter(0)
+    passed = [rate_filter.filter(make_record(logging.DEBUG, float(i), sample=3)) for i in range(6)]
+    assert passed == [True, False, False, True, False, False]
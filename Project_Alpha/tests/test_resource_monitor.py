@@ -0,0 +1,27 @@
+# Resource sampler: a failing probe must skip one sample, not end the sampler thread.
+
+import time
+
+import resource_monitor
+
+def test_failed_sample_is_counted_and_sampling_continues(tmp_path, monkeypatch):
+    rss_bytes = resource_monitor._rss_bytes
+    calls = []
+
+    def flaky_rss(process):
+        calls.append(1)
+        if len(calls) in (2, 3):
+            raise OSError("probe failed")
+        return rss_bytes(process)
+
+    monkeypatch.setattr(resource_monitor, "_rss_bytes", flaky_rss)
+    sampler = resource_monitor.ResourceSampler(str(tmp_path), interval=0.02)
+    sampler.start()
+    time.sleep(0.2)
+    assert sampler._thread.is_alive()
+    sampler.stop()
+
+    summary = sampler.summary()
+    assert summary["sample_errors"] == 2
+    assert summary["last_sample_error"] == "OSError: probe failed"
+    assert summary["samples"] == len(calls) - 2 > 2
@@ -0,0 +1,99 @@
+# Run catalog: indexing a run folder, query_runs filters and migrating a catalog created
+# before the container_path column existed.
+
+import csv
+import json
+import sqlite3
+
+import run_catalog
+from frame_container import FrameContainerWriter
+
+METADATA_FIELDS = ["id", "time_ms", "frame_id", "filename", "soc", "wheel_left", "wheel_right", "status",
+                   "pos_x", "pos_y", "pos_z", "yaw", "error_code"]
+
+def make_run(root, name, mode, frames, soc_end, error_code="0", container=False):
+    run_dir = root / name
+    (run_dir / "images").mkdir(parents=True)
+    with open(run_dir / "metadata.csv", "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(METADATA_FIELDS)
+        for i in range(frames):
+            soc = 1.0 - (1.0 - soc_end) * i / max(1, frames - 1)
+            code = error_code if i == frames - 1 else "0"
+            writer.writerow([i, i * 50, i + 1, f"frame_{i + 1:06d}.jpg", soc, 0, 0, "run", 0, 0, 0, 0, code])
+    with open(run_dir / "config.json", "w", encoding="utf-8") as f:
+        json.dump({"MODE": mode}, f)
+    if container:
+        writer = FrameContainerWriter(str(run_dir))
+        for i in range(frames):
+            writer.append(b"\xff\xd8" + bytes(100) + b"\xff\xd9", filename=f"frame_{i + 1:06d}.jpg", frame_id=i + 1)
+        writer.close()
+    else:
+        for i in range(frames):
+            (run_dir / "images" / f"frame_{i + 1:06d}.jpg").write_bytes(b"\xff\xd8\xff\xd9")
+    return str(run_dir)
+
+def test_index_run_summary(tmp_path):
+    catalog = str(tmp_path / "catalog.db")
+    run_dir = make_run(tmp_path, "run_20250101_120000", "rule_based", 21, 0.8, error_code="2", container=True)
+    summary = run_catalog.index_run(run_dir, catalog_path=catalog)
+
+    assert summary["mode"] == "rule_based"
+    assert summary["started_at"] == "2025-01-01 12:00:00"
+    assert summary["frame_count"] == 21 and summary["image_count"] == 21
+    assert summary["duration_ms"] == 1000
+    assert abs(summary["soc_end"] - 0.8) < 1e-9
+    assert summary["error_frames"] == 1
+    assert summary["container_path"].endswith("frames.vrc")
+    assert run_catalog.get_error_counts("run_20250101_120000", catalog) == {"0": 20, "2": 1}
+
+def test_query_runs_filters(tmp_path):
+    catalog = str(tmp_path / "catalog.db")
+    make_run(tmp_path, "run_20250101_120000", "rule_based", 41, 0.9)
+    make_run(tmp_path, "run_20250101_130000", "rule_based", 11, 0.5, error_code="3")
+    make_run(tmp_path, "run_20250101_140000", "ai", 81, 0.7)
+    assert run_catalog.backfill(str(tmp_path), catalog) == 3
+    assert run_catalog.backfill(str(tmp_path), catalog) == 0  # Already indexed
+
+    def names(**filters):
+        return [r["run_name"][-6:] for r in run_catalog.query_runs(catalog_path=catalog, **filters)]
+
+    assert names() == ["120000", "130000", "140000"]
+    assert names(mode="rule_based") == ["120000", "130000"]
+    assert names(min_duration_ms=2000) == ["120000", "140000"]
+    assert names(max_duration_ms=2000) == ["120000", "130000"]
+    assert names(min_final_soc=0.6, max_final_soc=0.8) == ["140000"]
+    assert names(error_code=3) == ["130000"]
+    assert names(min_frames=50) == ["140000"]
+    assert names(mode="rule_based", limit=1) == ["120000"]
+
+OLD_SCHEMA = """
+CREATE TABLE runs (
+    run_name TEXT PRIMARY KEY, run_dir TEXT NOT NULL, mode TEXT, config_json TEXT, started_at TEXT,
+    frame_count INTEGER, image_count INTEGER, time_start_ms REAL, time_end_ms REAL, duration_ms REAL,
+    soc_start REAL, soc_end REAL, soc_min REAL, soc_mean REAL, error_frames INTEGER,
+    metadata_path TEXT, images_dir TEXT, unity_log_path TEXT, indexed_at REAL
+);
+"""
+
+def test_migrates_catalog_without_container_path(tmp_path):
+    catalog = str(tmp_path / "catalog.db")
+    conn = sqlite3.connect(catalog)
+    conn.executescript(OLD_SCHEMA)
+    conn.execute("INSERT INTO runs (run_name, run_dir, mode, frame_count) VALUES ('run_old', '/old', 'table', 5)")
+    conn.commit()
+    conn.close()
+
+    conn = run_catalog.connect(catalog)
+    try:
+        columns = {row["name"] for row in conn.execute("PRAGMA table_info(runs)")}
+        assert "container_path" in columns
+        assert conn.execute("PRAGMA user_version").fetchone()[0] == run_catalog.SCHEMA_VERSION
+    finally:
+        conn.close()
+
+    run_dir = make_run(tmp_path, "run_20250102_120000", "ai", 3, 0.9, container=True)
+    run_catalog.index_run(run_dir, catalog_path=catalog)
+    runs = {r["run_name"]: r for r in run_catalog.query_runs(catalog_path=catalog)}
+    assert runs["run_old"]["frame_count"] == 5 and runs["run_old"]["container_path"] is None
+    assert runs["run_20250102_120000"]["container_path"].endswith("frames.vrc")
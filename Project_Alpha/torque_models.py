@@ -0,0 +1,162 @@
+# torque_models.py
+# TorqueNet and its compact variants for the AI controller.
+#
+# Variants (AI_VARIANT in config.txt):
+#   full  = original MLP on 224x224 RGB + SOC (models/model.pth)
+#   int8  = the same checkpoint with dynamic int8 quantization of the Linear layers
+#   small = MLP on a reduced input (AI_INPUT_SIZE, optionally AI_GRAYSCALE=1)
+#   conv  = small convolutional front-end + MLP head on the reduced input
+# small and conv checkpoints are trained from model.pth with distill_model.py.
+#
+# Every model takes one flat input vector [image pixels..., SOC] so the controller and the
+# comparison tool (compare_models.py) can treat all variants the same way.
+
+import io
+import os
+import time
+import torch
+import torch.nn as nn
+
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+VARIANTS = ("full", "int8", "small", "conv")
+FULL_INPUT_SIZE = 224
+SMALL_INPUT_SIZE = 64  # Default input size of the small / conv variants (AI_INPUT_SIZE)
+
+class TorqueNet(nn.Module):
+    """Simple MLP for torque prediction based on image + SOC."""
+    def __init__(self, input_size):
+        super().__init__()
+        self.fc = nn.Sequential(
+            nn.Linear(input_size, 512),
+            nn.ReLU(),
+            nn.Linear(512, 128),
+            nn.ReLU(),
+            nn.Linear(128, 2)
+        )
+
+    def forward(self, x):
+        return self.fc(x)
+
+class TorqueConvNet(nn.Module):
+    """Small strided-conv front-end followed by an MLP head; SOC joins after pooling."""
+    def __init__(self, channels, image_size):
+        super().__init__()
+        self.channels = channels
+        self.image_size = image_size  # (width, height)
+        self.features = nn.Sequential(
+            nn.Conv2d(channels, 16, 5, stride=2, padding=2),
+            nn.ReLU(),
+            nn.Conv2d(16, 32, 3, stride=2, padding=1),
+            nn.ReLU(),
+            nn.Conv2d(32, 64, 3, stride=2, padding=1),
+            nn.ReLU(),
+            nn.AdaptiveAvgPool2d((4, 4))
+        )
+        self.head = nn.Sequential(
+            nn.Linear(64 * 4 * 4 + 1, 128),
+            nn.ReLU(),
+            nn.Linear(128, 2)
+        )
+
+    def forward(self, x):
+        width, height = self.image_size
+        image = x[:, :-1].reshape(-1, self.channels, height, width)
+        soc = x[:, -1:]
+        features = self.features(image).flatten(1)
+        return self.head(torch.cat([features, soc], dim=1))
+
+class ModelSpec:
+    """Which variant to run and what input it expects."""
+
+    def __init__(self, variant="full", input_size=FULL_INPUT_SIZE, grayscale=False):
+        if variant not in VARIANTS:
+            raise ValueError(f"[Models] Unknown AI variant: {variant} (expected one of {VARIANTS})")
+        if variant in ("full", "int8"):
+            input_size, grayscale = FULL_INPUT_SIZE, False  # Same input as the original checkpoint
+        self.variant = variant
+        self.image_size = (int(input_size), int(input_size))
+        self.grayscale = bool(grayscale)
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config.AI_VARIANT, config.AI_INPUT_SIZE, config.AI_GRAYSCALE)
+
+    @property
+    def channels(self):
+        return 1 if self.grayscale else 3
+
+    @property
+    def input_features(self):
+        return self.channels * self.image_size[0] * self.image_size[1] + 1  # Image (flattened) + 1 SOC
+
+    @property
+    def checkpoint_path(self):
+        if self.variant in ("full", "int8"):
+            return os.path.join(MODELS_DIR, "model.pth")
+        suffix = "_gray" if self.grayscale else ""
+        return os.path.join(MODELS_DIR, f"model_{self.variant}_{self.image_size[0]}{suffix}.pth")
+
+    def __repr__(self):
+        return (f"ModelSpec({self.variant}, {self.image_size[0]}x{self.image_size[1]}, "
+                f"{'gray' if self.grayscale else 'rgb'})")
+
+def build_model(spec):
+    """Create an untrained model for the spec (also used to train new variants)."""
+    if spec.variant == "conv":
+        return TorqueConvNet(spec.channels, spec.image_size)
+    return TorqueNet(spec.input_features)
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of the Linear layers (weights int8, activations quantized on the fly)."""
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+def load_state_dict(path):
+    """
+    Load a checkpoint memory-mapped: tensors stay backed by the file and pages are read on
+    first use instead of copying the whole file into RAM up front.
+    """
+    try:
+        return torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+    except RuntimeError:
+        # Legacy (non-zipfile) checkpoints cannot be memory-mapped
+        return torch.load(path, map_location="cpu", weights_only=True)
+
+def load_model(spec, checkpoint_path=None):
+    """Build the model for the spec, load its checkpoint and return it in eval mode."""
+    # Built on the meta device (no random init of weights that are overwritten anyway);
+    # assign=True then adopts the memory-mapped checkpoint tensors as the parameters.
+    with torch.device("meta"):
+        model = build_model(spec)
+    model.load_state_dict(load_state_dict(checkpoint_path or spec.checkpoint_path), assign=True)
+    model.eval()
+    if spec.variant == "int8":
+        model = quantize_int8(model)
+    return model
+
+def warm_up(model, spec, runs=2):
+    """
+    Run the full preprocessing + forward path on a blank frame so lazy imports, transform
+    construction, weight page-in and kernel selection happen before the race.
+    Returns the duration of the first run in seconds.
+    """
+    from PIL import Image
+    from frame_data import Frame
+
+    buffer = io.BytesIO()
+    Image.new("RGB", (FULL_INPUT_SIZE, FULL_INPUT_SIZE)).save(buffer, format="JPEG")
+    first = None
+    for _ in range(runs):
+        t_start = time.perf_counter()
+        with torch.no_grad():
+            model(make_input(Frame(buffer.getvalue()), 0.0, spec))
+        if first is None:
+            first = time.perf_counter() - t_start
+    return first
+
+def make_input(frame, soc, spec):
+    """Build the (1 x input_features) model input for a frame_data.Frame."""
+    # Reduced variants resize from a draft-mode decode; full keeps the original preprocessing
+    draft = spec.variant not in ("full", "int8")
+    image_tensor = frame.tensor(spec.image_size, grayscale=spec.grayscale, draft=draft).reshape(-1)
+    soc_tensor = torch.tensor([soc], dtype=torch.float32)
+    return torch.cat([image_tensor, soc_tensor]).unsqueeze(0)
@@ -0,0 +1,339 @@
+# video_compaction.py
+# Post-race compaction of a run's captured frames (images/*.jpg or frames.vrc) into one video file.
+#
+# Files written to the run folder:
+#   frames.mp4         all frames in capture order (cv2.VideoWriter)
+#   frames_video.csv   index: video_index, frame_id, filename, metadata_row (row in metadata.csv, -1 if absent)
+#   compaction.json    compression ratio, encode throughput and verification result
+#
+# The video is verified (frame count + random-access spot checks against the originals and
+# their neighbours, so off-by-one seeks are caught) before the originals are deleted (only with --delete / VIDEO_DELETE_ORIGINALS=1).
+# VideoFrameReader gives offline tools frame-accurate access by video index or frame_id.
+#
+# Usage:
+#   python video_compaction.py training_data/run_xxx [--delete] [--codec mp4v] [--fps 20]
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import threading
+import subprocess
+
+import cv2
+import numpy as np
+
+from frame_container import CONTAINER_NAME, INDEX_NAME, FrameContainerReader, find_container
+from frame_data import Frame, parse_frame_id
+
+VIDEO_NAME = "frames.mp4"
+VIDEO_INDEX_NAME = "frames_video.csv"
+REPORT_NAME = "compaction.json"
+VIDEO_INDEX_FIELDS = ["video_index", "frame_id", "filename", "metadata_row"]
+DEFAULT_CODEC = "mp4v"
+DEFAULT_FPS = 20            # Unity sends 20 frames per second
+VERIFY_SAMPLES = 12         # Frames compared against the originals (random access order)
+VERIFY_MIN_PSNR = 25.0      # dB; lower means the video is not a usable replacement
+
+# === Sources ===
+def iter_source_frames(run_dir):
+    """Yield (frame_id, filename, jpeg bytes) in capture order from the container or images/."""
+    container_path = find_container(run_dir)
+    if container_path:
+        with FrameContainerReader(container_path) as reader:
+            for entry, payload in reader:
+                yield entry.frame_id, entry.filename, bytes(payload)
+        return
+
+    images_dir = os.path.join(run_dir, "images")
+    if not os.path.isdir(images_dir):
+        return
+    names = [f for f in os.listdir(images_dir) if f.lower().endswith(".jpg")]
+    names.sort(key=lambda name: (parse_frame_id(name) is None, parse_frame_id(name) or 0, name))
+    for name in names:
+        with open(os.path.join(images_dir, name), "rb") as f:
+            yield parse_frame_id(name), name, f.read()
+
+def load_metadata_rows(run_dir):
+    """{filename: row} and {frame_id: row} for metadata.csv (row = 0-based data row)."""
+    by_name, by_id = {}, {}
+    path = os.path.join(run_dir, "metadata.csv")
+    if os.path.exists(path):
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            for row_number, row in enumerate(csv.DictReader(f)):
+                if row.get("filename"):
+                    by_name.setdefault(row["filename"], row_number)
+                try:
+                    by_id.setdefault(int(float(row.get("frame_id"))), row_number)
+                except (TypeError, ValueError):
+                    pass
+    return by_name, by_id
+
+def decode_jpeg(jpeg):
+    return cv2.imdecode(np.frombuffer(jpeg, dtype=np.uint8), cv2.IMREAD_COLOR)
+
+def psnr(a, b):
+    mse = np.mean((a.astype(np.float32) - b.astype(np.float32)) ** 2)
+    return float("inf") if mse == 0 else float(10.0 * np.log10(255.0 ** 2 / mse))
+
+# === Reader ===
+def find_video(path):
+    """Return the video path if 'path' is the video file or a run folder holding one (else None)."""
+    if os.path.isfile(path) and not path.endswith(".csv"):
+        return path
+    candidate = os.path.join(path, VIDEO_NAME)
+    return candidate if os.path.isfile(candidate) else None
+
+def load_video_index(video_path):
+    """List of (frame_id, filename, metadata_row) per video frame."""
+    entries = []
+    with open(os.path.join(os.path.dirname(video_path), VIDEO_INDEX_NAME), "r", newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            frame_id = int(row["frame_id"]) if row["frame_id"] else None
+            entries.append((frame_id, row["filename"], int(row["metadata_row"])))
+    return entries
+
+class VideoFrameReader:
+    """Frame-accurate access to a compacted run video (by video index, frame_id or filename)."""
+
+    def __init__(self, path):
+        self.path = find_video(path)
+        if self.path is None:
+            raise FileNotFoundError(f"[VideoCompaction] No {VIDEO_NAME} in {path}")
+        self.entries = load_video_index(self.path)
+        self._by_frame_id = {e[0]: i for i, e in enumerate(self.entries) if e[0] is not None}
+        self._by_filename = {e[1]: i for i, e in enumerate(self.entries) if e[1]}
+        self._capture = cv2.VideoCapture(self.path)
+        self._next = 0  # Index the decoder will return on the next read()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def read(self, index):
+        """BGR image of the index-th video frame."""
+        if not 0 <= index < len(self.entries):
+            raise IndexError(index)
+        if index != self._next:
+            # Sequential reads never seek; the FFmpeg backend decodes forward from the
+            # previous keyframe to land on exactly this frame
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+        ok, image = self._capture.read()
+        if not ok:
+            self._next = -1
+            raise IOError(f"[VideoCompaction] Failed to decode frame {index} of {self.path}")
+        self._next = index + 1
+        return image
+
+    def read_frame_id(self, frame_id):
+        return self.read(self._by_frame_id[frame_id])
+
+    def read_filename(self, filename):
+        return self.read(self._by_filename[filename])
+
+    def frame(self, index, quality=95):
+        """The index-th frame as a frame_data.Frame (re-encoded as JPEG for the usual views)."""
+        frame_id, filename, _ = self.entries[index]
+        ok, jpeg = cv2.imencode(".jpg", self.read(index), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        return Frame(jpeg.tobytes(), filename=filename or None, frame_id=frame_id)
+
+    def __iter__(self):
+        for i in range(len(self.entries)):
+            yield self.entries[i], self.read(i)
+
+    def close(self):
+        self._capture.release()
+
+# === Compaction ===
+def compact_run(run_dir, codec=DEFAULT_CODEC, fps=DEFAULT_FPS, delete_originals=False):
+    """Encode the run's frames into one video, verify it and optionally delete the originals."""
+    video_path = os.path.join(run_dir, VIDEO_NAME)
+    by_name, by_id = load_metadata_rows(run_dir)
+    originals = []     # (filename, frame_id) per written video frame
+    source_bytes = 0
+    skipped = 0
+    writer = None
+    size = None
+
+    t_start = time.perf_counter()
+    for frame_id, filename, jpeg in iter_source_frames(run_dir):
+        image = decode_jpeg(jpeg)
+        if image is None:
+            skipped += 1
+            continue
+        if writer is None:
+            size = (image.shape[1], image.shape[0])
+            writer = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*codec), fps, size)
+            if not writer.isOpened():
+                print(f"[VideoCompaction] Cannot open video writer (codec {codec}) for {video_path}")
+                return None
+        if (image.shape[1], image.shape[0]) != size:
+            image = cv2.resize(image, size)
+        writer.write(image)
+        originals.append((filename, frame_id))
+        source_bytes += len(jpeg)
+    if writer is None:
+        print(f"[VideoCompaction] No frames to compact in {run_dir}")
+        return None
+    writer.release()
+    encode_seconds = time.perf_counter() - t_start
+
+    with open(os.path.join(run_dir, VIDEO_INDEX_NAME), "w", newline="", encoding="utf-8") as f:
+        index_writer = csv.writer(f)
+        index_writer.writerow(VIDEO_INDEX_FIELDS)
+        for video_index, (filename, frame_id) in enumerate(originals):
+            metadata_row = by_name.get(filename, by_id.get(frame_id, -1))
+            index_writer.writerow([video_index, "" if frame_id is None else frame_id, filename or "", metadata_row])
+
+    verified, min_psnr = verify_video(run_dir)
+    video_bytes = os.path.getsize(video_path)
+    report = {
+        "video": VIDEO_NAME,
+        "codec": codec,
+        "frames": len(originals),
+        "skipped": skipped,
+        "source_bytes": source_bytes,
+        "video_bytes": video_bytes,
+        "compression_ratio": round(source_bytes / video_bytes, 2) if video_bytes else None,
+        "encode_seconds": round(encode_seconds, 3),
+        "encode_fps": round(len(originals) / encode_seconds, 1) if encode_seconds > 0 else None,
+        "encode_mb_per_s": round(source_bytes / 1e6 / encode_seconds, 2) if encode_seconds > 0 else None,
+        "verified": verified,
+        "min_psnr_db": None if min_psnr is None else round(min_psnr, 2),
+        "originals_deleted": False,
+    }
+
+    if delete_originals:
+        if verified:
+            delete_original_frames(run_dir, [filename for filename, _ in originals])
+            report["originals_deleted"] = True
+        else:
+            print("[VideoCompaction] Verification failed → originals kept.")
+
+    with open(os.path.join(run_dir, REPORT_NAME), "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"[VideoCompaction] {os.path.basename(os.path.normpath(run_dir))}: {report['frames']} frames, "
+          f"{source_bytes / 1e6:.1f} MB → {video_bytes / 1e6:.1f} MB (x{report['compression_ratio']}), "
+          f"{report['encode_fps']} fps / {report['encode_mb_per_s']} MB/s, "
+          f"verified={verified} (min PSNR {report['min_psnr_db']} dB)")
+    return report
+
+def verify_video(run_dir, samples=VERIFY_SAMPLES, min_psnr=VERIFY_MIN_PSNR):
+    """
+    Check frame count and compare sampled frames (read out of order) with the originals.
+    Each sample must reach min_psnr against its own original and match it better than the
+    originals of the previous and next frame, so a seek landing one frame off fails.
+    """
+    try:
+        reader = VideoFrameReader(run_dir)
+    except (FileNotFoundError, OSError) as e:
+        print(e)
+        return False, None
+
+    with reader:
+        count = int(reader._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        if count != len(reader):
+            print(f"[VideoCompaction] Frame count mismatch: video {count}, index {len(reader)}")
+            return False, None
+
+        picks = np.unique(np.linspace(0, len(reader) - 1, min(samples, len(reader))).astype(int))
+        needed = {int(j) for i in picks for j in (i - 1, i, i + 1) if 0 <= j < len(reader)}
+        wanted = {reader.entries[i][:2]: i for i in needed}  # (frame_id, filename) -> video index
+        originals = {}
+        for frame_id, filename, jpeg in iter_source_frames(run_dir):
+            video_index = wanted.get((frame_id, filename))
+            if video_index is not None:
+                originals[video_index] = decode_jpeg(jpeg)
+
+        worst = None
+        for i in np.random.default_rng(0).permutation(picks):  # Out of order: exercises seeking
+            i = int(i)
+            try:
+                decoded = reader.read(i)
+            except IOError as e:
+                print(e)
+                return False, worst
+            original = originals.get(i)
+            if original is None:
+                continue
+            original = _fit(original, decoded)
+            value = psnr(original, decoded)
+            worst = value if worst is None else min(worst, value)
+            for neighbour in (i - 1, i + 1):
+                other = originals.get(neighbour)
+                if other is None:
+                    continue
+                other = _fit(other, decoded)
+                if psnr(original, other) >= value:
+                    continue  # Neighbour closer to this frame than the codec error (static scene): no evidence
+                neighbour_value = psnr(other, decoded)
+                if neighbour_value >= value:
+                    print(f"[VideoCompaction] Seek to frame {i} matches frame {neighbour} better "
+                          f"({neighbour_value:.1f} dB vs {value:.1f} dB)")
+                    return False, worst
+        return worst is not None and worst >= min_psnr, worst
+
+def _fit(image, reference):
+    """image resized to the reference's size (originals may differ from the encoded size)."""
+    if image.shape == reference.shape:
+        return image
+    return cv2.resize(image, (reference.shape[1], reference.shape[0]))
+
+def delete_original_frames(run_dir, filenames):
+    images_dir = os.path.join(run_dir, "images")
+    for name in filenames:
+        path = os.path.join(images_dir, name) if name else None
+        if path and os.path.exists(path):
+            try:
+                os.remove(path)
+            except OSError as e:
+                print(f"[VideoCompaction] Failed to delete {name}: {e}")
+    for name in (CONTAINER_NAME, INDEX_NAME):
+        path = os.path.join(run_dir, name)
+        if os.path.exists(path):
+            os.remove(path)
+    print(f"[VideoCompaction] Original frames deleted from {run_dir}")
+
+def compact_and_reindex(run_dir, codec=DEFAULT_CODEC, fps=DEFAULT_FPS, delete_originals=False):
+    """compact_run() + refresh the run catalog entry when the originals were removed."""
+    report = compact_run(run_dir, codec, fps, delete_originals)
+    if report and report["originals_deleted"]:
+        try:
+            import run_catalog
+            run_catalog.index_run(run_dir)
+        except Exception as e:
+            print(f"[VideoCompaction] Failed to refresh run catalog: {e}")
+    return report
+
+def start_background_compaction(run_dir, codec=DEFAULT_CODEC, fps=DEFAULT_FPS, delete_originals=False):
+    """Run the compaction in a separate process so it never holds up the next race."""
+    if getattr(sys, "frozen", False):
+        # PyInstaller build: no interpreter to start the script with
+        threading.Thread(target=compact_and_reindex, args=(run_dir, codec, fps, delete_originals),
+                         name="video-compaction").start()
+        return None
+    args = [sys.executable, os.path.abspath(__file__), run_dir, "--codec", codec, "--fps", str(fps)]
+    if delete_originals:
+        args.append("--delete")
+    print(f"[VideoCompaction] Compacting {run_dir} in the background...")
+    return subprocess.Popen(args)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compact a run's frames into one video file")
+    parser.add_argument("run_dir", type=str)
+    parser.add_argument("--codec", type=str, default=DEFAULT_CODEC, help="FourCC, e.g. mp4v, avc1, MJPG")
+    parser.add_argument("--fps", type=float, default=DEFAULT_FPS)
+    parser.add_argument("--delete", action="store_true", help="Delete the original JPEGs after verification")
+    args = parser.parse_args()
+
+    compact_and_reindex(args.run_dir, args.codec, args.fps, args.delete)
+
+if __name__ == "__main__":
+    main()
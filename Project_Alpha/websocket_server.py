@@ -4,13 +4,20 @@
 import asyncio
 import websockets
 import os
+import time
 import json
 import config
-import keyboard_input  # For keyboard mode
-from data_manager import save_image_and_soc, save_race_metadata, copy_unity_log_to_run_dir
-from table_input import start_csv_replay
+import data_manager
+import controllers
+import metrics
+import race_logging
+from data_manager import ingest_frame, save_race_metadata
+from session_recorder import SessionRecorder, SESSION_NAME
+from control_watchdog import ControlWatchdog
 from threading import Event
 
+log = race_logging.get_logger(__name__)
+
 frame_received_event = Event()  # Trigger when first JPEG arrives
 TORQUE_FILE = os.path.join("data_interactive", "latest_torque.txt")
 
@@ -18,59 +25,99 @@ first_frame_received = False
 shutdown_event = asyncio.Event()
 connected_websocket = None
 
-# Select appropriate control module based on mode
-if config.MODE == "keyboard":
-    import keyboard_input as control_module
-elif config.MODE == "table":
-    import table_input as control_module
-elif config.MODE == "rule_based":
-    import rule_based_input as control_module
-elif config.MODE == "ai":
-    import inference_input as control_module
-else:
-    raise ValueError(f"[Server] Unknown control mode: {config.MODE}")
+# Optional raw session log (RECORD_SESSION=1), opened by start_server()
+recorder = None
+
+# Control-deadline watchdog applied to every torque send
+watchdog = ControlWatchdog.from_config(config)
+
+# Ingest load (messages are handled inline by the receive loop, nothing is buffered here):
+# in flight = messages inside handle_incoming_message(); backlog = consecutive messages that were
+# already waiting in the connection when the receive loop came back for them
+BACKLOG_WAIT_S = 0.0005  # A next message delivered faster than this was already buffered
+ingest_in_flight = 0
+ingest_backlog = 0
+
+# === Metrics ===
+FRAMES_RECEIVED = metrics.counter("frames_received_total", "Binary frame messages received from Unity")
+BYTES_INGESTED = metrics.counter("bytes_ingested_total", "Bytes of frame messages received from Unity")
+TORQUE_SENT = metrics.counter("torque_commands_sent_total", "Control messages sent to Unity")
+metrics.gauge("ingest_in_flight", "Messages from Unity being handled", fn=lambda: ingest_in_flight)
+metrics.gauge("ingest_backlog", "Consecutive messages from Unity that were already waiting when read",
+              fn=lambda: ingest_backlog)
 
 async def send_torque_data(websocket):
     """Send torque command to Unity every 50ms"""
     print("[Server] Starting torque data sender...")
     while not shutdown_event.is_set():
         await asyncio.sleep(0.05)
+        command = controllers.latest_command()  # Single read: left/right always belong together
+        command = watchdog.check(command)
         message = json.dumps({
             "type": "control",
-            "leftTorque": control_module.leftTorque,
-            "rightTorque": control_module.rightTorque
+            "leftTorque": command.left,
+            "rightTorque": command.right
         })
         try:
-            write_latest_torque(control_module.leftTorque, control_module.rightTorque)
-            await websocket.send(message)
+            write_latest_torque(command.left, command.right)
+            await send_message(websocket, message)
+            TORQUE_SENT.inc()
         except websockets.exceptions.ConnectionClosed:
             print("[Server] WebSocket closed. Stopping torque sender.")
             break
 
+async def send_message(websocket, message):
+    """Send a message to Unity (and record it when session recording is on)"""
+    if recorder:
+        recorder.record_outbound(message)
+    await websocket.send(message)
+
+def handle_incoming_message(message):
+    """Process one message from Unity (also used by session replay)"""
+    global ingest_in_flight
+    ingest_in_flight += 1
+    try:
+        _handle_message(message)
+    finally:
+        ingest_in_flight -= 1
+
+def _handle_message(message):
+    global first_frame_received
+
+    if isinstance(message, (bytes, bytearray)):
+        FRAMES_RECEIVED.inc()
+        BYTES_INGESTED.inc(len(message))
+        record = ingest_frame(message)
+        if record is not None and record.filename == "frame_000001.jpg" and not first_frame_received:
+            first_frame_received = True
+            frame_received_event.set()
+            print("[Server] First frame received.")
+    else:
+        try:
+            race_data = json.loads(message)
+            print("[Server] Received race metadata.")
+            save_race_metadata(race_data)
+        except json.JSONDecodeError as e:
+            print(f"[Server] JSON decode error: {e}")
+
 async def receive_image_and_soc(websocket):
     """Receive JPEG + SOC + metadata from Unity"""
-    global first_frame_received
+    global ingest_backlog
     print("[Server] Ready to receive data from Unity...")
 
     try:
+        t_ready = time.monotonic()
         async for message in websocket:
-            if isinstance(message, (bytes, bytearray)):
-                filename = save_image_and_soc(message)
-                if filename == "frame_000001.jpg" and not first_frame_received:
-                    first_frame_received = True
-                    frame_received_event.set()
-                    print("[Server] First frame received.")
-            else:
-                try:
-                    race_data = json.loads(message)
-                    print("[Server] Received race metadata.")
-                    save_race_metadata(race_data)
-                except json.JSONDecodeError as e:
-                    print(f"[Server] JSON decode error: {e}")
+            ingest_backlog = ingest_backlog + 1 if time.monotonic() - t_ready < BACKLOG_WAIT_S else 0
+            if recorder:
+                recorder.record_inbound(message)
+            handle_incoming_message(message)
+            t_ready = time.monotonic()
 
     except websockets.exceptions.ConnectionClosed:
         print("[Server] Client disconnected.")
     finally:
+        ingest_backlog = 0
         print("[Server] Image/SOC reception stopped.")
 
 async def handler(websocket, stop_event):
@@ -80,7 +127,7 @@ async def handler(websocket, stop_event):
     print("[Server] Client connected.")
 
     try:
-        await websocket.send(json.dumps({"type": "connection", "status": "success"}))
+        await send_message(websocket, json.dumps({"type": "connection", "status": "success"}))
         print("[Server] Sent handshake to Unity.")
     except websockets.exceptions.ConnectionClosed:
         print("[Server] Connection failed during handshake.")
@@ -97,13 +144,15 @@ async def handler(websocket, stop_event):
         stop_event.set()
         send_task.cancel()
         receive_task.cancel()
+        if recorder:
+            recorder.close()
 
 async def send_race_end_signal():
     """Send race end command to Unity"""
     if connected_websocket:
         try:
             message = json.dumps({"type": "connection", "message": "RaceEnd"})
-            await connected_websocket.send(message)
+            await send_message(connected_websocket, message)
             print("[Server] Sent RaceEnd signal to Unity.")
         except Exception as e:
             print(f"[Server] Failed to send RaceEnd: {e}")
@@ -112,6 +161,9 @@ async def send_race_end_signal():
 
 async def start_server(stop_event):
     """Launch WebSocket server and wait for client"""
+    global recorder
+    if config.RECORD_SESSION and recorder is None:
+        recorder = SessionRecorder(os.path.join(data_manager.init_run(), SESSION_NAME))
     server = await websockets.serve(lambda ws: handler(ws, stop_event), config.HOST, config.PORT)
     print(f"[Server] WebSocket server running at ws://{config.HOST}:{config.PORT}")
     await shutdown_event.wait()
@@ -121,25 +173,9 @@ async def start_server(stop_event):
     await server.wait_closed()
     stop_event.set()
 
-async def send_control_command_async(left, right):
-    """Send manual torque control via WebSocket (used in table mode)"""
-    if connected_websocket:
-        try:
-            message = json.dumps({
-                "type": "control",
-                "leftTorque": left,
-                "rightTorque": right
-            })
-            await connected_websocket.send(message)
-            print(f"[Server] Sent manual torque: L={left}, R={right}")
-        except Exception as e:
-            print(f"[Server] Error sending torque: {e}")
-    else:
-        print("[Server] No connected client.")
-
 def write_latest_torque(left, right):
     try:
         with open(TORQUE_FILE, "w") as f:
             f.write(f"{left:.4f},{right:.4f}")
     except Exception as e:
-        print(f"[Server] Failed to write torque to file: {e}")
+        log.warning("[Server] Failed to write torque to file: %s", e)